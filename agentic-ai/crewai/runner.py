@@ -10,16 +10,61 @@ Reads JSON from stdin with the shape:
   "preferences": ["..."],
   "hints": ["..."],
   "emphasis": ["..."],
-  "mapFocus": "..."
+  "mapFocus": "...",
+  "contextBudgetTokens": 1000
 }
 
-Prints structured JSON with sections, timeline, and metadata.
+Prints structured JSON with sections, timeline, and metadata. Tasks run in
+three stages (STAGES): planner, then the market/graph/finance analysts
+concurrently, then the reporter; each stage gets the earlier outputs in its
+task descriptions. The shared context (preferences, hints, map focus,
+"context") is budgeted to CONTEXT_BUDGET_TOKENS and sent in full once, to
+the planner, whose output restates what later steps need. Each analyst gets
+only its slice (_context_slices) and the reporter a digest.
+
+Persistent worker mode keeps crewai/langchain imported and the LLM clients
+warm across requests:
+
+  python runner.py --serve [--workers 4]           # NDJSON on stdin/stdout
+  python runner.py --serve --socket /tmp/crew.sock  # NDJSON per connection
+
+Each request line is the payload above plus an optional "id"; each response
+line is the runner's JSON with the same "id" and "timing" ({"queueMs",
+"runMs"}). {"op": "ping"} answers once the worker is warm. Up to --workers
+requests run concurrently; reading pauses while as many more are queued.
+
+When the data pipeline's spatial index is available (data/python, or the
+directory in ESTATEWISE_DATA_DIR), the listings nearest to mapFocus are added
+to the agents' context.
 """
+import argparse
+import contextvars
 import json
 import os
+import re
+import signal
+import socketserver
 import sys
-from typing import Any, Dict, List, Optional
-
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+MAP_FOCUS_LISTINGS = 10
+# Shared context budget in tokens (about BYTES_PER_TOKEN bytes each); a
+# request's "contextBudgetTokens" overrides it.
+CONTEXT_BUDGET_TOKENS = int(os.environ.get("CREWAI_CONTEXT_TOKENS", "1000"))
+# Cap on each earlier task's output quoted into later task descriptions.
+UPSTREAM_BUDGET_TOKENS = int(os.environ.get("CREWAI_UPSTREAM_TOKENS", "600"))
+BYTES_PER_TOKEN = 4
+DEFAULT_WORKERS = int(os.environ.get("CREWAI_WORKERS", "4"))
+# Context keys the finance analyst gets.
+_FINANCE_KEY_RE = re.compile(r"budget|price|afford|down|rate|income|loan|mortgage|payment|tax|hoa|insurance", re.I)
+_LISTING_ZPID_RE = re.compile(r"^- zpid (\d+)")
+
+_cache_lock = threading.Lock()
+_llms: Dict[str, Any] = {}
+_spatial: Dict[str, Any] = {}
 
 def _read_json_stdin() -> Dict[str, Any]:
     data = sys.stdin.read()
@@ -34,13 +79,138 @@ def _safe_print_json(obj: Dict[str, Any]):
     sys.stdout.flush()
 
 
+def _chat_llm(model: str):
+    """One ChatOpenAI client per model for the life of the process."""
+    with _cache_lock:
+        llm = _llms.get(model)
+        if llm is None:
+            from langchain_openai import ChatOpenAI
+            llm = _llms[model] = ChatOpenAI(model=model, temperature=0.2)
+        return llm
+
+
+def _cached_spatial_index(path: str, load: Callable[[str], Any]):
+    """The spatial index at path, reloaded only when the file changes."""
+    try:
+        stamp = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    with _cache_lock:
+        if _spatial.get("stamp") != (path, stamp):
+            _spatial.update(stamp=(path, stamp), index=load(path))
+        return _spatial["index"]
+
+
+def _map_focus_listings(map_focus: str, limit: int = MAP_FOCUS_LISTINGS) -> List[str]:
+    """Nearest listings to the map focus from the spatial index; empty when it is unavailable."""
+    data_dir = os.environ.get("ESTATEWISE_DATA_DIR") or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "..", "..", "data", "python"
+    )
+    if not os.path.isdir(data_dir):
+        return []
+    if data_dir not in sys.path:
+        sys.path.append(data_dir)
+    try:
+        from spatial_index import INDEX_PATH, focus_from_text, load_spatial_index
+        from property_store import open_store
+    except Exception:
+        return []
+    index = _cached_spatial_index(INDEX_PATH, load_spatial_index)
+    focus = focus_from_text(map_focus, index) if index is not None else None
+    if focus is None:
+        return []
+    pos, dist = index.radius(focus.lat, focus.lon, focus.radius_km)
+    if not len(pos):
+        pos, dist = index.nearest(focus.lat, focus.lon, limit)
+    pos, dist = pos[:limit], dist[:limit]
+    store = open_store()
+    docs = store.get_documents(index.ids[pos].tolist()) if store is not None else {}
+    lines = []
+    for p, d in zip(pos, dist):
+        zpid = int(index.ids[p])
+        addr = (docs.get(zpid) or {}).get("address") or {}
+        street = f"{addr.get('streetAddress')}, {addr.get('city')} " if addr else ""
+        lines.append(
+            f"- zpid {zpid}: {street}{d:.1f} km away, ${index.attrs['price'][p]:,.0f}, "
+            f"{index.attrs['bedrooms'][p]:g} bd / {index.attrs['bathrooms'][p]:g} ba"
+        )
+    return lines
+
+
+def _to_json(value: Any) -> str:
+    try:
+        return json.dumps(value, ensure_ascii=False)
+    except Exception:
+        return json.dumps(str(value), ensure_ascii=False)
+
+
+def _nbytes(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+def _truncate(text: str, max_bytes: int) -> str:
+    """text cut to about max_bytes, with a marker saying how much was dropped."""
+    data = text.encode("utf-8")
+    if len(data) <= max_bytes:
+        return text
+    head = data[: max(0, max_bytes - 32)].decode("utf-8", "ignore")
+    return f"{head}… [+{len(data) - _nbytes(head)} bytes]"
+
+
+def _fit_value(value: Any, max_bytes: int) -> str:
+    """
+    JSON for value in about max_bytes: lists keep their leading items plus a
+    count of the rest, dicts split the budget across keys, strings are cut.
+    """
+    text = _to_json(value)
+    if _nbytes(text) <= max_bytes:
+        return text
+    if isinstance(value, str):
+        return _to_json(_truncate(value, max(16, max_bytes - 2)))
+    if isinstance(value, list) and value:
+        parts: List[str] = []
+        used = 2
+        for item in value:
+            part = _fit_value(item, max(32, max_bytes // 2))
+            if used + _nbytes(part) + 2 > max_bytes - 24 and parts:
+                break
+            parts.append(part)
+            used += _nbytes(part) + 2
+        rest = len(value) - len(parts)
+        if rest:
+            parts.append(_to_json(f"... +{rest} more"))
+        return "[" + ", ".join(parts) + "]"
+    if isinstance(value, dict) and value:
+        share = max(32, max_bytes // len(value))
+        fitted = ", ".join(f"{_to_json(str(k))}: {_fit_value(v, share)}" for k, v in value.items())
+        return _truncate("{" + fitted + "}", max_bytes)
+    return _truncate(text, max_bytes)
+
+
+def _allot(sizes: List[int], budget: int) -> List[int]:
+    """Split budget across items: small ones keep their size, large ones share the rest evenly."""
+    shares = [0] * len(sizes)
+    remaining = max(0, budget)
+    order = sorted(range(len(sizes)), key=lambda i: sizes[i])
+    for n, i in enumerate(order):
+        shares[i] = min(sizes[i], remaining // (len(sizes) - n))
+        remaining -= shares[i]
+    return shares
+
+
 def _compose_context(
     preferences: List[str],
     context: Dict[str, Any],
     hints: List[str],
     emphasis: List[str],
     map_focus: Optional[str],
+    map_listings: Optional[List[str]] = None,
+    budget_bytes: Optional[int] = None,
 ) -> str:
+    """
+    The shared context block. With budget_bytes, the context values share
+    whatever the fixed lines leave, oversized ones summarized by _fit_value.
+    """
     lines: List[str] = []
     if preferences:
         lines.append("User preferences:")
@@ -53,15 +223,28 @@ def _compose_context(
         lines.extend(f"- {hint}" for hint in hints)
     if map_focus:
         lines.append(f"Map focus: {map_focus}")
+        if map_listings:
+            lines.append("Listings nearest the map focus:")
+            lines.extend(map_listings)
     if isinstance(context, dict) and context:
         lines.append("Context:")
-        for key, value in context.items():
-            try:
-                serialized = json.dumps(value, ensure_ascii=False)
-            except Exception:
-                serialized = str(value)
-            lines.append(f"- {key}: {serialized}")
-    return "\n".join(lines)
+        items = [(str(key), _to_json(value), value) for key, value in context.items()]
+        if budget_bytes is not None:
+            fixed = sum(_nbytes(line) + 1 for line in lines) + sum(_nbytes(k) + 5 for k, _, _ in items)
+            shares = _allot([_nbytes(text) for _, text, _ in items], budget_bytes - fixed)
+            items = [
+                (key, text if _nbytes(text) <= share else _fit_value(value, max(32, share)), value)
+                for (key, text, value), share in zip(items, shares)
+            ]
+        lines.extend(f"- {key}: {text}" for key, text, _ in items)
+    text = "\n".join(lines)
+    return _truncate(text, budget_bytes) if budget_bytes is not None else text
+
+
+def _context_digest(preferences: List[str], emphasis: List[str], map_focus: Optional[str], max_bytes: int) -> str:
+    """Short reminder of the user's stated constraints for the reporter."""
+    items = list(preferences) + list(emphasis) + ([f"map focus: {map_focus}"] if map_focus else [])
+    return _truncate("; ".join(str(item) for item in items), max_bytes)
 
 
 def _stringify_output(value: Any) -> str:
@@ -76,18 +259,217 @@ def _stringify_output(value: Any) -> str:
     return text.strip()
 
 
-def _timeline_entry(agent: str, task: str, output: Any) -> Optional[Dict[str, str]]:
+def _timeline_entry(agent: str, task: str, output: Any) -> Optional[Dict[str, Any]]:
     text = _stringify_output(output)
     if not text:
         return None
     return {"agent": agent, "task": task, "output": text}
 
 
+# Task definitions, in timeline order. Stages run one after another; the
+# tasks inside a stage do not read each other's output and run concurrently.
+TASK_SPECS: Dict[str, Dict[str, str]] = {
+    "plan": {
+        "include": "planner",
+        "role": "Planner",
+        "goal": "Draft a concise, tool-grounded plan for real-estate research goals.",
+        "backstory": (
+            "You break goals into search, analysis, graph, map, and finance tasks."
+            " Prefer deterministic actions over speculation."
+        ),
+        "description": (
+            "Plan steps for: {goal}. Break the work into 4-8 actionable steps with rationale."
+            " Later steps only see your output, so restate the constraints and focus listings they need."
+        ),
+        "expected_output": "A numbered list of steps with brief justifications, then the key constraints.",
+    },
+    "analysis": {
+        "include": "analysis",
+        "role": "Market Analyst",
+        "goal": "Search and summarize matching properties with clear filters and reasoning.",
+        "backstory": "You synthesize tool outputs and provide JSON-friendly summaries.",
+        "description": (
+            "Identify candidate properties that satisfy the goal: {goal}."
+            " Include filters (beds/baths/price/locations) and cite supporting data."
+            " Structure the output in short JSON-like bullets."
+        ),
+        "expected_output": "Top matches with filters and rationale in JSON-style bullets.",
+    },
+    "graph": {
+        "include": "graph",
+        "role": "Graph Analyst",
+        "goal": "Explain graph relationships, similarities, and Cypher opportunities for the candidates.",
+        "backstory": "You think in terms of zpids, neighborhoods, and similarity edges.",
+        "description": (
+            "Highlight graph-based relationships between the leading properties for: {goal}."
+            " Reference potential Cypher queries or similarity edges."
+        ),
+        "expected_output": "1-3 bullets plus an optional Cypher snippet.",
+    },
+    "finance": {
+        "include": "finance",
+        "role": "Finance Analyst",
+        "goal": "Model affordability and mortgage scenarios with transparent assumptions.",
+        "backstory": "You calculate monthly payments, include down payment assumptions, and cite rates.",
+        "description": (
+            "Estimate mortgage payments and affordability for the leading property scenario for: {goal}."
+            " Provide rates, down payment assumptions, and monthly breakdown."
+        ),
+        "expected_output": "Monthly payment estimate, assumptions, and notable constraints.",
+    },
+    "report": {
+        "include": "reporter",
+        "role": "Reporter",
+        "goal": "Deliver the final EstateWise answer with bullets, links, and clear next steps.",
+        "backstory": "You cite tool-derived facts, note limitations, and keep the answer concise.",
+        "description": (
+            "Compose the final user-facing answer for: {goal}. Summarize property options,"
+            " graph insights, finance, and map guidance. Reference concrete numbers."
+        ),
+        "expected_output": "Concise bullet list, key figures, and a map/link call-to-action.",
+    },
+}
+STAGES: List[List[str]] = [["plan"], ["analysis", "graph", "finance"], ["report"]]
+
+
+def _plan_stages(include: Dict[str, Any]) -> List[List[str]]:
+    """STAGES restricted to the enabled tasks, empty stages dropped."""
+    enabled = {key for key, spec in TASK_SPECS.items() if bool(include.get(spec["include"], True))}
+    return [names for names in ([k for k in stage if k in enabled] for stage in STAGES) if names]
+
+
+def _upstream_text(outputs: Dict[str, str], max_bytes: int) -> str:
+    """Earlier stages' outputs, each capped at max_bytes, for the next stage's task descriptions."""
+    blocks = [
+        f"[{TASK_SPECS[key]['role']} output]\n{_truncate(text, max_bytes)}"
+        for key, text in outputs.items()
+        if text
+    ]
+    return "\n\nResults from earlier steps:\n" + "\n\n".join(blocks) if blocks else ""
+
+
+def _zpids(value: Any, found: List[str], named: bool = False) -> List[str]:
+    """zpids under "zpid"/"zpids" keys anywhere in a context value, in order."""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _zpids(item, found, str(key).lower() in ("zpid", "zpids"))
+    elif isinstance(value, list):
+        for item in value:
+            _zpids(item, found, named)
+    elif named and str(value).isdigit() and str(value) not in found:
+        found.append(str(value))
+    return found
+
+
+def _context_slices(
+    preferences: List[str],
+    context: Dict[str, Any],
+    hints: List[str],
+    emphasis: List[str],
+    map_focus: Optional[str],
+    map_listings: List[str],
+    budget_bytes: int,
+    digest: str,
+) -> Dict[str, str]:
+    """
+    Description suffix per task. The planner gets the whole budgeted block,
+    the only task that does. Each analyst gets its slice: analysis the hints,
+    map focus, nearby listings and context object; finance the preferences,
+    emphasis and budget-like context keys; graph the zpids. The reporter
+    gets the digest and reads the rest from the earlier outputs.
+    """
+    full = _compose_context(preferences, context, hints, emphasis, map_focus, map_listings, budget_bytes)
+    if not full:
+        return {key: "" for key in TASK_SPECS}
+    finance_context = {k: v for k, v in context.items() if _FINANCE_KEY_RE.search(str(k))}
+    zpids = _zpids(context, [m.group(1) for m in map(_LISTING_ZPID_RE.match, map_listings) if m])
+    slices = {
+        "analysis": _compose_context([], context, hints, [], map_focus, map_listings, budget_bytes),
+        "finance": _compose_context(preferences, finance_context, [], emphasis, None, None, budget_bytes),
+        "graph": _truncate("Candidate zpids: " + ", ".join(zpids), budget_bytes) if zpids else "",
+    }
+    suffixes = {"plan": f"\n\nShared context:\n{full}"}
+    suffixes.update({key: f"\n\nContext for this step:\n{text}" if text else "" for key, text in slices.items()})
+    reference = "\n\nShared context: given to the earlier steps; their outputs above reflect it."
+    suffixes["report"] = reference + (f" Stated constraints: {digest}" if digest else "")
+    return suffixes
+
+
+def _context_suffix(context_suffixes: Dict[str, str], key: str, stage_index: int) -> str:
+    """The task's slice; a reporter running alone gets the full block instead of the reference."""
+    return context_suffixes["plan" if key == "report" and stage_index == 0 else key]
+
+
+def _run_task(classes: Dict[str, Any], llm: Any, key: str, description: str) -> Any:
+    """Run one task as a single-agent crew and return its output."""
+    spec = TASK_SPECS[key]
+    agent = classes["Agent"](
+        role=spec["role"],
+        goal=spec["goal"],
+        backstory=spec["backstory"],
+        llm=llm,
+        allow_delegation=False,
+        verbose=False,
+    )
+    task = classes["Task"](description=description, agent=agent, expected_output=spec["expected_output"])
+    crew = classes["Crew"](agents=[agent], tasks=[task], process=classes["Process"].sequential, verbose=False)
+    result = crew.kickoff()
+    return getattr(task, "output", None) or result
+
+
+def _run_stages(
+    classes: Dict[str, Any],
+    llm: Any,
+    goal: str,
+    stages: List[List[str]],
+    context_suffixes: Dict[str, str],
+    upstream_bytes: int,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Execute the stages in order, the tasks of each stage concurrently, each
+    with its _context_suffix().
+    Returns {task: {"output", "stage", "startedMs", "durationMs"}} with times
+    relative to the start of the run.
+    """
+    t0 = time.perf_counter()
+    runs: Dict[str, Dict[str, Any]] = {}
+    outputs: Dict[str, str] = {}
+
+    def run_one(key: str, stage_index: int, upstream: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        suffix = _context_suffix(context_suffixes, key, stage_index)
+        description = TASK_SPECS[key]["description"].format(goal=goal) + upstream + suffix
+        output = _run_task(classes, llm, key, description)
+        return {
+            "output": output,
+            "stage": stage_index,
+            "startedMs": round((started - t0) * 1000, 1),
+            "durationMs": round((time.perf_counter() - started) * 1000, 1),
+        }
+
+    for stage_index, names in enumerate(stages):
+        upstream = _upstream_text(outputs, upstream_bytes)
+        if len(names) == 1:
+            runs[names[0]] = run_one(names[0], stage_index, upstream)
+        else:
+            # Each thread gets a copy of this context so the token-usage callback sees its calls.
+            with ThreadPoolExecutor(max_workers=len(names), thread_name_prefix="crew-task") as pool:
+                futures = {
+                    key: pool.submit(contextvars.copy_context().run, run_one, key, stage_index, upstream)
+                    for key in names
+                }
+                for key in names:
+                    runs[key] = futures[key].result()
+        for key in names:
+            outputs[key] = _stringify_output(runs[key]["output"])
+    return runs
+
+
 def _run_crewai(goal: str, payload: Dict[str, Any]) -> Dict[str, Any]:
     try:
         from crewai import Agent, Task, Crew, Process
         try:
-            from langchain_openai import ChatOpenAI
+            from langchain_openai import ChatOpenAI  # noqa: F401
         except Exception as err:  # pragma: no cover
             return {"ok": False, "error": f"Missing langchain_openai: {err}"}
 
@@ -99,7 +481,7 @@ def _run_crewai(goal: str, payload: Dict[str, Any]) -> Dict[str, Any]:
             }
 
         model = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
-        llm = ChatOpenAI(model=model, temperature=0.2)
+        llm = _chat_llm(model)
 
         token_usage: Optional[Dict[str, Any]] = None
         callback_ctx = None
@@ -114,12 +496,8 @@ def _run_crewai(goal: str, payload: Dict[str, Any]) -> Dict[str, Any]:
                 callback_ctx = None
 
         include = payload.get("include") or {}
-        include_planner = bool(include.get("planner", True))
-        include_analysis = bool(include.get("analysis", True))
-        include_graph = bool(include.get("graph", True))
-        include_finance = bool(include.get("finance", True))
-        include_reporter = bool(include.get("reporter", True))
-        if not any([include_planner, include_analysis, include_graph, include_finance, include_reporter]):
+        stages = _plan_stages(include)
+        if not stages:
             return {"ok": False, "error": "At least one task must be enabled"}
 
         context_obj = payload.get("context") or {}
@@ -127,196 +505,61 @@ def _run_crewai(goal: str, payload: Dict[str, Any]) -> Dict[str, Any]:
         hints = payload.get("hints") or []
         emphasis = payload.get("emphasis") or []
         map_focus = payload.get("mapFocus")
+        map_listings: List[str] = []
+        if isinstance(map_focus, str) and map_focus.strip():
+            try:
+                map_listings = _map_focus_listings(map_focus)
+            except Exception:
+                map_listings = []
 
-        context_text = _compose_context(
+        try:
+            budget_tokens = int(payload.get("contextBudgetTokens") or CONTEXT_BUDGET_TOKENS)
+        except (TypeError, ValueError):
+            budget_tokens = CONTEXT_BUDGET_TOKENS
+        context_args = (
             preferences if isinstance(preferences, list) else [],
             context_obj if isinstance(context_obj, dict) else {},
             hints if isinstance(hints, list) else [],
             emphasis if isinstance(emphasis, list) else [],
             map_focus if isinstance(map_focus, str) else None,
+            map_listings,
         )
-        context_suffix = f"\n\nAdditional context:\n{context_text}" if context_text else ""
-
-        agents: List[Agent] = []
-        tasks: List[Task] = []
-
-        planner_task: Optional[Task] = None
-        analyst_task: Optional[Task] = None
-        graph_task: Optional[Task] = None
-        finance_task: Optional[Task] = None
-        reporter_task: Optional[Task] = None
-
-        if include_planner:
-            planner_agent = Agent(
-                role="Planner",
-                goal="Draft a concise, tool-grounded plan for real-estate research goals.",
-                backstory=(
-                    "You break goals into search, analysis, graph, map, and finance tasks."
-                    " Prefer deterministic actions over speculation."
-                ),
-                llm=llm,
-                allow_delegation=False,
-                verbose=False,
-            )
-            planner_task = Task(
-                description=(
-                    f"Plan steps for: {goal}. Break the work into 4-8 actionable steps with rationale."\
-                    f"{context_suffix}"
-                ),
-                agent=planner_agent,
-                expected_output="A numbered list of steps with brief justifications.",
-            )
-            agents.append(planner_agent)
-            tasks.append(planner_task)
-
-        if include_analysis:
-            analyst_agent = Agent(
-                role="Market Analyst",
-                goal="Search and summarize matching properties with clear filters and reasoning.",
-                backstory="You synthesize tool outputs and provide JSON-friendly summaries.",
-                llm=llm,
-                allow_delegation=False,
-                verbose=False,
-            )
-            analyst_task = Task(
-                description=(
-                    "Identify candidate properties that satisfy the goal."
-                    " Include filters (beds/baths/price/locations) and cite supporting data."
-                    " Structure the output in short JSON-like bullets."\
-                    f"{context_suffix}"
-                ),
-                agent=analyst_agent,
-                expected_output="Top matches with filters and rationale in JSON-style bullets.",
-            )
-            agents.append(analyst_agent)
-            tasks.append(analyst_task)
-
-        if include_graph:
-            graph_agent = Agent(
-                role="Graph Analyst",
-                goal="Explain graph relationships, similarities, and Cypher opportunities for the candidates.",
-                backstory="You think in terms of zpids, neighborhoods, and similarity edges.",
-                llm=llm,
-                allow_delegation=False,
-                verbose=False,
-            )
-            graph_task = Task(
-                description=(
-                    "Highlight graph-based relationships between the leading properties."
-                    " Reference potential Cypher queries or similarity edges."\
-                    f"{context_suffix}"
-                ),
-                agent=graph_agent,
-                expected_output="1-3 bullets plus an optional Cypher snippet.",
-            )
-            agents.append(graph_agent)
-            tasks.append(graph_task)
-
-        if include_finance:
-            finance_agent = Agent(
-                role="Finance Analyst",
-                goal="Model affordability and mortgage scenarios with transparent assumptions.",
-                backstory="You calculate monthly payments, include down payment assumptions, and cite rates.",
-                llm=llm,
-                allow_delegation=False,
-                verbose=False,
-            )
-            finance_task = Task(
-                description=(
-                    "Estimate mortgage payments and affordability for the leading property scenario."
-                    " Provide rates, down payment assumptions, and monthly breakdown."\
-                    f"{context_suffix}"
-                ),
-                agent=finance_agent,
-                expected_output="Monthly payment estimate, assumptions, and notable constraints.",
-            )
-            agents.append(finance_agent)
-            tasks.append(finance_task)
-
-        if include_reporter:
-            reporter_agent = Agent(
-                role="Reporter",
-                goal="Deliver the final EstateWise answer with bullets, links, and clear next steps.",
-                backstory="You cite tool-derived facts, note limitations, and keep the answer concise.",
-                llm=llm,
-                allow_delegation=False,
-                verbose=False,
-            )
-            reporter_task = Task(
-                description=(
-                    "Compose the final user-facing answer summarizing property options,"
-                    " graph insights, finance, and map guidance. Reference concrete numbers."\
-                    f"{context_suffix}"
-                ),
-                agent=reporter_agent,
-                expected_output="Concise bullet list, key figures, and a map/link call-to-action.",
-            )
-            agents.append(reporter_agent)
-            tasks.append(reporter_task)
-
-        if not tasks:
-            return {"ok": False, "error": "CrewAI runner has no tasks to execute"}
-
-        crew = Crew(
-            agents=agents,
-            tasks=tasks,
-            process=Process.sequential,
-            verbose=False,
+        raw_context = _compose_context(*context_args)
+        shared_context = _compose_context(*context_args, budget_bytes=budget_tokens * BYTES_PER_TOKEN)
+        digest = _context_digest(
+            context_args[0], context_args[3], context_args[4], budget_tokens * BYTES_PER_TOKEN // 4
         )
+        context_suffixes = _context_slices(*context_args, budget_tokens * BYTES_PER_TOKEN, digest)
+        upstream_bytes = UPSTREAM_BUDGET_TOKENS * BYTES_PER_TOKEN
+
+        classes = {"Agent": Agent, "Task": Task, "Crew": Crew, "Process": Process}
         if callback_ctx:
             with callback_ctx as cb:
-                result = crew.kickoff()
+                runs = _run_stages(classes, llm, goal, stages, context_suffixes, upstream_bytes)
             token_usage = {
                 "promptTokens": getattr(cb, "prompt_tokens", None),
                 "completionTokens": getattr(cb, "completion_tokens", None),
                 "totalTokens": getattr(cb, "total_tokens", None),
             }
         else:
-            result = crew.kickoff()
+            runs = _run_stages(classes, llm, goal, stages, context_suffixes, upstream_bytes)
 
         sections: Dict[str, Optional[str]] = {}
-        timeline: List[Dict[str, str]] = []
+        timeline: List[Dict[str, Any]] = []
         artifacts: Dict[str, Optional[str]] = {}
-
-        if planner_task:
-            plan_output = _stringify_output(getattr(planner_task, "output", None))
-            sections["plan"] = plan_output or None
-            artifacts["plan"] = plan_output or None
-            entry = _timeline_entry("Planner", "plan", planner_task.output)
-            if entry:
-                timeline.append(entry)
-        if analyst_task:
-            analysis_output = _stringify_output(getattr(analyst_task, "output", None))
-            sections["analysis"] = analysis_output or None
-            artifacts["analysis"] = analysis_output or None
-            entry = _timeline_entry("Market Analyst", "analysis", analyst_task.output)
-            if entry:
-                timeline.append(entry)
-        if graph_task:
-            graph_output = _stringify_output(getattr(graph_task, "output", None))
-            sections["graph"] = graph_output or None
-            artifacts["graph"] = graph_output or None
-            entry = _timeline_entry("Graph Analyst", "graph", graph_task.output)
-            if entry:
-                timeline.append(entry)
-        if finance_task:
-            finance_output = _stringify_output(getattr(finance_task, "output", None))
-            sections["finance"] = finance_output or None
-            artifacts["finance"] = finance_output or None
-            entry = _timeline_entry("Finance Analyst", "finance", finance_task.output)
-            if entry:
-                timeline.append(entry)
-        if reporter_task:
-            report_output = _stringify_output(getattr(reporter_task, "output", None))
-            sections["report"] = report_output or None
-            artifacts["report"] = report_output or None
-            entry = _timeline_entry("Reporter", "report", reporter_task.output)
-            if entry:
-                timeline.append(entry)
-
-        summary = _stringify_output(result)
-        if not summary and reporter_task:
-            summary = sections.get("report") or ""
+        for names in stages:
+            for key in names:
+                run = runs[key]
+                text = _stringify_output(run["output"])
+                sections[key] = text or None
+                artifacts[key] = text or None
+                entry = _timeline_entry(TASK_SPECS[key]["role"], key, run["output"])
+                if entry:
+                    entry.update(stage=run["stage"], startedMs=run["startedMs"], durationMs=run["durationMs"])
+                    timeline.append(entry)
+
+        # The crew's result is the last task's output: the report when enabled.
+        summary = sections.get(stages[-1][-1]) or ""
 
         return {
             "ok": True,
@@ -329,10 +572,22 @@ def _run_crewai(goal: str, payload: Dict[str, Any]) -> Dict[str, Any]:
                 "include": include,
                 "model": model,
                 "tokenUsage": token_usage,
+                "stages": stages,
+                "contextBudgetTokens": budget_tokens,
+                "contextBytes": {
+                    "raw": _nbytes(raw_context),
+                    "shared": _nbytes(shared_context),
+                    "sent": sum(
+                        _nbytes(_context_suffix(context_suffixes, key, index))
+                        for index, names in enumerate(stages)
+                        for key in names
+                    ),
+                },
                 "preferences": preferences,
                 "hints": hints,
                 "emphasis": emphasis,
                 "mapFocus": map_focus,
+                "mapFocusListings": len(map_listings),
                 "context": context_obj,
             },
         }
@@ -340,14 +595,133 @@ def _run_crewai(goal: str, payload: Dict[str, Any]) -> Dict[str, Any]:
         return {"ok": False, "error": f"CrewAI runtime error: {exc}"}
 
 
+def _execute(payload: Any, queued_at: Optional[float] = None) -> Dict[str, Any]:
+    """Run one request payload; the response carries queue and run time in ms."""
+    started = time.perf_counter()
+    if not isinstance(payload, dict):
+        res: Dict[str, Any] = {"ok": False, "error": "Request must be a JSON object"}
+    elif payload.get("op") == "ping":
+        res = {"ok": True, "op": "ping", "warm": bool(_llms)}
+    elif not payload.get("goal"):
+        res = {"ok": False, "error": "Missing goal"}
+    else:
+        res = _run_crewai(payload["goal"], payload)
+    res["timing"] = {
+        "queueMs": round((started - (queued_at or started)) * 1000, 1),
+        "runMs": round((time.perf_counter() - started) * 1000, 1),
+    }
+    if isinstance(payload, dict) and "id" in payload:
+        res["id"] = payload["id"]
+    return res
+
+
+def _warm_up() -> None:
+    """Import crewai/langchain and build the default client before the first request."""
+    try:
+        import crewai  # noqa: F401
+        if os.environ.get("OPENAI_API_KEY"):
+            _chat_llm(os.environ.get("OPENAI_MODEL", "gpt-4o-mini"))
+    except Exception as err:
+        sys.stderr.write(f"CrewAI worker warm-up failed: {err}\n")
+
+
+class _Dispatcher:
+    """Bounded pool: `workers` requests run at once, as many more may wait."""
+
+    def __init__(self, workers: int):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="crew")
+        self.slots = threading.BoundedSemaphore(workers * 2)
+
+    def submit(self, line: str, write: Callable[[Dict[str, Any]], None]):
+        try:
+            payload = json.loads(line)
+        except Exception as err:
+            write({"ok": False, "error": f"Invalid JSON request: {err}"})
+            return None
+        queued_at = time.perf_counter()
+        self.slots.acquire()
+
+        def job():
+            try:
+                res = _execute(payload, queued_at)
+            except Exception as exc:  # pragma: no cover
+                res = {"ok": False, "error": f"CrewAI worker error: {exc}"}
+                if isinstance(payload, dict) and "id" in payload:
+                    res["id"] = payload["id"]
+            finally:
+                self.slots.release()
+            timing = res.get("timing") or {}
+            sys.stderr.write(
+                f"crew request {res.get('id', '-')}: ok={res.get('ok')} "
+                f"queue={timing.get('queueMs')}ms run={timing.get('runMs')}ms\n"
+            )
+            write(res)
+
+        return self.pool.submit(job)
+
+
+def _line_writer(stream) -> Callable[[Dict[str, Any]], None]:
+    lock = threading.Lock()
+
+    def write(obj: Dict[str, Any]) -> None:
+        data = json.dumps(obj, ensure_ascii=False) + "\n"
+        with lock:
+            stream.write(data if hasattr(stream, "encoding") else data.encode("utf-8"))
+            stream.flush()
+
+    return write
+
+
+def _serve_stdin(dispatcher: _Dispatcher, out) -> None:
+    write = _line_writer(out)
+    for line in sys.stdin:
+        if line.strip():
+            dispatcher.submit(line, write)
+    dispatcher.pool.shutdown(wait=True)
+
+
+def _serve_socket(dispatcher: _Dispatcher, path: str) -> None:
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            write = _line_writer(self.wfile)
+            pending = [dispatcher.submit(raw.decode("utf-8"), write) for raw in self.rfile if raw.strip()]
+            for fut in pending:
+                if fut is not None:
+                    fut.result()
+
+    if os.path.exists(path):
+        os.unlink(path)
+    # SIGTERM unwinds serve_forever so the socket file is removed.
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    with socketserver.ThreadingUnixStreamServer(path, Handler) as server:
+        server.daemon_threads = True
+        sys.stderr.write(f"CrewAI worker listening on {path}\n")
+        try:
+            server.serve_forever()
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
+
+
 def main():
-    payload = _read_json_stdin()
-    goal = payload.get("goal") or ""
-    if not goal:
-        _safe_print_json({"ok": False, "error": "Missing goal"})
+    parser = argparse.ArgumentParser(description="EstateWise CrewAI runner")
+    parser.add_argument("--serve", action="store_true", help="persistent worker: NDJSON requests, one per line")
+    parser.add_argument("--socket", help="with --serve, listen on this Unix socket instead of stdin")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="concurrent requests in --serve mode")
+    args = parser.parse_args()
+    if not args.serve:
+        _safe_print_json(_execute(_read_json_stdin()))
         return
-    res = _run_crewai(goal, payload)
-    _safe_print_json(res)
+    # Responses own the real stdout; stray prints from libraries, including
+    # any made while importing them in the warm-up, go to stderr.
+    out = sys.stdout
+    sys.stdout = sys.stderr
+    _warm_up()
+    dispatcher = _Dispatcher(max(1, args.workers))
+    if args.socket:
+        _serve_socket(dispatcher, args.socket)
+    else:
+        _serve_stdin(dispatcher, out)
 
 
 if __name__ == "__main__":
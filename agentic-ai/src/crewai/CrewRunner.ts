@@ -1,4 +1,4 @@
-import { spawn } from "node:child_process";
+import { spawn, type ChildProcessWithoutNullStreams } from "node:child_process";
 import path from "node:path";
 import { fileURLToPath } from "node:url";
 import { CostTracker, type CostReport } from "../costs/tracker.js";
@@ -7,6 +7,10 @@ export interface CrewTimelineEntry {
   agent: string;
   task: string;
   output: string;
+  /** 0 planner, 1 concurrent analysts, 2 reporter. */
+  stage?: number;
+  startedMs?: number;
+  durationMs?: number;
 }
 
 export interface CrewStructuredResult {
@@ -21,12 +25,22 @@ export interface CrewStructuredResult {
   metadata?: Record<string, unknown>;
 }
 
+export interface CrewRunTiming {
+  /** Time the request waited for a free slot in the persistent worker. */
+  queueMs?: number;
+  /** Time the runner spent executing the crew. */
+  runMs?: number;
+  /** Wall time seen by Node, including process start in one-shot mode. */
+  totalMs: number;
+}
+
 export interface CrewRunResult {
   ok: boolean;
   output?: string;
   json?: unknown;
   structured?: CrewStructuredResult;
   costs?: CostReport;
+  timing?: CrewRunTiming;
   error?: string;
   stderr?: string;
 }
@@ -42,6 +56,11 @@ export interface CrewGoalOptions {
   includeGraph?: boolean;
   includeFinance?: boolean;
   includeReporter?: boolean;
+  /**
+   * Token budget for the shared context block (CREWAI_CONTEXT_TOKENS in the
+   * runner, default 1000); oversized context values are summarized to fit.
+   */
+  contextBudgetTokens?: number;
 }
 
 export interface CrewRunnerOptions {
@@ -49,6 +68,14 @@ export interface CrewRunnerOptions {
   cwd?: string;
   timeoutMs?: number;
   env?: NodeJS.ProcessEnv;
+  /**
+   * Send requests to a long-lived `runner.py --serve` process shared by all
+   * runtimes with the same settings, instead of spawning Python per request.
+   * Defaults to true unless CREWAI_PERSISTENT=0.
+   */
+  persistent?: boolean;
+  /** Concurrent requests per persistent worker (CREWAI_WORKERS, default 4). */
+  workers?: number;
 }
 
 interface PythonJsonResult {
@@ -78,6 +105,8 @@ function buildPayload(goal: string, opts: CrewGoalOptions) {
   if (opts.hints?.length) payload.hints = opts.hints;
   if (opts.emphasis?.length) payload.emphasis = opts.emphasis;
   if (opts.mapFocus) payload.mapFocus = opts.mapFocus;
+  if (opts.contextBudgetTokens)
+    payload.contextBudgetTokens = opts.contextBudgetTokens;
   return payload;
 }
 
@@ -99,10 +128,17 @@ function extractStructured(json: any): CrewStructuredResult | undefined {
               ? outputRaw
               : JSON.stringify(outputRaw, null, 2);
           if (!agent || !output) return null;
+          const toNumber = (value: unknown) =>
+            typeof value === "number" && Number.isFinite(value)
+              ? value
+              : undefined;
           return {
             agent,
             task: task || agent,
             output,
+            stage: toNumber(entry?.stage),
+            startedMs: toNumber(entry?.startedMs),
+            durationMs: toNumber(entry?.durationMs),
           } satisfies CrewTimelineEntry;
         })
         .filter(Boolean)
@@ -155,12 +191,25 @@ function extractTokenUsage(json: any): {
   };
 }
 
+function extractTiming(json: any, totalMs: number): CrewRunTiming {
+  const timing = json && typeof json === "object" ? (json as any).timing : null;
+  const toNumber = (value: unknown) =>
+    typeof value === "number" && Number.isFinite(value) ? value : undefined;
+  return {
+    queueMs: toNumber(timing?.queueMs),
+    runMs: toNumber(timing?.runMs),
+    totalMs,
+  };
+}
+
 /** Execute the Python runner and translate the response. */
 export class CrewRuntime {
   private readonly python: string;
   private readonly cwd: string;
   private readonly env: NodeJS.ProcessEnv;
   private readonly timeoutMs: number;
+  private readonly persistent: boolean;
+  private readonly workers: number;
 
   constructor(private readonly defaults: CrewRunnerOptions = {}) {
     const here = path.dirname(fileURLToPath(import.meta.url));
@@ -168,6 +217,10 @@ export class CrewRuntime {
     this.cwd = defaults.cwd || path.resolve(here, "../../crewai");
     this.env = { ...process.env, ...defaults.env };
     this.timeoutMs = defaults.timeoutMs ?? 180_000;
+    this.persistent =
+      defaults.persistent ?? process.env.CREWAI_PERSISTENT !== "0";
+    this.workers =
+      defaults.workers ?? (Number(process.env.CREWAI_WORKERS) || 4);
   }
 
   async run(goal: string, opts: CrewGoalOptions & CrewRunnerOptions = {}) {
@@ -178,18 +231,29 @@ export class CrewRuntime {
     const timeoutMs = opts.timeoutMs ?? this.timeoutMs;
     const script = path.join(cwd, "runner.py");
 
+    const persistent = opts.persistent ?? this.persistent;
+    const workers = opts.workers ?? this.workers;
+
     const costTracker = new CostTracker();
-    const response = await runPythonJson(python, script, payload, {
-      cwd,
-      env,
-      timeoutMs,
-    });
+    const started = Date.now();
+    const response = persistent
+      ? await sharedWorker(python, script, cwd, env, workers).request(
+          payload,
+          timeoutMs,
+        )
+      : await runPythonJson(python, script, payload, {
+          cwd,
+          env,
+          timeoutMs,
+        });
+    const timing = extractTiming(response.json, Date.now() - started);
 
     if (!response.ok) {
       return {
         ok: false,
         error: response.error || "CrewAI runner failed",
         output: response.stdout || undefined,
+        timing,
         stderr: response.stderr || undefined,
       } satisfies CrewRunResult;
     }
@@ -201,6 +265,7 @@ export class CrewRuntime {
         error: (json as any).error || "CrewAI returned error",
         output: response.stdout || undefined,
         json,
+        timing,
         stderr: response.stderr || undefined,
       } satisfies CrewRunResult;
     }
@@ -254,6 +319,7 @@ export class CrewRuntime {
       json,
       structured,
       costs: costTracker.getReport(),
+      timing,
       stderr: response.stderr || undefined,
     } satisfies CrewRunResult;
   }
@@ -266,16 +332,217 @@ export async function runCrewAIGoal(
   goal: string,
   opts: CrewGoalOptions & CrewRunnerOptions = {},
 ) {
-  const { python, cwd, timeoutMs, env, ...goalOptions } = opts;
-  const runtime = new CrewRuntime({ python, cwd, timeoutMs, env });
+  const { python, cwd, timeoutMs, env, persistent, workers, ...goalOptions } =
+    opts;
+  const runtime = new CrewRuntime({
+    python,
+    cwd,
+    timeoutMs,
+    env,
+    persistent,
+    workers,
+  });
   return runtime.run(goal, goalOptions);
 }
 
+/** Stop every persistent CrewAI worker (they are restarted on demand). */
+export function closeCrewWorkers() {
+  for (const worker of sharedWorkers.values()) worker.close();
+  sharedWorkers.clear();
+}
+
 export const __crewTestUtils = {
   buildPayload,
   extractStructured,
+  extractTiming,
+  workerCount: () => sharedWorkers.size,
 };
 
+interface PendingRequest {
+  resolve: (result: PythonJsonResult) => void;
+  timer: NodeJS.Timeout | null;
+}
+
+const STDERR_TAIL_BYTES = 4_000;
+
+/**
+ * A `runner.py --serve` process: NDJSON requests on stdin, responses matched
+ * by id on stdout. The process is restarted on the next request after it
+ * exits, and does not keep Node alive while no request is pending.
+ */
+class CrewWorker {
+  private child: ChildProcessWithoutNullStreams | null = null;
+  private buffer = "";
+  private stderrTail = "";
+  private nextId = 1;
+  private readonly pending = new Map<string, PendingRequest>();
+  /** Timed-out requests whose Python thread still holds a worker slot. */
+  private readonly abandoned = new Set<string>();
+
+  constructor(
+    private readonly python: string,
+    private readonly script: string,
+    private readonly cwd: string,
+    private readonly env: NodeJS.ProcessEnv,
+    private readonly workers: number,
+  ) {}
+
+  request(payload: unknown, timeoutMs?: number): Promise<PythonJsonResult> {
+    const id = `r${this.nextId++}`;
+    return new Promise((resolve) => {
+      // A timed-out request keeps its slot in the worker until the crew
+      // finishes; its late response is dropped.
+      const timer = timeoutMs
+        ? setTimeout(() => this.abandon(id, timeoutMs), timeoutMs)
+        : null;
+      this.pending.set(id, { resolve, timer });
+      const child = this.ensureChild();
+      this.setRef(true);
+      child.stdin.write(
+        JSON.stringify({ ...(payload as Record<string, unknown>), id }) + "\n",
+      );
+    });
+  }
+
+  close() {
+    const child = this.child;
+    if (!child) return;
+    // The exit handler would find this.child already cleared, so settle
+    // pending requests here; without a timeout they would never resolve.
+    this.failAll(child, "CrewAI worker closed");
+    child.kill();
+  }
+
+  private ensureChild(): ChildProcessWithoutNullStreams {
+    if (this.child) return this.child;
+    const child = spawn(
+      this.python,
+      [this.script, "--serve", "--workers", String(this.workers)],
+      { cwd: this.cwd, env: this.env, stdio: ["pipe", "pipe", "pipe"] },
+    );
+    this.child = child;
+    this.buffer = "";
+    this.abandoned.clear();
+    child.stdout.on("data", (d) => this.onStdout(d.toString()));
+    child.stderr.on("data", (d) => {
+      this.stderrTail = (this.stderrTail + d.toString()).slice(
+        -STDERR_TAIL_BYTES,
+      );
+    });
+    child.stdin.on("error", () => {});
+    child.once("error", (e) =>
+      this.failAll(child, `Failed to spawn Python runner: ${e}`),
+    );
+    child.once("exit", (code) =>
+      this.failAll(child, `CrewAI worker exited with code ${code}`),
+    );
+    return child;
+  }
+
+  private onStdout(chunk: string) {
+    this.buffer += chunk;
+    let newline = this.buffer.indexOf("\n");
+    while (newline >= 0) {
+      const line = this.buffer.slice(0, newline).trim();
+      this.buffer = this.buffer.slice(newline + 1);
+      newline = this.buffer.indexOf("\n");
+      if (!line) continue;
+      let json: any;
+      try {
+        json = JSON.parse(line);
+      } catch {
+        continue;
+      }
+      if (json && typeof json.id === "string") {
+        this.abandoned.delete(json.id);
+        this.settle(json.id, {
+          ok: true,
+          stdout: line,
+          stderr: "",
+          status: 0,
+          json,
+        });
+      }
+    }
+  }
+
+  private settle(id: string, result: PythonJsonResult) {
+    const entry = this.pending.get(id);
+    if (!entry) return;
+    this.pending.delete(id);
+    if (entry.timer) clearTimeout(entry.timer);
+    entry.resolve(result);
+    if (!this.pending.size) this.setRef(false);
+  }
+
+  /**
+   * Time out a request. Once as many timed-out requests as the worker has
+   * threads are still running, every slot may be stuck on a hung call, so
+   * the child is recycled and the requests queued behind them fail now.
+   */
+  private abandon(id: string, timeoutMs: number) {
+    if (!this.pending.has(id)) return;
+    this.settle(id, {
+      ok: false,
+      stdout: "",
+      stderr: this.stderrTail,
+      status: null,
+      error: `CrewAI worker timed out after ${timeoutMs} ms`,
+    });
+    this.abandoned.add(id);
+    const child = this.child;
+    if (child && this.abandoned.size >= this.workers) {
+      this.failAll(
+        child,
+        `CrewAI worker restarted after ${this.abandoned.size} requests timed out`,
+      );
+      child.kill();
+    }
+  }
+
+  private failAll(child: ChildProcessWithoutNullStreams, error: string) {
+    if (this.child !== child) return;
+    this.child = null;
+    for (const id of [...this.pending.keys()]) {
+      this.settle(id, {
+        ok: false,
+        stdout: "",
+        stderr: this.stderrTail,
+        status: child.exitCode,
+        error: this.stderrTail ? `${error}: ${this.stderrTail}` : error,
+      });
+    }
+  }
+
+  private setRef(active: boolean) {
+    const child = this.child;
+    if (!child) return;
+    const method = active ? "ref" : "unref";
+    child[method]();
+    for (const stream of [child.stdin, child.stdout, child.stderr]) {
+      (stream as any)[method]?.();
+    }
+  }
+}
+
+const sharedWorkers = new Map<string, CrewWorker>();
+
+function sharedWorker(
+  python: string,
+  script: string,
+  cwd: string,
+  env: NodeJS.ProcessEnv,
+  workers: number,
+) {
+  const key = JSON.stringify([python, script, workers, env]);
+  let worker = sharedWorkers.get(key);
+  if (!worker) {
+    worker = new CrewWorker(python, script, cwd, env, workers);
+    sharedWorkers.set(key, worker);
+  }
+  return worker;
+}
+
 /** Spawn a Python script with a JSON payload and parse its JSON stdout. */
 function runPythonJson(
   python: string,
@@ -1,7 +1,17 @@
 import { describe, it } from "node:test";
 import assert from "node:assert/strict";
+import { spawnSync } from "node:child_process";
+import { mkdtempSync, mkdirSync, readFileSync, writeFileSync } from "node:fs";
+import { tmpdir } from "node:os";
+import path from "node:path";
+import { fileURLToPath } from "node:url";
 import { __langTestUtils } from "../dist/lang/graph.js";
-import { __crewTestUtils } from "../dist/crewai/CrewRunner.js";
+import {
+  __crewTestUtils,
+  CrewRuntime,
+  closeCrewWorkers,
+  runCrewAIGoal,
+} from "../dist/crewai/CrewRunner.js";
 
 describe("LangGraph prompt utilities", () => {
   it("formats context and instructions", () => {
@@ -39,6 +49,15 @@ describe("CrewAI payload helpers", () => {
     });
     assert.deepEqual(payload.hints, ["prefer single-story"]);
     assert.ok(!("context" in payload));
+    assert.ok(!("contextBudgetTokens" in payload));
+  });
+
+  it("passes the shared context budget", () => {
+    const payload = __crewTestUtils.buildPayload("Find homes", {
+      context: { comps: [1, 2, 3] },
+      contextBudgetTokens: 400,
+    });
+    assert.equal(payload.contextBudgetTokens, 400);
   });
 
   it("extracts structured timeline", () => {
@@ -59,5 +78,189 @@ describe("CrewAI payload helpers", () => {
     assert.equal(structured.report, "Report text");
     assert.equal(structured.timeline.length, 2);
     assert.equal(structured.timeline[0].agent, "Planner");
+    assert.equal(structured.timeline[0].stage, undefined);
+  });
+
+  it("keeps stage timing on timeline entries", () => {
+    const structured = __crewTestUtils.extractStructured({
+      timeline: [
+        {
+          agent: "Planner",
+          task: "plan",
+          output: "p",
+          stage: 0,
+          startedMs: 0,
+          durationMs: 900,
+        },
+        {
+          agent: "Graph Analyst",
+          task: "graph",
+          output: "g",
+          stage: 1,
+          startedMs: 901.5,
+          durationMs: 1200,
+        },
+      ],
+    });
+    assert.deepEqual(
+      structured.timeline.map((e) => [e.task, e.stage, e.startedMs]),
+      [
+        ["plan", 0, 0],
+        ["graph", 1, 901.5],
+      ],
+    );
+  });
+
+  it("reads runner timing", () => {
+    const timing = __crewTestUtils.extractTiming(
+      { ok: true, timing: { queueMs: 1.5, runMs: 20 } },
+      30,
+    );
+    assert.deepEqual(timing, { queueMs: 1.5, runMs: 20, totalMs: 30 });
+    assert.equal(__crewTestUtils.extractTiming(undefined, 5).runMs, undefined);
   });
+
+  const python = process.env.PYTHON_BIN || "python3";
+  const hasPython = spawnSync(python, ["--version"]).status === 0;
+
+  it(
+    "shares one persistent worker across runtimes",
+    { skip: !hasPython && "python not available" },
+    async () => {
+      try {
+        const results = await Promise.all([
+          new CrewRuntime({ persistent: true }).run(""),
+          runCrewAIGoal("", { persistent: true }),
+        ]);
+        for (const result of results) {
+          assert.equal(result.ok, false);
+          assert.equal(result.error, "Missing goal");
+          assert.equal(typeof result.timing.runMs, "number");
+        }
+        assert.equal(__crewTestUtils.workerCount(), 1);
+      } finally {
+        closeCrewWorkers();
+      }
+    },
+  );
+
+  it(
+    "fails pending requests when the workers close",
+    { skip: !hasPython && "python not available" },
+    async () => {
+      const pending = runCrewAIGoal("Compare homes", {
+        persistent: true,
+        timeoutMs: 0,
+      });
+      closeCrewWorkers();
+      const result = await pending;
+      assert.equal(result.ok, false);
+      assert.match(result.error, /worker closed/);
+    },
+  );
+
+  it(
+    "restarts a worker whose slots are held by timed-out requests",
+    { skip: !hasPython && "python not available" },
+    async () => {
+      // A runner that reads requests and never answers, like a hung LLM call.
+      const cwd = mkdtempSync(path.join(tmpdir(), "crew-hang-"));
+      writeFileSync(
+        path.join(cwd, "runner.py"),
+        "import sys\nfor line in sys.stdin:\n    pass\n",
+      );
+      const opts = { persistent: true, cwd, workers: 1 };
+      try {
+        const [timedOut, queued] = await Promise.all([
+          runCrewAIGoal("Compare homes", { ...opts, timeoutMs: 100 }),
+          runCrewAIGoal("Compare condos", { ...opts, timeoutMs: 0 }),
+        ]);
+        assert.match(timedOut.error, /timed out/);
+        assert.match(queued.error, /restarted after 1 requests timed out/);
+      } finally {
+        closeCrewWorkers();
+      }
+    },
+  );
+});
+
+describe("CrewAI runner context", () => {
+  const python = process.env.PYTHON_BIN || "python3";
+  const hasPython = spawnSync(python, ["--version"]).status === 0;
+
+  // Stub crewai / langchain_openai: each task's description is appended to
+  // descriptions.jsonl in the stub directory; its output is just its role.
+  function stubModules() {
+    const dir = mkdtempSync(path.join(tmpdir(), "crew-stub-"));
+    mkdirSync(path.join(dir, "crewai"));
+    mkdirSync(path.join(dir, "langchain_openai"));
+    writeFileSync(
+      path.join(dir, "crewai", "__init__.py"),
+      [
+        "import json, os",
+        "LOG = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'descriptions.jsonl')",
+        "class Agent:",
+        "    def __init__(self, **kw): self.__dict__.update(kw)",
+        "class Task:",
+        "    def __init__(self, **kw): self.__dict__.update(kw); self.output = None",
+        "class Process:",
+        "    sequential = 'sequential'",
+        "class Crew:",
+        "    def __init__(self, agents, tasks, **kw): self.tasks = tasks",
+        "    def kickoff(self):",
+        "        for t in self.tasks:",
+        "            with open(LOG, 'a') as f:",
+        "                f.write(json.dumps({'role': t.agent.role, 'description': t.description}) + '\\n')",
+        "            t.output = t.agent.role + ' done'",
+        "        return self.tasks[-1].output",
+        "",
+      ].join("\n"),
+    );
+    writeFileSync(
+      path.join(dir, "langchain_openai", "__init__.py"),
+      "class ChatOpenAI:\n    def __init__(self, **kw): pass\n",
+    );
+    return dir;
+  }
+
+  it(
+    "sends the shared block once and each analyst its slice",
+    { skip: !hasPython && "python not available" },
+    () => {
+      const runner = fileURLToPath(
+        new URL("../crewai/runner.py", import.meta.url),
+      );
+      const stubs = stubModules();
+      const res = spawnSync(python, [runner], {
+        input: JSON.stringify({
+          goal: "Find homes",
+          context: { comps: [{ zpid: 111 }, { zpid: 222 }], budget: 900000 },
+          hints: ["prefer single-story"],
+          preferences: ["under 900k"],
+        }),
+        env: { ...process.env, PYTHONPATH: stubs, OPENAI_API_KEY: "test" },
+        encoding: "utf8",
+      });
+      const json = JSON.parse(res.stdout);
+      assert.equal(json.ok, true, json.error);
+      const descriptions = Object.fromEntries(
+        readFileSync(path.join(stubs, "descriptions.jsonl"), "utf8")
+          .trim()
+          .split("\n")
+          .map((line) => JSON.parse(line))
+          .map(({ role, description }) => [role, description]),
+      );
+      const all = Object.values(descriptions).join("\n");
+      assert.equal(all.split("Shared context:\n").length - 1, 1);
+      assert.match(descriptions["Planner"], /prefer single-story[\s\S]*comps/);
+      assert.match(descriptions["Market Analyst"], /comps/);
+      assert.match(descriptions["Market Analyst"], /prefer single-story/);
+      assert.match(descriptions["Finance Analyst"], /under 900k/);
+      assert.match(descriptions["Finance Analyst"], /budget/);
+      assert.doesNotMatch(descriptions["Finance Analyst"], /comps/);
+      assert.match(descriptions["Graph Analyst"], /Candidate zpids: 111, 222/);
+      assert.doesNotMatch(descriptions["Reporter"], /comps/);
+      assert.match(descriptions["Reporter"], /under 900k/);
+    },
+  );
 });
@@ -0,0 +1,323 @@
+"""
+Semantic answer cache for the EstateWise chatbot.
+
+Near-identical questions ("3 bed homes near UNC under 500k") reuse a prior
+answer instead of re-running retrieval, the experts and the merge. Entries are
+keyed by:
+
+- the query embedding (cosine similarity >= threshold),
+- the numeric constraints in the message (budget, beds, baths, other numbers),
+- a normalized user_context, and
+- the tail of the conversation history (the last exchange by default),
+
+so the same words in a different conversation do not collide, and "under
+500k" never answers "under 600k" however close the embeddings are. A cheaper
+exact layer on the normalized message text answers repeats before any
+embedding call. Entries expire after a TTL, the cache is LRU-bounded, and
+everything is dropped when the index version changes. Ingest jobs stamp the
+version with write_index_version(), which stores it in the Pinecone index
+itself (a marker vector in META_NAMESPACE) so a chatbot running elsewhere,
+e.g. in Colab, sees it; the local INDEX_VERSION_PATH file is the fallback.
+"""
+import hashlib
+import json
+import os
+import re
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+
+import numpy as np
+
+from conversation_memory import extract_preferences
+from namespaces import META_NAMESPACE
+
+INDEX_VERSION_PATH = Path(os.getenv("INDEX_VERSION_PATH", Path(__file__).resolve().parent / "index_version.json"))
+# Marker vector holding the version stamp in the index's META_NAMESPACE.
+INDEX_VERSION_ID = "index-version"
+
+CacheEntry = namedtuple("CacheEntry", ["key", "context_key", "text_key", "embedding", "value", "created", "version"])
+CacheHit = namedtuple("CacheHit", ["value", "kind", "similarity", "age"])
+
+_WS_RE = re.compile(r"\s+")
+_PUNCT_RE = re.compile(r"[^\w\s$%.-]")
+_NUMBER_RE = re.compile(r"(\d+(?:,\d{3})*(?:\.\d+)?)\s*(k|m)?\b")
+_SCALE = {"k": 1_000, "m": 1_000_000}
+_PREF_NUMBERS = ("budget_min", "budget_max", "bedrooms", "bathrooms")
+
+
+def _field(obj, name, default=None):
+    return obj.get(name, default) if isinstance(obj, dict) else getattr(obj, name, default)
+
+
+def _default_index():
+    try:
+        from pinecone_client import index
+        return index
+    except Exception as e:
+        logging.warning("Pinecone is not configured (%s); index version stays local.", e)
+        return None
+
+
+def write_index_version(path=INDEX_VERSION_PATH, version=None, index=None):
+    """
+    Stamp a new index version. Ingest jobs call this after re-ingesting so
+    every answer cache reading the stamp invalidates itself. The stamp goes
+    to the local file and to the Pinecone index (pinecone_client's unless
+    index is given).
+    """
+    version = version or f"{int(time.time())}"
+    written_at = time.time()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "written_at": written_at}, f)
+    index = index if index is not None else _default_index()
+    if index is not None:
+        # Pinecone rejects all-zero dense vectors; the values are never queried.
+        dims = int(_field(index.describe_index_stats(), "dimension"))
+        marker = {"id": INDEX_VERSION_ID, "values": [1.0] + [0.0] * (dims - 1),
+                  "metadata": {"version": version, "written_at": written_at}}
+        index.upsert(vectors=[marker], namespace=META_NAMESPACE)
+    return version
+
+
+def read_index_version(path=INDEX_VERSION_PATH, index=None):
+    """
+    The stamped version: from index when given and stamped, else the local
+    file. A failed fetch raises rather than answering with the file's
+    version, so a caller can keep the version it has.
+    """
+    if index is not None:
+        found = _field(index.fetch(ids=[INDEX_VERSION_ID], namespace=META_NAMESPACE), "vectors", {}) or {}
+        marker = found.get(INDEX_VERSION_ID)
+        if marker is not None:
+            return (_field(marker, "metadata", None) or {}).get("version")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("version")
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def numeric_constraints(message):
+    """
+    Budget and room constraints plus any other numbers in the message, as a
+    key part. Questions that differ only in a number embed almost alike.
+    """
+    prefs = extract_preferences(message or "")
+    parts = [f"{k}={prefs[k]:.12g}" for k in _PREF_NUMBERS if prefs.get(k)]
+    numbers = {float(n.replace(",", "")) * _SCALE.get(unit, 1) for n, unit in _NUMBER_RE.findall((message or "").lower())}
+    parts += [f"{n:.12g}" for n in sorted(numbers)]
+    return ",".join(parts)
+
+
+def normalize_text(text):
+    text = _PUNCT_RE.sub(" ", (text or "").lower())
+    return _WS_RE.sub(" ", text).strip()
+
+
+def _digest(*parts):
+    h = hashlib.sha1()
+    for p in parts:
+        h.update(p.encode("utf-8"))
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+
+class SemanticAnswerCache:
+    """
+    Thread-safe, size-bounded semantic cache of chat answers.
+    """
+
+    def __init__(self, threshold=0.95, ttl=3600.0, max_entries=1000, history_messages=2,
+                 version_fn=read_index_version, version_check_interval=30.0):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.history_messages = history_messages
+        self.version_fn = version_fn
+        self.version_check_interval = version_check_interval
+        self._entries = OrderedDict()
+        self._by_text = {}
+        self._by_context = {}
+        self._lock = threading.Lock()
+        self._version = None
+        if version_fn:
+            try:
+                self._version = version_fn()
+            except Exception as e:
+                logging.warning("Could not read the index version: %s", e)
+        self._version_checked = time.time()
+        self._refreshing = False
+        self._stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0,
+                       "expirations": 0, "invalidations": 0, "hit_age_total": 0.0, "hit_age_max": 0.0}
+
+    # -- keys ---------------------------------------------------------------
+
+    def context_key(self, user_context, history):
+        tail = list(history or [])[-self.history_messages:] if self.history_messages else []
+        return _digest(normalize_text(user_context), *[normalize_text(m) for m in tail])
+
+    def semantic_key(self, message, user_context, history):
+        """
+        Bucket for embedding matches: context plus the message's numeric constraints.
+        """
+        return _digest(self.context_key(user_context, history), numeric_constraints(message))
+
+    # -- housekeeping -------------------------------------------------------
+
+    def _check_version(self):
+        """
+        Start a background version refresh when one is due. Lookups never
+        wait on it, and never hold the lock across version_fn's I/O.
+        """
+        if not self.version_fn:
+            return
+        with self._lock:
+            now = time.time()
+            if self._refreshing or now - self._version_checked < self.version_check_interval:
+                return
+            self._version_checked = now
+            self._refreshing = True
+        threading.Thread(target=self._refresh_version, name="answer-cache-version", daemon=True).start()
+
+    def _refresh_version(self):
+        try:
+            version = self.version_fn()
+        except Exception as e:
+            # Keep the current version: a transient error must not empty the cache.
+            logging.warning("Index version check failed; keeping %s: %s", self._version, e)
+            with self._lock:
+                self._refreshing = False
+            return
+        with self._lock:
+            self._refreshing = False
+            if version != self._version:
+                self._version = version
+                self._clear()
+                self._stats["invalidations"] += 1
+
+    def _clear(self):
+        self._entries.clear()
+        self._by_text.clear()
+        self._by_context.clear()
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        if self._by_text.get(entry.text_key) == key:
+            del self._by_text[entry.text_key]
+        keys = self._by_context.get(entry.context_key)
+        if keys is not None:
+            keys.pop(key, None)
+            if not keys:
+                del self._by_context[entry.context_key]
+
+    def _fresh(self, entry, now):
+        if now - entry.created > self.ttl:
+            self._drop(entry.key)
+            self._stats["expirations"] += 1
+            return False
+        return True
+
+    def _hit(self, entry, kind, similarity, now):
+        self._entries.move_to_end(entry.key)
+        age = now - entry.created
+        self._stats[f"{kind}_hits"] += 1
+        self._stats["hit_age_total"] += age
+        self._stats["hit_age_max"] = max(self._stats["hit_age_max"], age)
+        return CacheHit(entry.value, kind, similarity, age)
+
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+            self._stats["invalidations"] += 1
+
+    # -- lookups ------------------------------------------------------------
+
+    def lookup_exact(self, message, user_context="", history=None, count_miss=True):
+        """
+        Match on normalized message text + context only; no embedding needed.
+        Pass count_miss=False when a semantic lookup follows.
+        """
+        ctx = self.context_key(user_context, history)
+        text_key = _digest(ctx, normalize_text(message))
+        self._check_version()
+        with self._lock:
+            now = time.time()
+            key = self._by_text.get(text_key)
+            entry = self._entries.get(key) if key else None
+            if entry is not None and self._fresh(entry, now):
+                return self._hit(entry, "exact", 1.0, now)
+            if count_miss:
+                self._stats["misses"] += 1
+        return None
+
+    def lookup(self, embedding, user_context="", history=None, count_miss=True, message=""):
+        """
+        Best cached answer within the same context and numeric constraints
+        (taken from message) whose embedding has cosine similarity >=
+        threshold, or None.
+        """
+        ctx = self.semantic_key(message, user_context, history)
+        q = np.asarray(embedding, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        self._check_version()
+        with self._lock:
+            now = time.time()
+            keys = list(self._by_context.get(ctx, {}))
+            entries = [e for e in (self._entries[k] for k in keys) if self._fresh(e, now)]
+            if entries:
+                sims = np.stack([e.embedding for e in entries]) @ q
+                best = int(sims.argmax())
+                if sims[best] >= self.threshold:
+                    return self._hit(entries[best], "semantic", float(sims[best]), now)
+            if count_miss:
+                self._stats["misses"] += 1
+        return None
+
+    def put(self, message, value, user_context="", history=None, embedding=None):
+        text_key = _digest(self.context_key(user_context, history), normalize_text(message))
+        ctx = self.semantic_key(message, user_context, history)
+        emb = None
+        if embedding is not None:
+            emb = np.asarray(embedding, dtype=np.float32)
+            emb = emb / (np.linalg.norm(emb) or 1.0)
+        with self._lock:
+            key = text_key
+            self._drop(key)
+            entry = CacheEntry(key, ctx, text_key, emb, value, time.time(), self._version)
+            self._entries[key] = entry
+            self._by_text[text_key] = key
+            if emb is not None:
+                self._by_context.setdefault(ctx, {})[key] = True
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._stats["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+            size = len(self._entries)
+            now = time.time()
+            ages = [now - e.created for e in self._entries.values()]
+        hits = s["exact_hits"] + s["semantic_hits"]
+        lookups = hits + s["misses"]
+        return {
+            "size": size,
+            "hits": hits,
+            "exact_hits": s["exact_hits"],
+            "semantic_hits": s["semantic_hits"],
+            "misses": s["misses"],
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "evictions": s["evictions"],
+            "expirations": s["expirations"],
+            "invalidations": s["invalidations"],
+            "avg_hit_staleness_s": s["hit_age_total"] / hits if hits else 0.0,
+            "max_hit_staleness_s": s["hit_age_max"],
+            "oldest_entry_s": max(ages) if ages else 0.0,
+            "index_version": self._version,
+        }
@@ -0,0 +1,325 @@
+"""
+Offline benchmark for the EstateWise chat pipeline (estatewise_chat.py).
+
+Replaces the Gemini client and Pinecone index with fakes that sleep for a
+configurable latency distribution and return configurable response sizes,
+runs scripted conversations across N concurrent sessions, and reports
+per-stage p50/p95/p99 (decision, embed, query, clustering, experts, merge,
+summary), per-turn totals and overall throughput. Stage times come from the
+pipeline's own tracing spans (tracing.py), collected in memory. Memory
+summarization runs after a turn (estatewise_chat.remember_turn), so summary
+times come from its memory.update traces and are not part of turn totals.
+No API keys or network needed.
+
+Usage:
+    python bench_chat.py                          # 8 sessions, default script
+    python bench_chat.py --sessions 32 --llm-median-ms 400 --llm-p95-ms 1500
+    python bench_chat.py --no-cache --json
+    python bench_chat.py --trace-out traces.jsonl  # keep every turn's trace
+"""
+import argparse
+import hashlib
+import json
+import logging
+import math
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import estatewise_chat
+from fetch_intent import load_model
+from expert_router import load_router
+from answer_cache import SemanticAnswerCache
+from conversation_memory import ConversationMemory
+from tracing import InMemoryExporter, Tracer
+
+# Report stage -> span name emitted by estatewise_chat.
+STAGES = {
+    "decision": "fetch_decision",
+    "embed": "embed",
+    "query": "vector.query",
+    "clustering": "clustering",
+    "experts": "llm.expert",
+    "merge": "llm.merge",
+    "summary": "memory.summarize",
+}
+NETWORK_SPANS = ("embed", "vector.query")
+
+DEFAULT_SCRIPT = [
+    [
+        "hi",
+        "3 bed homes near UNC under 500k",
+        "what would the mortgage be on the cheapest one with 20% down?",
+        "are any of them near a park or greenway?",
+        "thanks",
+    ],
+    [
+        "Show me condos in Carrboro",
+        "What is escrow?",
+        "Which of those has the lowest price per square foot?",
+        "3 bed homes near UNC under 500k",
+    ],
+    [
+        "I'm relocating to Chapel Hill with two kids, what's on the market?",
+        "Which neighborhoods are safest?",
+        "Group these homes into segments for me",
+        "is it close to a grocery store?",
+    ],
+]
+
+class LatencyModel:
+    """
+    Log-normal latency parameterized by median and p95, in milliseconds.
+    """
+
+    def __init__(self, median_ms, p95_ms, rng):
+        self.mu = math.log(max(median_ms, 1e-3))
+        self.sigma = max(0.0, math.log(max(p95_ms, median_ms) / max(median_ms, 1e-3)) / 1.645)
+        self.rng = rng
+        self.lock = threading.Lock()
+
+    def sample(self):
+        with self.lock:
+            return self.rng.lognormvariate(self.mu, self.sigma) / 1000.0
+
+
+class _Obj:
+    def __init__(self, **kw):
+        self.__dict__.update(kw)
+
+
+class FakeModels:
+    def __init__(self, latency, expert_chars, merge_chars):
+        self.latency = latency
+        self.expert_chars = expert_chars
+        self.merge_chars = merge_chars
+
+    @staticmethod
+    def stage_for(prompt):
+        if "Respond with exactly 'Yes' or 'No'" in prompt:
+            return "decision"
+        if "EstateWise Master Agent" in prompt:
+            return "merge"
+        if "running summary" in prompt:
+            return "summary"
+        return "experts"
+
+    def generate_content(self, model, contents):
+        stage = self.stage_for(contents)
+        time.sleep(self.latency.sample())
+        if stage == "decision":
+            text = "Yes"
+        elif stage == "merge":
+            text = ("Here are my top recommendations. " * 40)[:self.merge_chars]
+        elif stage == "summary":
+            text = "User is looking for family homes near UNC under 500k."
+        else:
+            text = ("Expert view on the listings above. " * 40)[:self.expert_chars]
+        return _Obj(text=text)
+
+
+class FakeEmbeddings:
+    def __init__(self, latency, dims):
+        self.latency = latency
+        self.dims = dims
+
+    def create(self, model, content):
+        time.sleep(self.latency.sample())
+        # Deterministic per text so repeated questions hit the answer cache.
+        seed = int.from_bytes(hashlib.sha1(content.lower().encode("utf-8")).digest()[:8], "little")
+        vec = np.random.default_rng(seed).standard_normal(self.dims).tolist()
+        return _Obj(data=[_Obj(embedding=vec)])
+
+
+class FakeGenAIClient:
+    """
+    Stand-in for google.genai.Client: .models.generate_content and .embeddings.create.
+    """
+
+    def __init__(self, llm_latency, embed_latency, expert_chars=1200, merge_chars=2000, dims=768):
+        self.models = FakeModels(llm_latency, expert_chars, merge_chars)
+        self.embeddings = FakeEmbeddings(embed_latency, dims)
+
+
+class FakeIndex:
+    """
+    Stand-in for a Pinecone index returning synthetic listings.
+    """
+
+    def __init__(self, latency, description_chars=600, seed=0):
+        self.latency = latency
+        rng = random.Random(seed)
+        self.listings = []
+        for i in range(500):
+            beds = rng.randint(1, 6)
+            area = rng.randint(600, 4500)
+            self.listings.append({
+                "zpid": 10_000_000 + i,
+                "city": rng.choice(["Chapel Hill", "Carrboro", "Durham"]),
+                "state": "NC",
+                "address": json.dumps({"streetAddress": f"{100 + i} Example St", "city": "Chapel Hill",
+                                       "state": "NC", "zipcode": rng.choice(["27514", "27516", "27517"])}),
+                "bedrooms": beds,
+                "bathrooms": max(1, beds - rng.randint(0, 2)),
+                "price": float(area * rng.randint(150, 450)),
+                "yearBuilt": rng.randint(1920, 2024),
+                "livingArea": float(area),
+                "homeType": rng.choice(["SINGLE_FAMILY", "CONDO", "TOWNHOUSE"]),
+                "description": ("Bright home with updated kitchen and large yard. " * 20)[:description_chars],
+            })
+
+    def query(self, vector, top_k=30, include_metadata=True, **kwargs):
+        time.sleep(self.latency.sample())
+        start = int(abs(vector[0]) * 1000) % (len(self.listings) - top_k)
+        matches = [
+            {"id": str(md["zpid"]), "score": 0.9 - 0.01 * j, "metadata": md}
+            for j, md in enumerate(self.listings[start:start + top_k])
+        ]
+        return {"matches": matches}
+
+
+def _percentiles(values):
+    if not values:
+        return {"n": 0, "p50": 0.0, "p95": 0.0, "p99": 0.0}
+    arr = np.asarray(values, dtype=np.float64)
+    return {
+        "n": len(values),
+        "p50": float(np.percentile(arr, 50)),
+        "p95": float(np.percentile(arr, 95)),
+        "p99": float(np.percentile(arr, 99)),
+    }
+
+
+def run_benchmark(sessions=8, script=None, seed=42, llm=(350.0, 1200.0), embed=(60.0, 150.0),
+                  query=(40.0, 120.0), expert_chars=1200, merge_chars=2000, description_chars=600,
+                  use_cache=True, repeat=1, trace_out=None):
+    """
+    Run `sessions` concurrent scripted conversations against fake backends and
+    return a report dict. trace_out, if set, receives every turn's trace as JSON lines.
+    """
+    script = script or DEFAULT_SCRIPT
+    rng = random.Random(seed)
+    fake_client = FakeGenAIClient(LatencyModel(*llm, rng), LatencyModel(*embed, rng), expert_chars, merge_chars)
+    fake_index = FakeIndex(LatencyModel(*query, rng), description_chars, seed)
+    estatewise_chat.configure(fake_client, fake_index)
+    saved_cache = estatewise_chat.ANSWER_CACHE
+    estatewise_chat.ANSWER_CACHE = SemanticAnswerCache(max_entries=1000, version_fn=None) if use_cache else None
+
+    # Load (or train in memory) the local routing models up front so the
+    # first turns don't pay for it.
+    load_model()
+    load_router()
+
+    exporter = InMemoryExporter()
+    saved_tracer = estatewise_chat.TRACER
+    estatewise_chat.TRACER = Tracer([exporter])
+
+    def run_session(i):
+        conversation = script[i % len(script)] * repeat
+        memory = ConversationMemory(summarizer=estatewise_chat.gemini_summarizer)
+        for msg in conversation:
+            reply, _ = estatewise_chat.chat_with_estatewise(memory, msg)
+            estatewise_chat.remember_turn(memory, msg, reply)
+
+    try:
+        t_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=sessions) as pool:
+            list(pool.map(run_session, range(sessions)))
+        wall = time.perf_counter() - t_start
+    finally:
+        estatewise_chat.TRACER = saved_tracer
+        cache, estatewise_chat.ANSWER_CACHE = estatewise_chat.ANSWER_CACHE, saved_cache
+
+    all_traces = exporter.drain()
+    if trace_out:
+        with open(trace_out, "w", encoding="utf-8") as f:
+            for t in all_traces:
+                f.write(json.dumps(t, default=str) + "\n")
+    traces = [t for t in all_traces if t["name"] == "chat.turn"]
+
+    def network_calls(t):
+        return sum(1 for s in t["spans"] if s["name"].startswith("llm.") or s["name"] in NETWORK_SPANS)
+
+    report = {
+        "sessions": sessions,
+        "turns": len(traces),
+        "wall_seconds": wall,
+        "throughput_turns_per_s": len(traces) / wall if wall else 0.0,
+        "network_calls_per_turn": sum(network_calls(t) for t in traces) / (len(traces) or 1),
+        "stages_ms": {
+            stage: _percentiles([t["stages_ms"][name] for t in all_traces if name in t["stages_ms"]])
+            for stage, name in STAGES.items()
+        },
+        "turn_total_ms": _percentiles([t["duration_ms"] for t in traces]),
+        "tokens_per_turn": {
+            "in": float(np.mean([t["tokens"]["in"] for t in traces])) if traces else 0.0,
+            "out": float(np.mean([t["tokens"]["out"] for t in traces])) if traces else 0.0,
+        },
+        "paths": dict(Counter(t["attrs"].get("path", "unknown") for t in traces)),
+        "answer_cache": cache.stats() if cache is not None else None,
+    }
+    return report
+
+
+def print_report(report):
+    print(f"sessions={report['sessions']} turns={report['turns']} wall={report['wall_seconds']:.2f}s "
+          f"throughput={report['throughput_turns_per_s']:.2f} turns/s "
+          f"network_calls/turn={report['network_calls_per_turn']:.2f}")
+    print(f"{'stage':<12} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = list(report["stages_ms"].items()) + [("turn total", report["turn_total_ms"])]
+    for stage, p in rows:
+        print(f"{stage:<12} {p['n']:>5} {p['p50']:>9.1f} {p['p95']:>9.1f} {p['p99']:>9.1f}")
+    print(f"tokens/turn: in={report['tokens_per_turn']['in']:.0f} out={report['tokens_per_turn']['out']:.0f}  "
+          f"paths: {', '.join(f'{k}={v}' for k, v in sorted(report['paths'].items()))}")
+    cache = report["answer_cache"]
+    if cache is None:
+        print("answer cache: off")
+    else:
+        print(f"answer cache: hit_rate={cache['hit_rate']:.2%} hits={cache['hits']} misses={cache['misses']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent scripted sessions")
+    parser.add_argument("--repeat", type=int, default=1, help="repeat each session's script this many times")
+    parser.add_argument("--script", help="JSON file with a list of conversations (lists of messages)")
+    parser.add_argument("--llm-median-ms", type=float, default=350.0)
+    parser.add_argument("--llm-p95-ms", type=float, default=1200.0)
+    parser.add_argument("--embed-median-ms", type=float, default=60.0)
+    parser.add_argument("--embed-p95-ms", type=float, default=150.0)
+    parser.add_argument("--query-median-ms", type=float, default=40.0)
+    parser.add_argument("--query-p95-ms", type=float, default=120.0)
+    parser.add_argument("--expert-chars", type=int, default=1200, help="size of each fake expert response")
+    parser.add_argument("--merge-chars", type=int, default=2000, help="size of the fake merged response")
+    parser.add_argument("--description-chars", type=int, default=600, help="listing description size in metadata")
+    parser.add_argument("--no-cache", action="store_true", help="disable the answer cache")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--trace-out", help="write every turn's trace to this JSON lines file")
+    args = parser.parse_args()
+
+    script = None
+    if args.script:
+        with open(args.script, "r", encoding="utf-8") as f:
+            script = json.load(f)
+
+    report = run_benchmark(
+        sessions=args.sessions, script=script, seed=args.seed,
+        llm=(args.llm_median_ms, args.llm_p95_ms), embed=(args.embed_median_ms, args.embed_p95_ms),
+        query=(args.query_median_ms, args.query_p95_ms), expert_chars=args.expert_chars,
+        merge_chars=args.merge_chars, description_chars=args.description_chars,
+        use_cache=not args.no_cache, repeat=args.repeat, trace_out=args.trace_out,
+    )
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark clustering.kmeans against the chatbot's previous pure-Python
+kmeans() and sklearn's KMeans on synthetic property features.
+
+Usage:
+    python bench_clustering.py                       # 30, 10k and 1M points
+    python bench_clustering.py --sizes 30 10000 --legacy-max 10000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from clustering import assign, kmeans, minmax_normalize
+
+
+def legacy_kmeans(data, k, max_iter=20):
+    """
+    The chatbot's original implementation, kept verbatim for comparison.
+    """
+    if not data or k <= 0:
+        return []
+    n, dims = len(data), len(data[0])
+    centroids = [row.copy() for row in data[:min(k, n)]]
+    while len(centroids) < k:
+        centroids.append(data[-1].copy())
+    assign_ = [0] * n
+    for _ in range(max_iter):
+        moved = False
+        for i, pt in enumerate(data):
+            dists = [sum((pt[d] - c[d])**2 for d in range(dims)) for c in centroids]
+            c = dists.index(min(dists))
+            if assign_[i] != c:
+                assign_[i] = c
+                moved = True
+        if not moved:
+            break
+        sums = [[0]*dims for _ in range(k)]
+        counts = [0]*k
+        for i, pt in enumerate(data):
+            c = assign_[i]
+            counts[c] += 1
+            for d in range(dims):
+                sums[c][d] += pt[d]
+        for c in range(k):
+            if counts[c]:
+                centroids[c] = [sums[c][d]/counts[c] for d in range(dims)]
+    return assign_
+
+
+def legacy_normalize(vecs):
+    dims = len(vecs[0])
+    mins = [min(v[i] for v in vecs) for i in range(dims)]
+    maxs = [max(v[i] for v in vecs) for i in range(dims)]
+    return [
+        [(v[i]-mins[i])/(maxs[i]-mins[i]) if maxs[i]!=mins[i] else 0.0 for i in range(dims)]
+        for v in vecs
+    ]
+
+
+def synthetic_features(n, seed=0):
+    """
+    price, bedrooms, bathrooms, livingArea, yearBuilt with realistic spread.
+    """
+    rng = np.random.default_rng(seed)
+    beds = rng.integers(1, 7, size=n).astype(np.float64)
+    baths = np.clip(beds - rng.integers(0, 2, size=n) + rng.choice([0, 0.5], size=n), 1, None)
+    area = np.clip(rng.normal(600 + 450 * beds, 300), 300, 12000)
+    year = rng.integers(1900, 2026, size=n).astype(np.float64)
+    price = np.clip(area * rng.lognormal(np.log(250), 0.35, size=n), 40_000, 10_000_000)
+    return np.column_stack([price, beds, baths, area, year])
+
+
+def inertia(X, labels):
+    total = 0.0
+    for c in np.unique(labels):
+        pts = X[labels == c]
+        total += float(np.square(pts - pts.mean(axis=0)).sum())
+    return total
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def run(sizes, k, legacy_max, sklearn_max, seed):
+    try:
+        from sklearn.cluster import KMeans as SkKMeans
+    except ImportError:
+        SkKMeans = None
+
+    header = f"{'n':>9} | {'impl':<22} | {'seconds':>9} | {'inertia':>12}"
+    print(header)
+    print("-" * len(header))
+    for n in sizes:
+        raw = synthetic_features(n, seed)
+        rows = []
+
+        if n <= legacy_max:
+            vecs = raw.tolist()
+            labels, secs = timed(lambda: legacy_kmeans(legacy_normalize(vecs), k))
+            rows.append(("legacy pure-Python", secs, inertia(np.asarray(legacy_normalize(vecs)), np.asarray(labels))))
+        else:
+            rows.append(("legacy pure-Python", None, None))
+
+        X, _, _ = minmax_normalize(raw)
+        res, secs = timed(lambda: kmeans(minmax_normalize(raw)[0], k, seed=seed))
+        rows.append(("numpy lloyd", secs, res.inertia))
+
+        if n >= 10_000:
+            res, secs = timed(lambda: kmeans(minmax_normalize(raw)[0], k, seed=seed, batch_size=4096))
+            rows.append(("numpy mini-batch", secs, float(assign(X, res.centroids)[1].sum())))
+
+        if SkKMeans is not None and n <= sklearn_max:
+            est = SkKMeans(n_clusters=k, n_init=1, random_state=seed)
+            labels, secs = timed(lambda: est.fit_predict(minmax_normalize(raw)[0]))
+            rows.append(("sklearn KMeans", secs, float(est.inertia_)))
+        elif SkKMeans is None:
+            rows.append(("sklearn KMeans", None, None))
+
+        for name, secs, inert in rows:
+            if secs is None:
+                print(f"{n:>9,} | {name:<22} | {'skipped':>9} | {'':>12}")
+            else:
+                print(f"{n:>9,} | {name:<22} | {secs:>9.4f} | {inert:>12.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[30, 10_000, 1_000_000])
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--legacy-max", type=int, default=10_000,
+                        help="skip the pure-Python implementation above this many points")
+    parser.add_argument("--sklearn-max", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    run(args.sizes, args.k, args.legacy_max, args.sklearn_max, args.seed)
+
+
+if __name__ == "__main__":
+    main()
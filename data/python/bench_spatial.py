@@ -0,0 +1,165 @@
+"""
+Benchmark spatial_index.SpatialIndex against brute-force NumPy scans and
+sklearn's BallTree on synthetic North Carolina listings.
+
+Radius queries use 0.5-5 mile circles, bounding boxes ~4 km a side and kNN
+k=30, all around metro centers, with and without a price/bedroom filter.
+Before timing, radius, radius+filter, bbox, kNN and kNN+filter results for
+the first 200 queries are checked against the brute-force answers.
+
+Usage:
+    python bench_spatial.py                      # 100k and 1M points
+    python bench_spatial.py --sizes 100000 --queries 2000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from spatial_index import KM_PER_MILE, SpatialIndex, haversine_km
+
+# (lat, lon, spread in degrees, share of listings)
+METRO_CENTERS = [
+    (35.91, -79.05, 0.08, 0.15),   # Chapel Hill / Carrboro
+    (35.99, -78.90, 0.10, 0.20),   # Durham
+    (35.78, -78.64, 0.15, 0.30),   # Raleigh / Cary
+    (35.23, -80.84, 0.18, 0.25),   # Charlotte
+    (36.07, -79.79, 0.12, 0.10),   # Greensboro
+]
+FILTER = {"price": (None, 500_000), "bedrooms": (3, None)}
+
+
+def synthetic_listings(n, seed=0):
+    rng = np.random.default_rng(seed)
+    shares = np.array([m[3] for m in METRO_CENTERS])
+    metro = rng.choice(len(METRO_CENTERS), size=n, p=shares / shares.sum())
+    centers = np.array([(m[0], m[1]) for m in METRO_CENTERS])
+    spread = np.array([m[2] for m in METRO_CENTERS])[metro]
+    lats = centers[metro, 0] + rng.normal(0, 1, n) * spread
+    lons = centers[metro, 1] + rng.normal(0, 1, n) * spread * 1.2
+    beds = rng.integers(1, 7, size=n).astype(np.float64)
+    attrs = {
+        "price": np.clip(rng.lognormal(np.log(380_000), 0.5, n), 40_000, 10_000_000),
+        "bedrooms": beds,
+        "bathrooms": np.clip(beds - rng.integers(0, 2, size=n), 1, None),
+        "livingArea": np.clip(rng.normal(600 + 450 * beds, 300), 300, 12000),
+        "yearBuilt": rng.integers(1900, 2026, size=n).astype(np.float64),
+    }
+    return np.arange(n, dtype=np.int64) + 10_000_000, lats, lons, attrs
+
+
+def brute_mask(attrs, where):
+    mask = np.ones(len(next(iter(attrs.values()))), dtype=bool)
+    for field, (lo, hi) in (where or {}).items():
+        if lo is not None:
+            mask &= attrs[field] >= lo
+        if hi is not None:
+            mask &= attrs[field] <= hi
+    return mask
+
+
+def percentiles_us(samples):
+    a = np.asarray(samples) * 1e6
+    return np.percentile(a, 50), np.percentile(a, 95)
+
+
+def run(sizes, n_queries, seed):
+    try:
+        from sklearn.neighbors import BallTree
+    except ImportError:
+        BallTree = None
+
+    header = f"{'n':>9} | {'query':<16} | {'impl':<12} | {'p50 us':>9} | {'p95 us':>9} | {'hits':>7}"
+    for n in sizes:
+        ids, lats, lons, attrs = synthetic_listings(n, seed)
+        t0 = time.perf_counter()
+        index = SpatialIndex(ids, lats, lons, attrs)
+        build = time.perf_counter() - t0
+        tree, tree_build = None, None
+        if BallTree is not None:
+            t0 = time.perf_counter()
+            tree = BallTree(np.radians(np.column_stack([lats, lons])), metric="haversine")
+            tree_build = time.perf_counter() - t0
+        print(f"\n{n:,} points: grid built in {build:.2f}s ({index.nx}x{index.ny} cells)"
+              + (f", BallTree in {tree_build:.2f}s" if tree is not None else ""))
+        print(header)
+        print("-" * len(header))
+
+        rng = np.random.default_rng(seed + 1)
+        pick = rng.integers(0, n, n_queries)
+        q_lat = lats[pick] + rng.normal(0, 0.01, n_queries)
+        q_lon = lons[pick] + rng.normal(0, 0.01, n_queries)
+        radii = rng.uniform(0.5, 5.0, n_queries) * KM_PER_MILE
+        brute_n = min(n_queries, 200)
+        filtered = brute_mask(attrs, FILTER)
+
+        def bench(name, impl, fn, count=n_queries):
+            times, hits = [], 0
+            for i in range(count):
+                t0 = time.perf_counter()
+                out = fn(i)
+                times.append(time.perf_counter() - t0)
+                hits += len(out)
+            p50, p95 = percentiles_us(times)
+            print(f"{n:>9,} | {name:<16} | {impl:<12} | {p50:>9.1f} | {p95:>9.1f} | {hits / count:>7.1f}")
+
+        def brute_radius(i, where=None):
+            d = haversine_km(q_lat[i], q_lon[i], lats, lons)
+            m = d <= radii[i]
+            return np.nonzero(m & filtered if where else m)[0]
+
+        half = 2.0 / 111.0
+
+        def brute_bbox(i):
+            return np.nonzero((lats >= q_lat[i] - half) & (lats <= q_lat[i] + half)
+                              & (lons >= q_lon[i] - half) & (lons <= q_lon[i] + half))[0]
+
+        def brute_knn(i, k=30, where=None):
+            d = haversine_km(q_lat[i], q_lon[i], lats, lons)
+            if where:
+                d = np.where(filtered, d, np.inf)
+            return np.sort(d)[:k]
+
+        # Correctness against brute force before timing. kNN is compared by
+        # distances, since equidistant points may be returned in either order.
+        for i in range(brute_n):
+            for where in (None, FILTER):
+                got = set(index.ids[index.radius(q_lat[i], q_lon[i], radii[i], where)[0]])
+                assert got == set(ids[brute_radius(i, where)]), "radius mismatch"
+            got = set(index.ids[index.bbox(q_lat[i] - half, q_lon[i] - half, q_lat[i] + half, q_lon[i] + half)])
+            assert got == set(ids[brute_bbox(i)]), "bbox mismatch"
+            for where in (None, FILTER):
+                _, dist = index.nearest(q_lat[i], q_lon[i], 30, where)
+                assert np.allclose(dist, brute_knn(i, 30, where), rtol=1e-9, atol=1e-9), "knn mismatch"
+
+        bench("radius", "grid", lambda i: index.radius(q_lat[i], q_lon[i], radii[i])[0])
+        bench("radius", "brute", brute_radius, brute_n)
+        if tree is not None:
+            bench("radius", "balltree", lambda i: tree.query_radius(
+                np.radians([[q_lat[i], q_lon[i]]]), radii[i] / 6371.0088)[0])
+        bench("radius+filter", "grid", lambda i: index.radius(q_lat[i], q_lon[i], radii[i], FILTER)[0])
+        bench("radius+filter", "brute", lambda i: brute_radius(i, FILTER), brute_n)
+
+        bench("bbox", "grid", lambda i: index.bbox(q_lat[i] - half, q_lon[i] - half, q_lat[i] + half,
+                                                   q_lon[i] + half))
+        bench("bbox", "brute", brute_bbox, brute_n)
+
+        bench("knn k=30", "grid", lambda i: index.nearest(q_lat[i], q_lon[i], 30)[0])
+        bench("knn k=30", "brute", lambda i: np.argpartition(
+            haversine_km(q_lat[i], q_lon[i], lats, lons), 30)[:30], brute_n)
+        if tree is not None:
+            bench("knn k=30", "balltree", lambda i: tree.query(np.radians([[q_lat[i], q_lon[i]]]), k=30)[1][0])
+        bench("knn+filter", "grid", lambda i: index.nearest(q_lat[i], q_lon[i], 30, FILTER)[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    run(args.sizes, args.queries, args.seed)
+
+
+if __name__ == "__main__":
+    main()
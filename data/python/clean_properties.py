@@ -4,6 +4,7 @@ import logging
 from dotenv import load_dotenv
 from pymongo import MongoClient
 from utils import clean_document
+from derived_features import load_city_prices
 
 # Load environment variables
 load_dotenv()
@@ -29,9 +30,11 @@ def clean_properties():
         total_docs = len(docs)
         logging.info(f"Found {total_docs} documents.")
         updated_count = 0
+        # Percentiles stay -1 until derived_features.py has built the city table.
+        city_prices = load_city_prices()
 
         for doc in docs:
-            cleaned = clean_document(doc)
+            cleaned = clean_document(doc, city_prices)
             result = properties_collection.update_one({"_id": doc["_id"]}, {"$set": cleaned})
             if result.modified_count:
                 updated_count += 1
@@ -0,0 +1,159 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+
+import numpy as np
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+
+from clustering import impute_mean, kmeans, minmax_normalize
+from cluster_profiles import FEATURES, PROFILES_PATH, feature_vector
+from answer_cache import write_index_version
+from namespaces import SHARDING_ENABLED, DEFAULT_NAMESPACE, namespace_for
+
+# Load environment variables
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI")
+if not MONGO_URI:
+    logging.error("MONGO_URI is not set in .env")
+    sys.exit(1)
+
+client = MongoClient(MONGO_URI)
+db = client.get_default_database()
+properties_collection = db["properties"]
+
+CLUSTER_COUNT = 4
+MONGO_BATCH_SIZE = 1000
+
+
+def load_features():
+    """
+    Stream the cleaned corpus and return (mongo _ids, zpids, Pinecone namespaces,
+    raw feature matrix with NaN gaps).
+    """
+    projection = {"_id": 1, "zpid": 1, "city": 1, "state": 1, **{f: 1 for f in FEATURES}}
+    ids, zpids, spaces, rows = [], [], [], []
+    for doc in properties_collection.find({}, projection, batch_size=5000):
+        ids.append(doc["_id"])
+        zpids.append(doc.get("zpid"))
+        spaces.append(namespace_for(doc.get("state"), doc.get("city")) if SHARDING_ENABLED else DEFAULT_NAMESPACE)
+        rows.append(feature_vector(doc))
+    return ids, zpids, spaces, np.array(rows, dtype=np.float64).reshape(-1, len(FEATURES))
+
+
+def cluster_label(mean, corpus_mean):
+    """
+    Short human-readable label such as "higher-priced, newer, larger homes".
+    """
+    parts = [
+        "higher-priced" if mean["price"] > corpus_mean["price"] else "lower-priced",
+        "newer" if mean["yearBuilt"] > corpus_mean["yearBuilt"] else "older",
+        "larger" if mean["livingArea"] > corpus_mean["livingArea"] else "smaller",
+    ]
+    return ", ".join(parts) + " homes"
+
+
+def build_profiles(X_raw, X_imputed, result, mins, maxs, means):
+    corpus_mean = dict(zip(FEATURES, np.nanmean(X_raw, axis=0).tolist()))
+    clusters = []
+    for cid in range(result.centroids.shape[0]):
+        members = X_imputed[result.labels == cid]
+        if len(members) == 0:
+            continue
+        mean = dict(zip(FEATURES, members.mean(axis=0).tolist()))
+        clusters.append({
+            "id": cid,
+            "count": int(len(members)),
+            "label": cluster_label(mean, corpus_mean),
+            "centroid_normalized": result.centroids[cid].tolist(),
+            "mean": mean,
+            "min": dict(zip(FEATURES, members.min(axis=0).tolist())),
+            "max": dict(zip(FEATURES, members.max(axis=0).tolist())),
+        })
+    return {
+        "version": int(time.time()),
+        "k": int(result.centroids.shape[0]),
+        "features": FEATURES,
+        "mins": mins.tolist(),
+        "maxs": maxs.tolist(),
+        "means": means.tolist(),
+        "inertia": result.inertia,
+        "clusters": clusters,
+    }
+
+
+def write_mongo(ids, labels, dists):
+    ops = []
+    written = 0
+    for _id, cid, dist in zip(ids, labels, dists):
+        ops.append(UpdateOne({"_id": _id}, {"$set": {"clusterId": int(cid), "clusterDistance": round(float(dist), 6)}}))
+        if len(ops) >= MONGO_BATCH_SIZE:
+            written += properties_collection.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        written += properties_collection.bulk_write(ops, ordered=False).modified_count
+    logging.info("Updated cluster fields on %d Mongo documents.", written)
+
+
+def write_pinecone(zpids, spaces, labels, dists):
+    from pinecone_client import index
+    from upsert_batcher import rewrite_metadata
+
+    updates = [
+        (str(int(z)), ns, {"clusterId": int(c), "clusterDistance": round(float(d), 6)})
+        for z, ns, c, d in zip(zpids, spaces, labels, dists) if z
+    ]
+    written, missing = rewrite_metadata(index, updates)
+    logging.info("Updated cluster metadata on %d/%d Pinecone vectors (%d not in the index).",
+                 written, len(updates), missing)
+
+
+def cluster_corpus(k=CLUSTER_COUNT, output=PROFILES_PATH, skip_mongo=False, skip_pinecone=False, seed=42):
+    """
+    Cluster the full cleaned corpus on the chatbot's five features, store
+    clusterId/clusterDistance with every property, and write the profile table.
+    """
+    try:
+        ids, zpids, spaces, X_raw = load_features()
+        logging.info("Loaded %d properties for clustering.", len(ids))
+        if not ids:
+            logging.error("No properties found; nothing to cluster.")
+            return
+
+        X_imputed = impute_mean(X_raw)
+        means = X_imputed.mean(axis=0)
+        X, mins, maxs = minmax_normalize(X_imputed)
+        result = kmeans(X, k, seed=seed, n_init=5, batch_size="auto")
+        dists = np.sqrt(np.maximum(np.square(X - result.centroids[result.labels]).sum(axis=1), 0.0))
+
+        profiles = build_profiles(X_raw, X_imputed, result, mins, maxs, means)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(profiles, f, indent=2)
+        logging.info("Wrote %d cluster profiles to %s.", len(profiles["clusters"]), output)
+
+        if not skip_mongo:
+            write_mongo(ids, result.labels, dists)
+        if not skip_pinecone:
+            write_pinecone(zpids, spaces, result.labels, dists)
+        if not (skip_mongo and skip_pinecone):
+            write_index_version()
+    except Exception as err:
+        logging.error("Error during corpus clustering: %s", err)
+        sys.exit(1)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Precompute corpus-wide property clusters.")
+    parser.add_argument("--k", type=int, default=CLUSTER_COUNT)
+    parser.add_argument("--output", default=str(PROFILES_PATH))
+    parser.add_argument("--skip-mongo", action="store_true")
+    parser.add_argument("--skip-pinecone", action="store_true")
+    args = parser.parse_args()
+    cluster_corpus(args.k, args.output, args.skip_mongo, args.skip_pinecone)
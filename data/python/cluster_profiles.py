@@ -0,0 +1,105 @@
+"""
+Corpus-wide cluster profiles: lookup and assignment helpers.
+
+cluster_corpus.py clusters the whole cleaned corpus offline and writes
+cluster_profiles.json (scaling, centroids and per-cluster summaries). This
+module reads that table so the chatbot can describe clusters by lookup, and
+so the ingest path can assign new listings to the same stable clusters.
+"""
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from clustering import assign, minmax_normalize
+
+PROFILES_PATH = Path(os.getenv("CLUSTER_PROFILES_PATH", Path(__file__).resolve().parent / "cluster_profiles.json"))
+
+FEATURES = ["price", "bedrooms", "bathrooms", "livingArea", "yearBuilt"]
+# Cleaning stores 0 for out-of-range values; treat those as missing, not as data.
+ZERO_IS_MISSING = {"price", "livingArea", "yearBuilt"}
+
+
+def feature_vector(record):
+    """
+    The five clustering features of a cleaned record or metadata dict, with
+    missing values as NaN.
+    """
+    out = []
+    for name in FEATURES:
+        try:
+            v = float(record.get(name))
+        except (TypeError, ValueError):
+            v = float("nan")
+        if name in ZERO_IS_MISSING and v == 0:
+            v = float("nan")
+        out.append(v)
+    return out
+
+
+def load_cluster_profiles(path=PROFILES_PATH):
+    """
+    Load the profile table, or return None when the offline job has not run.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def assign_clusters(records, profiles):
+    """
+    Assign records to the corpus clusters. Returns (cluster_ids, distances),
+    distances being euclidean in the normalized feature space.
+    """
+    X = np.array([feature_vector(r) for r in records], dtype=np.float64)
+    means = np.asarray(profiles["means"], dtype=np.float64)
+    missing = np.isnan(X)
+    X[missing] = np.broadcast_to(means, X.shape)[missing]
+    norm, _, _ = minmax_normalize(X, profiles["mins"], profiles["maxs"])
+    centroids = np.array([c["centroid_normalized"] for c in profiles["clusters"]], dtype=np.float64)
+    labels, sq = assign(norm, centroids)
+    # Empty clusters are left out of the table, so map row positions to profile ids.
+    ids = np.array([c["id"] for c in profiles["clusters"]], dtype=np.int64)
+    return ids[labels], np.sqrt(sq)
+
+
+def cluster_metadata(record, profiles):
+    """
+    {"clusterId": ..., "clusterDistance": ...} for a single cleaned record.
+    """
+    labels, dists = assign_clusters([record], profiles)
+    return {"clusterId": int(labels[0]), "clusterDistance": round(float(dists[0]), 6)}
+
+
+def describe_cluster(profile):
+    mean = profile["mean"]
+    return (
+        f"Cluster {profile['id']} ({profile['count']:,} homes, {profile['label']}): "
+        f"avg price ${mean['price']:,.0f}, {mean['bedrooms']:.1f} bd / {mean['bathrooms']:.1f} ba, "
+        f"{mean['livingArea']:,.0f} sqft, built ~{mean['yearBuilt']:.0f}"
+    )
+
+
+def cluster_context(matches, profiles):
+    """
+    Cluster Analyst context for query matches whose metadata carries clusterId:
+    per-property assignments plus the profiles of the clusters involved.
+    Returns None if any match lacks a precomputed cluster.
+    """
+    ids = []
+    for m in matches:
+        cid = m["metadata"].get("clusterId")
+        if cid is None or cid == "":
+            return None
+        ids.append(int(float(cid)))
+    by_id = {c["id"]: c for c in profiles["clusters"]}
+    assignments = "\n".join(
+        f"- Property ID {m['id']}: cluster {cid}" for m, cid in zip(matches, ids)
+    )
+    profile_lines = "\n".join(
+        f"- {describe_cluster(by_id[cid])}" for cid in sorted(set(ids)) if cid in by_id
+    )
+    return f"Cluster Assignments:\n{assignments}\n\nCluster Profiles (corpus-wide):\n{profile_lines}"
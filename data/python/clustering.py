@@ -0,0 +1,186 @@
+"""
+Vectorized k-means for the EstateWise chatbot and analysis notebook.
+
+Replaces the pure-Python kmeans() in the chat path and sklearn's KMeans /
+MinMaxScaler / SimpleImputer in notebook section 6:
+
+- NumPy distance matrices (||x||^2 - 2x.c + ||c||^2), chunked to bound memory
+- k-means++ seeding and early stopping on centroid shift
+- Optional mini-batch updates for large inputs
+- Deterministic results for a given seed
+"""
+from collections import namedtuple
+
+import numpy as np
+
+KMeansResult = namedtuple("KMeansResult", ["labels", "centroids", "inertia", "n_iter"])
+
+# Rows per distance-matrix chunk; 65k x k float64 stays well under 10 MB.
+CHUNK_ROWS = 65536
+# Inputs larger than this switch to mini-batch updates when batch_size="auto".
+MINIBATCH_THRESHOLD = 200_000
+
+
+def impute_mean(X):
+    """
+    Replace NaNs with their column mean (all-NaN columns become 0).
+    """
+    X = np.array(X, dtype=np.float64, copy=True)
+    if X.ndim != 2 or not np.isnan(X).any():
+        return X
+    with np.errstate(invalid="ignore"):
+        means = np.nanmean(X, axis=0)
+    means = np.where(np.isnan(means), 0.0, means)
+    rows, cols = np.nonzero(np.isnan(X))
+    X[rows, cols] = means[cols]
+    return X
+
+
+def minmax_normalize(X, mins=None, maxs=None):
+    """
+    Scale each column to [0, 1]. Constant columns map to 0.
+
+    Pass mins/maxs to apply a previously fitted scaling. Returns
+    (normalized, mins, maxs).
+    """
+    X = np.asarray(X, dtype=np.float64)
+    mins = X.min(axis=0) if mins is None else np.asarray(mins, dtype=np.float64)
+    maxs = X.max(axis=0) if maxs is None else np.asarray(maxs, dtype=np.float64)
+    span = maxs - mins
+    safe = np.where(span > 0, span, 1.0)
+    norm = np.where(span > 0, (X - mins) / safe, 0.0)
+    return norm, mins, maxs
+
+
+def _sq_distances(X, centroids, x_sq=None):
+    """
+    Squared euclidean distances between every row of X and every centroid.
+    """
+    if x_sq is None:
+        x_sq = np.einsum("ij,ij->i", X, X)
+    c_sq = np.einsum("ij,ij->i", centroids, centroids)
+    d = x_sq[:, None] - 2.0 * (X @ centroids.T) + c_sq[None, :]
+    np.maximum(d, 0.0, out=d)
+    return d
+
+
+def assign(X, centroids, chunk_rows=CHUNK_ROWS, x_sq=None):
+    """
+    Nearest-centroid labels and squared distances, computed in row chunks.
+    x_sq optionally holds the precomputed squared row norms of X.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    centroids = np.asarray(centroids, dtype=np.float64)
+    n = X.shape[0]
+    labels = np.empty(n, dtype=np.int64)
+    dists = np.empty(n, dtype=np.float64)
+    for start in range(0, n, chunk_rows):
+        block = X[start:start + chunk_rows]
+        d = _sq_distances(block, centroids, None if x_sq is None else x_sq[start:start + chunk_rows])
+        lab = d.argmin(axis=1)
+        labels[start:start + chunk_rows] = lab
+        dists[start:start + chunk_rows] = d[np.arange(len(block)), lab]
+    return labels, dists
+
+
+def kmeans_plus_plus(X, k, rng):
+    """
+    k-means++ seeding: each new centroid is drawn with probability
+    proportional to its squared distance from the nearest chosen one.
+    """
+    n = X.shape[0]
+    centroids = np.empty((k, X.shape[1]), dtype=np.float64)
+    centroids[0] = X[rng.integers(n)]
+    closest = _sq_distances(X, centroids[:1])[:, 0]
+    for i in range(1, k):
+        total = closest.sum()
+        if total <= 0:
+            # Fewer distinct points than clusters; duplicates are harmless.
+            idx = rng.integers(n)
+        else:
+            idx = rng.choice(n, p=closest / total)
+        centroids[i] = X[idx]
+        np.minimum(closest, _sq_distances(X, centroids[i:i + 1])[:, 0], out=closest)
+    return centroids
+
+
+def _cluster_sums(X, labels, k):
+    """
+    Per-cluster column sums via one bincount per feature (much faster than np.add.at).
+    """
+    return np.column_stack([np.bincount(labels, weights=X[:, j], minlength=k) for j in range(X.shape[1])])
+
+
+def _lloyd(X, centroids, max_iter, tol):
+    k = centroids.shape[0]
+    x_sq = np.einsum("ij,ij->i", X, X)
+    labels = None
+    n_iter = 0
+    for n_iter in range(1, max_iter + 1):
+        new_labels, _ = assign(X, centroids, x_sq=x_sq)
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        counts = np.bincount(labels, minlength=k)
+        sums = _cluster_sums(X, labels, k)
+        moved = centroids.copy()
+        nonempty = counts > 0
+        moved[nonempty] = sums[nonempty] / counts[nonempty, None]
+        shift = np.square(moved - centroids).sum()
+        centroids = moved
+        if shift <= tol:
+            break
+    return centroids, n_iter
+
+
+def _minibatch(X, centroids, max_iter, tol, batch_size, rng):
+    k = centroids.shape[0]
+    counts = np.zeros(k, dtype=np.float64)
+    n_iter = 0
+    for n_iter in range(1, max_iter + 1):
+        batch = X[rng.integers(X.shape[0], size=batch_size)]
+        labels = _sq_distances(batch, centroids).argmin(axis=1)
+        before = centroids.copy()
+        batch_counts = np.bincount(labels, minlength=k).astype(np.float64)
+        sums = _cluster_sums(batch, labels, k)
+        counts += batch_counts
+        hit = batch_counts > 0
+        # Per-center learning rate 1/count (Sculley, 2010), applied in bulk.
+        eta = batch_counts[hit] / counts[hit]
+        centroids[hit] = (1.0 - eta)[:, None] * centroids[hit] + eta[:, None] * (sums[hit] / batch_counts[hit, None])
+        if np.square(centroids - before).sum() <= tol:
+            break
+    return centroids, n_iter
+
+
+def kmeans(X, k, max_iter=100, tol=1e-6, seed=42, n_init=1, batch_size=None):
+    """
+    Cluster the rows of X into k groups.
+
+    batch_size enables mini-batch updates: pass an int, or "auto" to use
+    batches of 4096 only when X has more than MINIBATCH_THRESHOLD rows.
+    With n_init > 1 the run with the lowest inertia wins. Returns a
+    KMeansResult(labels, centroids, inertia, n_iter).
+    """
+    X = np.asarray(X, dtype=np.float64)
+    if X.ndim != 2 or X.shape[0] == 0 or k <= 0:
+        return KMeansResult(np.empty(0, dtype=np.int64), np.empty((0, 0)), 0.0, 0)
+    k = min(k, X.shape[0])
+    if batch_size == "auto":
+        batch_size = 4096 if X.shape[0] > MINIBATCH_THRESHOLD else None
+
+    rng = np.random.default_rng(seed)
+    best = None
+    for _ in range(max(1, n_init)):
+        if batch_size:
+            seed_rows = X[rng.choice(X.shape[0], size=min(X.shape[0], 10 * batch_size), replace=False)]
+            centroids = kmeans_plus_plus(seed_rows, k, rng)
+            centroids, n_iter = _minibatch(X, centroids, max_iter, tol, batch_size, rng)
+        else:
+            centroids = kmeans_plus_plus(X, k, rng)
+            centroids, n_iter = _lloyd(X, centroids, max_iter, tol)
+        labels, dists = assign(X, centroids)
+        inertia = float(dists.sum())
+        if best is None or inertia < best.inertia:
+            best = KMeansResult(labels, centroids, inertia, n_iter)
+    return best
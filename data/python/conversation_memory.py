@@ -0,0 +1,222 @@
+"""
+Rolling conversation memory for the EstateWise chatbot.
+
+Keeps the most recent turns verbatim within a token budget, folds older turns
+into a running summary, and tracks stated preferences (budget, beds, baths,
+areas, home types) as structured fields. Both the memory held in the CLI loop
+and the history block pasted into every prompt stay roughly constant in size
+no matter how long the session runs.
+"""
+import re
+from collections import deque
+
+CHARS_PER_TOKEN = 4
+
+KNOWN_AREAS = [
+    "Chapel Hill", "Carrboro", "Durham", "Raleigh", "Cary", "Hillsborough", "Pittsboro", "Mebane",
+    "Apex", "Morrisville", "Wake Forest", "Chatham", "Orange County", "Southern Village",
+    "Meadowmont", "Briar Chapel", "Governors Club", "Northside", "Franklin Street", "Southpoint",
+]
+HOME_TYPES = {
+    "single family": re.compile(r"\b(single[- ]family|house|houses)\b"),
+    "condo": re.compile(r"\bcondos?\b"),
+    "townhouse": re.compile(r"\btown ?(house|home)s?\b"),
+    "apartment": re.compile(r"\bapartments?\b"),
+    "land": re.compile(r"\b(land|lots?)\b"),
+}
+
+_AMOUNT = r"\$?\s*(\d[\d,]*(?:\.\d+)?)\s*(k|m|thousand|million)?\b"
+_BETWEEN_RE = re.compile(r"\bbetween\s+" + _AMOUNT + r"\s+(?:and|to|-)\s+" + _AMOUNT)
+_MAX_RE = re.compile(r"\b(?:under|below|less than|up to|max(?:imum)?(?: of)?|no more than|budget(?: of| is)?)\s+" + _AMOUNT)
+_MIN_RE = re.compile(r"\b(?:over|above|more than|at least|starting at)\s+" + _AMOUNT)
+_BEDS_RE = re.compile(r"\b(\d+)\s*\+?\s*(?:-\s*)?(?:bed(?:room)?s?|br|bd)\b")
+_BATHS_RE = re.compile(r"\b(\d+(?:\.5)?)\s*\+?\s*(?:-\s*)?(?:bath(?:room)?s?|ba)\b")
+_ROOMS_AT = re.compile(r"\d+(?:\.5)?\s*\+?\s*(?:bed|br|bd|bath|ba|car|stor)")
+_ZIP_RE = re.compile(r"\b27\d{3}\b")
+_AREA_RES = [(a, re.compile(r"\b" + re.escape(a.lower()) + r"\b")) for a in KNOWN_AREAS]
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _amount(num, unit):
+    value = float(num.replace(",", ""))
+    unit = (unit or "").lower()
+    if unit in ("k", "thousand"):
+        value *= 1_000
+    elif unit in ("m", "million"):
+        value *= 1_000_000
+    elif value < 10_000:
+        # "under 500" in a home-price conversation means thousands.
+        value *= 1_000
+    return value
+
+
+def extract_preferences(text, prefs=None):
+    """
+    Update (and return) a preference dict from one user message. Later
+    statements override earlier budgets/room counts; areas accumulate.
+    """
+    prefs = prefs if prefs is not None else {}
+    low = text.lower()
+    m = _BETWEEN_RE.search(low)
+    if m:
+        lo_unit = m.group(2) or m.group(4)
+        prefs["budget_min"] = _amount(m.group(1), lo_unit)
+        prefs["budget_max"] = _amount(m.group(3), m.group(4))
+    else:
+        # "at least 3 bedrooms" is a room count, not a price floor.
+        m = _MAX_RE.search(low)
+        if m and not _ROOMS_AT.match(low, m.start(1)):
+            prefs["budget_max"] = _amount(m.group(1), m.group(2))
+        m = _MIN_RE.search(low)
+        if m and not _ROOMS_AT.match(low, m.start(1)):
+            prefs["budget_min"] = _amount(m.group(1), m.group(2))
+    m = _BEDS_RE.search(low)
+    if m:
+        prefs["bedrooms"] = int(m.group(1))
+    m = _BATHS_RE.search(low)
+    if m:
+        prefs["bathrooms"] = float(m.group(1))
+    areas = prefs.setdefault("areas", [])
+    for name, pattern in _AREA_RES:
+        if pattern.search(low) and name not in areas:
+            areas.append(name)
+    for z in _ZIP_RE.findall(low):
+        if z not in areas:
+            areas.append(z)
+    types = prefs.setdefault("home_types", [])
+    for name, pattern in HOME_TYPES.items():
+        if pattern.search(low) and name not in types:
+            types.append(name)
+    return prefs
+
+
+def format_preferences(prefs):
+    parts = []
+    lo, hi = prefs.get("budget_min"), prefs.get("budget_max")
+    if lo and hi:
+        parts.append(f"budget ${lo:,.0f}–${hi:,.0f}")
+    elif hi:
+        parts.append(f"budget up to ${hi:,.0f}")
+    elif lo:
+        parts.append(f"budget from ${lo:,.0f}")
+    if prefs.get("bedrooms"):
+        parts.append(f"{prefs['bedrooms']}+ beds")
+    if prefs.get("bathrooms"):
+        parts.append(f"{prefs['bathrooms']:g}+ baths")
+    if prefs.get("areas"):
+        parts.append("areas: " + ", ".join(prefs["areas"]))
+    if prefs.get("home_types"):
+        parts.append("types: " + ", ".join(prefs["home_types"]))
+    return "; ".join(parts)
+
+
+def extractive_summarizer(summary, exchanges):
+    """
+    Default summarizer: one line per compacted exchange with the start of the
+    user's message. No LLM call.
+    """
+    lines = [summary] if summary else []
+    for user, _assistant in exchanges:
+        snippet = " ".join(user.split())
+        if len(snippet) > 160:
+            snippet = snippet[:157] + "..."
+        lines.append(f"- User asked: {snippet}")
+    return "\n".join(lines)
+
+
+class ConversationMemory:
+    """
+    Recent turns verbatim within token_budget; everything older lives in a
+    summary capped at summary_token_budget plus structured preferences.
+
+    Iterating yields the verbatim messages (user, assistant, user, ...), so the
+    object can stand in for the plain history list wherever only the tail is read.
+    """
+
+    def __init__(self, token_budget=1200, summary_token_budget=300, summarizer=extractive_summarizer):
+        self.token_budget = token_budget
+        self.summary_token_budget = summary_token_budget
+        self.summarizer = summarizer or extractive_summarizer
+        self.recent = deque()
+        self.summary = ""
+        self.preferences = {}
+        self.turns = 0
+        self._recent_tokens = 0
+
+    @classmethod
+    def from_messages(cls, messages, **kwargs):
+        memory = cls(**kwargs)
+        msgs = list(messages)
+        for i in range(0, len(msgs) - 1, 2):
+            memory.add_turn(msgs[i], msgs[i + 1])
+        return memory
+
+    def __iter__(self):
+        for user, assistant in self.recent:
+            yield user
+            yield assistant
+
+    def __len__(self):
+        return 2 * len(self.recent)
+
+    def add_turn(self, user, assistant):
+        self.recent.append((user, assistant))
+        self._recent_tokens += estimate_tokens(user) + estimate_tokens(assistant)
+        extract_preferences(user, self.preferences)
+        self.turns += 1
+        if self._recent_tokens > self.token_budget:
+            self._compact()
+
+    def _compact(self):
+        # Compact down to ~60% of the budget so summarization runs in batches,
+        # not on every turn. The newest exchange always stays verbatim.
+        target = int(self.token_budget * 0.6)
+        folded = []
+        while len(self.recent) > 1 and self._recent_tokens > target:
+            user, assistant = self.recent.popleft()
+            self._recent_tokens -= estimate_tokens(user) + estimate_tokens(assistant)
+            folded.append((user, assistant))
+        if not folded:
+            return
+        try:
+            self.summary = self.summarizer(self.summary, folded)
+        except Exception:
+            self.summary = extractive_summarizer(self.summary, folded)
+        self._trim_summary()
+
+    def _trim_summary(self):
+        max_chars = self.summary_token_budget * CHARS_PER_TOKEN
+        if len(self.summary) <= max_chars:
+            return
+        # Drop the oldest lines first; preferences are tracked separately.
+        lines = self.summary.splitlines()
+        while lines and len("\n".join(lines)) > max_chars:
+            lines.pop(0)
+        self.summary = "\n".join(lines) if lines else self.summary[-max_chars:]
+
+    def render(self):
+        """
+        History block for prompts: summary, preferences, then recent turns.
+        """
+        parts = []
+        if self.summary:
+            parts.append(f"Earlier conversation (summary):\n{self.summary}")
+        prefs = format_preferences(self.preferences)
+        if prefs:
+            parts.append(f"Stated preferences: {prefs}")
+        recent = "\n".join(f"User: {u}\nAssistant: {a}" for u, a in self.recent)
+        if recent:
+            parts.append(recent)
+        return "\n\n".join(parts)
+
+    def stats(self):
+        return {
+            "turns": self.turns,
+            "recent_turns": len(self.recent),
+            "recent_tokens": self._recent_tokens,
+            "summary_tokens": estimate_tokens(self.summary) if self.summary else 0,
+            "rendered_tokens": estimate_tokens(self.render()),
+        }
@@ -0,0 +1,185 @@
+"""
+Derived property features, computed once instead of on every read.
+
+utils.clean_document() adds the per-listing ones (pricePerSqft, age,
+sizeBucket) at clean time. cityPricePercentile needs the whole corpus, so
+this job streams the cleaned Mongo collection, builds a per-city price
+quantile table (city_price_table.json), and writes all four fields as typed
+numbers to Mongo and to the Pinecone metadata of existing vectors. Later
+ingests read the table (load_city_prices()) and set the percentile directly.
+
+    python derived_features.py                  # table + Mongo + Pinecone
+    python derived_features.py --skip-pinecone
+
+add_derived_columns() is the vectorized equivalent for the notebook's frame.
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from utils import DERIVED_FIELDS, SIZE_BUCKET_EDGES, city_key, derive_features
+
+CITY_PRICES_PATH = Path(os.getenv("CITY_PRICES_PATH", Path(__file__).resolve().parent / "city_price_table.json"))
+# Price quantiles stored per city (0th..100th percentile).
+QUANTILES = 101
+# Cities with fewer priced listings get no percentile (-1).
+MIN_CITY_LISTINGS = 5
+MONGO_BATCH_SIZE = 1000
+
+
+def load_city_prices(path=CITY_PRICES_PATH):
+    """
+    The per-city price table, or None when this job has not run.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def build_city_prices(cities, states, prices, min_listings=MIN_CITY_LISTINGS):
+    """
+    {"quantiles": QUANTILES, "cities": {"City|ST": {"count", "quantiles"}}}
+    over priced listings (price > 0).
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    keys = np.array([city_key(c, s) for c, s in zip(cities, states)], dtype=object)
+    priced = prices > 0
+    table = {"quantiles": QUANTILES, "builtAt": datetime.now().isoformat(timespec="seconds"), "cities": {}}
+    if not priced.any():
+        return table
+    keys, prices = keys[priced], prices[priced]
+    order = np.argsort(keys, kind="stable")
+    keys, prices = keys[order], prices[order]
+    bounds = np.r_[0, np.flatnonzero(keys[1:] != keys[:-1]) + 1, len(keys)]
+    levels = np.linspace(0, 1, QUANTILES)
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        if end - start < min_listings:
+            continue
+        q = np.quantile(prices[start:end], levels)
+        table["cities"][keys[start]] = {"count": int(end - start), "quantiles": [round(float(v), 2) for v in q]}
+    return table
+
+
+def add_derived_columns(df, current_year=None):
+    """
+    pricePerSqft, age, sizeBucket and cityPricePercentile columns on a
+    cleaned frame (city/state/price/livingArea/yearBuilt). Unknowns are NaN
+    here (0 / -1 in Mongo and metadata); the percentile is the exact share
+    of the city's priced listings at or below the price.
+    """
+    current_year = current_year or datetime.now().year
+    price = df["price"].astype("float64")
+    area = df["livingArea"].astype("float64")
+    year = df["yearBuilt"].astype("float64")
+    priced = price > 0
+    df["pricePerSqft"] = (price / area).where(priced & (area > 0)).round(2)
+    df["age"] = (current_year - year).clip(lower=0).where(year > 0)
+    df["sizeBucket"] = np.where(area > 0, 1 + np.searchsorted(SIZE_BUCKET_EDGES, area.to_numpy(), side="right"), 0)
+    city = df["city"].astype(str) + "|" + df["state"].astype(str)
+    pct = price.where(priced).groupby(city).rank(method="max", pct=True) * 100
+    counts = price.where(priced).groupby(city).transform("count")
+    df["cityPricePercentile"] = pct.where(counts >= MIN_CITY_LISTINGS).round(1)
+    return df
+
+
+# -- corpus job -------------------------------------------------------------------
+
+
+def _mongo_collection():
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    uri = os.getenv("MONGO_URI")
+    if not uri:
+        raise RuntimeError("MONGO_URI is not set in .env")
+    client = MongoClient(uri)
+    return client, client.get_default_database()["properties"]
+
+
+def write_mongo(collection, updates):
+    from pymongo import UpdateOne
+
+    ops, written = [], 0
+    for _id, fields in updates:
+        ops.append(UpdateOne({"_id": _id}, {"$set": fields}))
+        if len(ops) >= MONGO_BATCH_SIZE:
+            written += collection.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        written += collection.bulk_write(ops, ordered=False).modified_count
+    logging.info("Updated derived fields on %d Mongo documents.", written)
+
+
+def write_pinecone(items):
+    """
+    Merge the derived fields into vector metadata; items are (zpid, namespace, fields).
+    """
+    from pinecone_client import index
+    from upsert_batcher import rewrite_metadata
+
+    sent, missing = rewrite_metadata(index, ((str(int(zpid)), ns, fields) for zpid, ns, fields in items))
+    logging.info("Updated derived metadata on %d/%d Pinecone vectors (%d not in the index).",
+                 sent, len(items), missing)
+
+
+def derive_corpus(output=CITY_PRICES_PATH, skip_mongo=False, skip_pinecone=False):
+    """
+    Build the city price table and store every derived field corpus-wide.
+    """
+    from answer_cache import write_index_version
+    from namespaces import SHARDING_ENABLED, DEFAULT_NAMESPACE, namespace_for
+
+    client, collection = _mongo_collection()
+    try:
+        projection = {"_id": 1, "zpid": 1, "city": 1, "state": 1, "price": 1, "livingArea": 1, "yearBuilt": 1}
+        docs = []
+        for doc in collection.find({}, projection, batch_size=5000):
+            docs.append({
+                "_id": doc["_id"], "zpid": doc.get("zpid"), "city": doc.get("city") or "Unknown",
+                "state": doc.get("state") or "Unknown", "price": float(doc.get("price") or 0),
+                "livingArea": float(doc.get("livingArea") or 0), "yearBuilt": float(doc.get("yearBuilt") or 0),
+            })
+        logging.info("Loaded %d properties.", len(docs))
+        if not docs:
+            return
+        table = build_city_prices([d["city"] for d in docs], [d["state"] for d in docs], [d["price"] for d in docs])
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(table, f)
+        logging.info("Wrote price quantiles for %d cities to %s.", len(table["cities"]), output)
+
+        derived = [(d, derive_features(d, table)) for d in docs]
+        if not skip_mongo:
+            write_mongo(collection, [(d["_id"], fields) for d, fields in derived])
+        if not skip_pinecone:
+            write_pinecone([
+                (d["zpid"], namespace_for(d["state"], d["city"]) if SHARDING_ENABLED else DEFAULT_NAMESPACE,
+                 {k: fields[k] for k in DERIVED_FIELDS})
+                for d, fields in derived if d["zpid"]
+            ])
+        if not (skip_mongo and skip_pinecone):
+            write_index_version()
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Materialize derived property features corpus-wide.")
+    parser.add_argument("--output", default=str(CITY_PRICES_PATH))
+    parser.add_argument("--skip-mongo", action="store_true")
+    parser.add_argument("--skip-pinecone", action="store_true")
+    args = parser.parse_args()
+    try:
+        derive_corpus(args.output, args.skip_mongo, args.skip_pinecone)
+    except Exception as err:
+        logging.error("Deriving features failed: %s", err)
+        sys.exit(1)
@@ -0,0 +1,269 @@
+"""
+Optional dimensionality reduction for property embeddings.
+
+text-embedding-004 vectors are 768-dim. A projection to 256 or 384 dims,
+either PCA fitted on a sample of corpus vectors or plain prefix truncation,
+cuts index memory and query cost roughly in proportion. The same projection
+has to be applied at ingest (upsert_properties.py) and at query time
+(estatewise_chat.query_properties), into an index created with the reduced
+dimension. Both read the projection file named by EMBEDDING_PROJECTION_PATH;
+when that is unset, vectors stay full-size.
+
+Commands:
+    python dim_reduction.py sample --n 20000 --output sample.npy   # vectors from Pinecone
+    python dim_reduction.py eval --input sample.npy --dims 256 384 --methods pca prefix
+    python dim_reduction.py fit --input sample.npy --method pca --dims 256 --output projection.npz
+
+eval reports recall@k (default k=30) and top-10 overlap of exact cosine
+search in the reduced space against the full-dimension baseline, on held-out
+query vectors.
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+from collections import defaultdict
+
+import numpy as np
+
+from namespaces import SHARDING_ENABLED, DEFAULT_NAMESPACE, namespace_for
+
+PROJECTION_ENV = "EMBEDDING_PROJECTION_PATH"
+FETCH_CHUNK = 100
+
+
+def _l2_normalize(X):
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return X / norms
+
+
+class Projection:
+    """
+    Linear map from full embeddings to `dims` dims, followed by L2
+    normalization (the index uses cosine similarity).
+    """
+
+    def __init__(self, method, dims, input_dims, mean=None, components=None):
+        self.method = method
+        self.dims = int(dims)
+        self.input_dims = int(input_dims)
+        self.mean = mean
+        self.components = components
+
+    def apply(self, X):
+        X = np.atleast_2d(np.asarray(X, dtype=np.float32))
+        if X.shape[1] != self.input_dims:
+            raise ValueError(f"Expected {self.input_dims}-dim vectors, got {X.shape[1]}.")
+        if self.method == "prefix":
+            Y = X[:, :self.dims]
+        else:
+            Y = (X - self.mean) @ self.components.T
+        return _l2_normalize(Y)
+
+    def apply_one(self, vector):
+        return self.apply(vector)[0].tolist()
+
+    def save(self, path):
+        arrays = {"method": np.array(self.method), "dims": np.array(self.dims),
+                  "input_dims": np.array(self.input_dims)}
+        if self.method == "pca":
+            arrays.update(mean=self.mean, components=self.components)
+        np.savez(path, **arrays)
+
+    def __repr__(self):
+        return f"Projection({self.method}, {self.input_dims}->{self.dims})"
+
+
+def prefix_projection(dims, input_dims):
+    return Projection("prefix", dims, input_dims)
+
+
+def fit_pca(sample, dims):
+    """
+    PCA projection fitted on a (n, D) sample of corpus embeddings.
+    """
+    X = np.asarray(sample, dtype=np.float64)
+    if dims > X.shape[1]:
+        raise ValueError(f"Cannot reduce {X.shape[1]}-dim vectors to {dims} dims.")
+    mean = X.mean(axis=0)
+    cov = np.cov(X - mean, rowvar=False)
+    # eigh returns ascending eigenvalues; keep the top `dims` directions.
+    _, vecs = np.linalg.eigh(cov)
+    components = vecs[:, ::-1][:, :dims].T
+    return Projection("pca", dims, X.shape[1], mean.astype(np.float32), components.astype(np.float32))
+
+
+def fit_projection(sample, method, dims):
+    if method == "pca":
+        return fit_pca(sample, dims)
+    if method == "prefix":
+        return prefix_projection(dims, np.asarray(sample).shape[1])
+    raise ValueError(f"Unknown projection method: {method}")
+
+
+def load_projection(path=None):
+    """
+    Projection from path (or $EMBEDDING_PROJECTION_PATH); None when neither is set.
+    """
+    path = path or os.getenv(PROJECTION_ENV)
+    if not path:
+        return None
+    data = np.load(path)
+    method = str(data["method"])
+    return Projection(method, int(data["dims"]), int(data["input_dims"]),
+                      data["mean"] if method == "pca" else None,
+                      data["components"] if method == "pca" else None)
+
+
+# -- evaluation -------------------------------------------------------------
+
+
+def top_k(corpus, queries, k):
+    """
+    Exact cosine top-k indices, best first. Inputs must be L2-normalized.
+    """
+    sims = queries @ corpus.T
+    idx = np.argpartition(-sims, min(k, sims.shape[1] - 1), axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(sims, idx, axis=1), axis=1)
+    return np.take_along_axis(idx, order, axis=1)
+
+
+def timed_top_k(corpus, queries, k):
+    t0 = time.perf_counter()
+    result = top_k(_l2_normalize(corpus), _l2_normalize(queries), k)
+    return result, time.perf_counter() - t0
+
+
+def evaluate_projection(projection, corpus, queries, k=30, baseline=None):
+    """
+    Recall@k and top-10 overlap of search in the projected space against
+    full-dimension exact search, plus the brute-force query time ratio.
+    baseline is an optional precomputed (top_k indices, seconds) pair.
+    """
+    base, full_time = baseline if baseline is not None else timed_top_k(corpus, queries, k)
+
+    red_c, red_q = projection.apply(corpus), projection.apply(queries)
+    t0 = time.perf_counter()
+    got = top_k(red_c, red_q, k)
+    reduced_time = time.perf_counter() - t0
+
+    recall = np.array([len(set(a) & set(b)) / k for a, b in zip(base, got)])
+    top10 = min(10, k)
+    overlap10 = np.array([len(set(a[:top10]) & set(b[:top10])) / top10 for a, b in zip(base, got)])
+    return {
+        "method": projection.method,
+        "dims": projection.dims,
+        f"recall@{k}": float(recall.mean()),
+        f"recall@{k}_p5": float(np.percentile(recall, 5)),
+        "overlap@10": float(overlap10.mean()),
+        "bytes_per_vector": projection.dims * 4,
+        "size_ratio": projection.dims / projection.input_dims,
+        "query_time_ratio": reduced_time / full_time if full_time else None,
+    }
+
+
+def evaluate(sample, dims_list=(256, 384), methods=("pca", "prefix"), k=30, n_queries=500, seed=42):
+    """
+    Hold out n_queries vectors as queries, fit on the rest, and compare each
+    method/dims against the full-dimension baseline.
+    """
+    X = np.asarray(sample, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    perm = rng.permutation(len(X))
+    n_queries = min(n_queries, len(X) // 5)
+    queries, corpus = X[perm[:n_queries]], X[perm[n_queries:]]
+    baseline = timed_top_k(corpus, queries, k)
+    results = []
+    for method in methods:
+        for dims in dims_list:
+            proj = fit_projection(corpus, method, dims)
+            results.append(evaluate_projection(proj, corpus, queries, k, baseline))
+    return results
+
+
+# -- sampling ---------------------------------------------------------------
+
+
+def sample_from_pinecone(n):
+    """
+    Fetch the stored vectors of n random properties (zpids sampled from Mongo).
+    """
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+    from pinecone_client import index
+
+    load_dotenv()
+    mongo = MongoClient(os.getenv("MONGO_URI"))
+    try:
+        docs = mongo.get_default_database()["properties"].aggregate(
+            [{"$match": {"zpid": {"$gt": 0}}}, {"$sample": {"size": n}}, {"$project": {"zpid": 1, "city": 1, "state": 1}}]
+        )
+        by_namespace = defaultdict(list)
+        for d in docs:
+            ns = namespace_for(d.get("state"), d.get("city")) if SHARDING_ENABLED else DEFAULT_NAMESPACE
+            by_namespace[ns].append(str(int(d["zpid"])))
+    finally:
+        mongo.close()
+    vectors = []
+    for ns, ids in by_namespace.items():
+        kwargs = {"namespace": ns} if ns else {}
+        for i in range(0, len(ids), FETCH_CHUNK):
+            resp = index.fetch(ids=ids[i:i + FETCH_CHUNK], **kwargs)
+            found = resp.get("vectors", {}) if isinstance(resp, dict) else resp.vectors
+            for v in found.values():
+                values = v.get("values") if isinstance(v, dict) else v.values
+                vectors.append(values)
+    total = sum(len(ids) for ids in by_namespace.values())
+    logging.info("Fetched %d/%d sampled vectors from Pinecone.", len(vectors), total)
+    return np.array(vectors, dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding dimensionality reduction: sample, fit, evaluate.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_sample = sub.add_parser("sample", help="fetch a random sample of stored vectors")
+    p_sample.add_argument("--n", type=int, default=20000)
+    p_sample.add_argument("--output", default="embedding_sample.npy")
+
+    p_fit = sub.add_parser("fit", help="fit and save a projection")
+    p_fit.add_argument("--input", required=True, help=".npy sample of full-dimension vectors")
+    p_fit.add_argument("--method", choices=["pca", "prefix"], default="pca")
+    p_fit.add_argument("--dims", type=int, default=256)
+    p_fit.add_argument("--output", default="embedding_projection.npz")
+
+    p_eval = sub.add_parser("eval", help="recall@k of reduced vs full-dimension search")
+    p_eval.add_argument("--input", required=True, help=".npy sample of full-dimension vectors")
+    p_eval.add_argument("--dims", type=int, nargs="+", default=[256, 384])
+    p_eval.add_argument("--methods", nargs="+", choices=["pca", "prefix"], default=["pca", "prefix"])
+    p_eval.add_argument("--k", type=int, default=30)
+    p_eval.add_argument("--queries", type=int, default=500, help="held-out query vectors")
+    args = parser.parse_args()
+
+    if args.command == "sample":
+        X = sample_from_pinecone(args.n)
+        np.save(args.output, X)
+        print(f"Saved {X.shape[0]} x {X.shape[1] if X.size else 0} vectors to {args.output}")
+    elif args.command == "fit":
+        proj = fit_projection(np.load(args.input), args.method, args.dims)
+        proj.save(args.output)
+        print(f"Saved {proj} to {args.output}; set {PROJECTION_ENV}={os.path.abspath(args.output)} "
+              f"for ingest and chat, with an index of dimension {proj.dims}.")
+    else:
+        X = np.load(args.input)
+        print(f"{len(X):,} vectors x {X.shape[1]} dims, k={args.k}")
+        print(f"{'method':<8} {'dims':>5} {'recall@k':>9} {'p5':>7} {'top10':>7} {'size':>6} {'time':>6}")
+        for r in evaluate(X, args.dims, args.methods, args.k, args.queries):
+            print(f"{r['method']:<8} {r['dims']:>5} {r[f'recall@{args.k}']:>9.3f} {r[f'recall@{args.k}_p5']:>7.3f} "
+                  f"{r['overlap@10']:>7.3f} {r['size_ratio']:>6.2f} {r['query_time_ratio']:>6.2f}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    try:
+        main()
+    except Exception as err:
+        logging.error("Dimensionality reduction failed: %s", err)
+        sys.exit(1)
@@ -0,0 +1,98 @@
+"""
+Direct lookup of properties the user names exactly.
+
+A Zillow URL ("zillow.com/homedetails/..._zpid/"), a zpid ("zpid 12345678",
+"property id 12345678") or a street address ("123 N Main St, Chapel Hill, NC
+27514") identifies one record. find_identifiers() pulls those out of a chat
+message and resolve() looks them up in the property store's zpid and
+street+ZIP indexes (property_store.py), so the chatbot can answer from the
+exact record instead of embedding the message and running a semantic query.
+
+    python direct_lookup.py "Tell me about https://www.zillow.com/homedetails/x/12345678_zpid/"
+"""
+import re
+import sys
+import time
+import logging
+from collections import namedtuple
+
+from property_store import open_store
+
+# Most lookups are about one home; comparisons rarely name more than a few.
+MAX_IDENTIFIERS = 5
+
+Identifier = namedtuple("Identifier", ["kind", "value", "zipcode"])
+
+_ZILLOW_RE = re.compile(r"zillow\.com/\S*?(\d{5,})_zpid", re.IGNORECASE)
+_ZPID_RE = re.compile(r"\b(?:zpid|property\s+id|listing\s+id)\s*[:#]?\s*(\d{5,})\b|\b(\d{5,})_zpid\b", re.IGNORECASE)
+_STREET_SUFFIX_RE = r"(?:street|avenue|road|drive|lane|court|boulevard|place|circle|terrace|parkway|highway|trail|" \
+                    r"square|way|st|ave|rd|dr|ln|ct|blvd|pl|cir|ter|pkwy|hwy|trl|sq)"
+# "<number> <1-5 words> <suffix>[ <direction>][ unit/apt/#]" then optional ", City, ST 12345"
+_ADDRESS_RE = re.compile(
+    r"\b(\d{1,6}\s+(?:[a-z0-9.'-]+\s+){0,4}?" + _STREET_SUFFIX_RE + r"\.?"
+    r"(?:\s+(?:n|s|e|w|ne|nw|se|sw|north|south|east|west)\b\.?)?"
+    r"(?:\s*,?\s*(?:apt|apartment|unit|suite|ste|#)\s*[a-z0-9-]+)?)\b"
+    r"(?:[^\n\d]{0,40}?\b(\d{5})(?:-\d{4})?\b)?",
+    re.IGNORECASE,
+)
+
+
+def find_identifiers(message):
+    """
+    Zillow URLs / zpids (kind "zpid") and street addresses (kind "address",
+    with the ZIP when one follows) in the order they appear.
+    """
+    found, seen = [], set()
+    for m in _ZILLOW_RE.finditer(message):
+        found.append((m.start(), Identifier("zpid", m.group(1), None)))
+    for m in _ZPID_RE.finditer(message):
+        found.append((m.start(), Identifier("zpid", m.group(1) or m.group(2), None)))
+    for m in _ADDRESS_RE.finditer(message):
+        found.append((m.start(), Identifier("address", m.group(1).strip(" ,"), m.group(2))))
+    out = []
+    for _, ident in sorted(found, key=lambda f: f[0]):
+        key = (ident.kind, ident.value.lower())
+        if key not in seen:
+            seen.add(key)
+            out.append(ident)
+    return out[:MAX_IDENTIFIERS]
+
+
+def resolve(message, store):
+    """
+    Cleaned documents for the properties the message names exactly, in
+    mention order. Empty when nothing is named or nothing resolves.
+    """
+    if store is None:
+        return []
+    idents = find_identifiers(message)
+    if not idents:
+        return []
+    zpids = []
+    for ident in idents:
+        zpid = int(ident.value) if ident.kind == "zpid" else store.find_by_address(ident.value, ident.zipcode)
+        if zpid is not None and zpid not in zpids:
+            zpids.append(zpid)
+    docs = store.get_documents(zpids) if zpids else {}
+    return [docs[z] for z in zpids if z in docs]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    message = " ".join(sys.argv[1:])
+    store = open_store()
+    print("Identifiers:", find_identifiers(message))
+    if store is None:
+        print("No property store yet; run upsert_properties.py or `python property_store.py build`.")
+        sys.exit(1)
+    t0 = time.perf_counter()
+    docs = resolve(message, store)
+    elapsed = (time.perf_counter() - t0) * 1e6
+    for d in docs:
+        addr = d.get("address") or {}
+        print(f"  {d.get('zpid')}: {addr.get('streetAddress')}, {addr.get('city')}, {addr.get('state')} "
+              f"{addr.get('zipcode')} - ${d.get('price')}")
+    print(f"Resolved {len(docs)} propert{'y' if len(docs) == 1 else 'ies'} in {elapsed:.0f} µs")
@@ -0,0 +1,420 @@
+"""
+EstateWise chat pipeline: agentic fetch decision, retrieval + clustering,
+gated expert ensemble and master-agent merge.
+
+This is the code behind section 9 of estatewise_cli_chatbot.py, kept as a
+module so the notebook, the CLI and bench_chat.py share one implementation.
+Call configure() with a google-genai Client and a Pinecone index (or any
+objects with the same methods) before chatting.
+"""
+import concurrent.futures
+import contextvars
+import json
+import time
+
+from utils import safe_num
+from fetch_intent import decide_fetch
+from expert_router import route_experts
+from clustering import minmax_normalize, kmeans, impute_mean
+from cluster_profiles import load_cluster_profiles, cluster_context, feature_vector
+from answer_cache import SemanticAnswerCache, read_index_version
+from conversation_memory import ConversationMemory
+from tracing import tracer_from_env, span, current_span, record_tokens
+from property_store import open_store, hydrate
+from direct_lookup import resolve as resolve_direct
+from dim_reduction import load_projection
+from spatial_index import load_spatial_index, parse_spatial, spatial_filter
+from namespaces import DEFAULT_NAMESPACE, index_namespaces, route_namespaces, query_namespaces
+
+# 1) Clients, set by configure()
+client = None
+index = None
+# Namespaces present in the index, refreshed every NAMESPACE_REFRESH_S seconds
+NAMESPACE_REFRESH_S = 600
+_namespaces = (0.0, [])
+
+
+def configure(genai_client, pinecone_index):
+    """
+    Point the pipeline at a Gemini client and a Pinecone index.
+    """
+    global client, index, _namespaces
+    client = genai_client
+    index = pinecone_index
+    _namespaces = (0.0, [])
+
+
+# 2) Pinecone helpers
+# Full documents for slim-metadata indexes (None when ingest kept full metadata)
+PROPERTY_STORE = open_store()
+# Same embedding projection as ingest when the index holds reduced vectors (EMBEDDING_PROJECTION_PATH)
+EMBEDDING_PROJECTION = load_projection()
+# Grid over listing coordinates for "within 2 miles of ..." questions (None until spatial_index.py build)
+SPATIAL_INDEX = load_spatial_index()
+
+def sanitize_metadata(md: dict) -> dict:
+    out = {}
+    for k, v in (md or {}).items():
+        if isinstance(v, (str, int, float, bool)):
+            out[k] = v
+        elif isinstance(v, list):
+            out[k] = ", ".join(v) if all(isinstance(x, str) for x in v) else json.dumps(v)
+        elif isinstance(v, dict):
+            out[k] = json.dumps(v)
+        else:
+            out[k] = str(v)
+    return out
+
+def embed_query(query: str) -> list[float]:
+    with span("embed", model="text-embedding-004", chars=len(query)):
+        emb = client.embeddings.create(model="models/text-embedding-004", content=query)
+    return emb.data[0].embedding
+
+def known_namespaces() -> list[str]:
+    global _namespaces
+    checked, spaces = _namespaces
+    if time.time() - checked > NAMESPACE_REFRESH_S:
+        try:
+            spaces = index_namespaces(index)
+        except Exception:
+            spaces = []
+        _namespaces = (time.time(), spaces)
+    return spaces
+
+def query_properties(query: str, top_k: int = 30, vector: list[float] = None, user_context: str = ""):
+    vec = vector if vector is not None else embed_query(query)
+    if EMBEDDING_PROJECTION is not None:
+        vec = EMBEDDING_PROJECTION.apply_one(vec)
+    # Distance questions: restrict the vector query to listings inside the circle
+    query_kw, inside = {"include_metadata": True}, None
+    if SPATIAL_INDEX is not None:
+        with span("spatial") as sp:
+            focus = parse_spatial(query, SPATIAL_INDEX)
+            if focus is not None:
+                query_filter, zpids = spatial_filter(SPATIAL_INDEX, focus)
+                sp.set(anchor=focus.anchor, radius_km=round(focus.radius_km, 2), candidates=len(zpids))
+                if len(zpids):
+                    query_kw["filter"], inside = query_filter, set(zpids.tolist())
+    with span("vector.query", top_k=top_k) as sp:
+        spaces = known_namespaces()
+        if spaces and spaces != [DEFAULT_NAMESPACE]:
+            # Sharded index: search the namespaces the question points at, else fan out and merge
+            route = route_namespaces(query, user_context, spaces)
+            sp.set(namespaces=route.namespaces, namespace_route=route.reason)
+            resp = query_namespaces(index, vec, route.namespaces, top_k=top_k, **query_kw)
+        else:
+            resp = index.query(vector=vec, top_k=top_k, **query_kw)
+        matches = getattr(resp, "matches", resp.get("matches", []))
+        if inside is not None:
+            # A lat/lng box filter also admits the box corners; keep the circle only
+            matches = [m for m in matches if int(float(getattr(m, "id", None) or m.get("id"))) in inside]
+        sp.set(matches=len(matches))
+    props = [
+        {
+            "id": getattr(m, "id", m.get("id")),
+            "score": getattr(m, "score", m.get("score", 0.0)),
+            "metadata": sanitize_metadata(getattr(m, "metadata", m.get("metadata", {})))
+        }
+        for m in matches
+    ]
+    # Slim metadata: pull address/description for all matches in one local lookup
+    if PROPERTY_STORE is not None:
+        with span("hydrate", matches=len(props)) as sp:
+            sp.set(hydrated=hydrate(props, PROPERTY_STORE))
+    return props
+
+def query_properties_as_string(query: str, top_k: int = 30, props: list[dict] = None) -> str:
+    props = props if props is not None else query_properties(query, top_k)
+    if not props:
+        return "No matching properties found."
+    out = "Matching Properties:\n\n"
+    for r in props:
+        m = r["metadata"]
+        addr = {}
+        if "address" in m:
+            try: addr = json.loads(m["address"])
+            except: addr = {}
+        street = addr.get("streetAddress", "Unknown")
+        city   = addr.get("city", "Unknown")
+        state  = addr.get("state", "Unknown")
+        zipc   = addr.get("zipcode", "")
+        price  = f"${m['price']}" if m.get("price") else "N/A"
+        beds   = m.get("bedrooms", "N/A")
+        baths  = m.get("bathrooms", "N/A")
+        area   = f"{m['livingArea']} sqft" if m.get("livingArea") else "N/A"
+        # sanitize_metadata turns a missing (None) value into the string "None".
+        ppsf = safe_num(m.get("pricePerSqft"), 0, min_val=0)
+        if ppsf > 0:
+            area += f" (${ppsf:,.0f}/sqft)"
+        pct = safe_num(m.get("cityPricePercentile"), -1, min_val=0, max_val=100)
+        if pct >= 0:
+            price += f" (city price percentile: {pct:.0f})"
+        year   = m.get("yearBuilt", "N/A")
+        htype  = m.get("homeType", "N/A")
+        desc   = m.get("description", "No description")
+        zpid   = str(m.get("zpid", ""))
+        link   = f"https://www.zillow.com/homedetails/{zpid}_zpid/" if zpid else "N/A"
+        out += (
+            f"Property at {street}, {city}, {state} {zipc}\n"
+            f"  - Price: {price}\n"
+            f"  - Beds: {beds}, Baths: {baths}\n"
+            f"  - Living Area: {area}\n"
+            f"  - Year Built: {year}\n"
+            f"  - Type: {htype}\n"
+            f"  - Description: {desc}\n"
+            f"  - More details: {link}\n\n"
+        )
+    return out
+
+# 3) Chat function with agentic decision
+CLUSTER_COUNT = 4
+MAX_HISTORY = 20
+# Corpus-wide clusters precomputed by cluster_corpus.py (None until that job has run)
+CLUSTER_PROFILES = load_cluster_profiles()
+def index_version():
+    """Version stamped by the last ingest, read from the configured index (local file before configure())."""
+    return read_index_version(index=index)
+
+# Near-duplicate questions in the same context and numeric constraints reuse the previous answer
+# for an hour; the cache empties itself when an ingest job stamps a new index version. None disables it.
+ANSWER_CACHE = SemanticAnswerCache(threshold=0.95, ttl=3600, max_entries=1000, version_fn=index_version)
+# Per-turn traces (spans, token counts, cache hits, fallbacks); off unless ESTATEWISE_TRACE is set
+TRACER = tracer_from_env()
+
+def generate(prompt: str, stage: str, **attrs) -> str:
+    """One Gemini call, traced as an llm.<stage> span with token counts."""
+    with span(f"llm.{stage}", model="gemini-2.0-flash", **attrs) as sp:
+        resp = client.models.generate_content(model="gemini-2.0-flash", contents=prompt)
+        record_tokens(sp, prompt, resp.text, resp)
+        return resp.text
+
+def gemini_summarizer(summary: str, exchanges: list[tuple[str, str]]) -> str:
+    """Fold compacted exchanges into the running conversation summary."""
+    convo = "\n".join(f"User: {u}\nAssistant: {a}" for u, a in exchanges)
+    prompt = (
+        "Update this running summary of a real estate chat. Keep it under 120 words; keep concrete facts "
+        "(properties discussed, decisions, constraints) and drop pleasantries.\n\n"
+        f"Current summary:\n{summary or 'None'}\n\nNew exchanges:\n{convo}\n\nUpdated summary:"
+    )
+    with span("memory.summarize", exchanges=len(exchanges)):
+        return generate(prompt, "summary").strip()
+
+def remember_turn(memory: ConversationMemory, message: str, reply: str):
+    """Add a finished exchange to memory; summarization it triggers is traced as a memory.update turn."""
+    with TRACER.turn("memory.update", turns=memory.turns):
+        memory.add_turn(message, reply)
+
+def chat_with_estatewise(history: list[str] | ConversationMemory, message: str, user_context: str = "", expert_weights: dict[str,float] = None):
+    with TRACER.turn(message_chars=len(message)):
+        return _chat_turn(history, message, user_context, expert_weights)
+
+def _chat_turn(history, message, user_context, expert_weights):
+    expert_weights = expert_weights or {}
+    start = time.time()
+    low = message.strip().lower()
+    turn = current_span()
+
+    # 3.0) Greeting / thanks shortcuts
+    if low in ("hi", "hello", "hey"):
+        turn.set(path="greeting")
+        return "Hello! How can I assist you today?", {}
+    if low in ("thanks", "thank you"):
+        turn.set(path="greeting")
+        return "You're welcome! Let me know if you need anything else.", {}
+
+    # bound history: running summary + stated preferences + recent turns within a token budget
+    memory = history if isinstance(history, ConversationMemory) else ConversationMemory.from_messages(history[-MAX_HISTORY*2:])
+    hist_str = memory.render()
+
+    # 3.0.1) Direct lookup: a pasted Zillow URL, zpid or exact address resolves
+    # straight from the property store; no fetch decision, embedding or vector search.
+    with span("direct_lookup") as sp:
+        docs = resolve_direct(message, PROPERTY_STORE)
+        sp.set(found=len(docs))
+    if docs:
+        props = [{"id": str(d["zpid"]), "score": 1.0, "metadata": sanitize_metadata(d)} for d in docs]
+        lookup_prompt = f"""
+You are EstateWise Assistant, an expert real estate concierge for Chapel Hill, NC.
+The user asked about specific properties; these are their exact records:
+---------------------------------------------------------
+{query_properties_as_string(message, props=props)}
+---------------------------------------------------------
+Answer the question from these records: address, price, bedrooms, bathrooms, area, year, type,
+description and Zillow link as relevant. Use user_context: {user_context or "None"}. Be concise & conversational.
+""".strip()
+        final = generate(lookup_prompt + "\n\n" + hist_str + f"\nUser: {message}\nAssistant:", "lookup")
+        turn.set(path="direct_lookup", properties=[p["id"] for p in props])
+        return final, {"Property Lookup": final}
+
+    # 3.1) Agentic decision: should we fetch property data?
+    # Rules + local n-gram model decide most turns; Gemini is only asked when unsure.
+    def llm_decision():
+        decision_prompt = (
+            "You are EstateWise Assistant. First decide whether you need to fetch property data to answer the user. "
+            "If the message is small talk (greetings, thanks) or does not ask about properties, answer 'No'. "
+            "Otherwise answer 'Yes'.\n\n"
+            f"User message:\n\"{message}\"\n\n"
+            "Respond with exactly 'Yes' or 'No'."
+        )
+        decision = generate(decision_prompt, "decision").strip().lower()
+        return decision.startswith("yes")
+
+    with span("fetch_decision") as sp:
+        fetch_decision = decide_fetch(message, llm_fallback=llm_decision)
+        sp.set(fetch=fetch_decision.fetch, source=fetch_decision.source, confidence=round(fetch_decision.confidence, 3))
+    should_fetch = fetch_decision.fetch
+    turn.set(fetch=should_fetch, fetch_source=fetch_decision.source)
+
+    # 3.1.1) Answer cache: exact repeats skip the embedding call; property
+    # questions also match semantically on the query embedding.
+    query_vec = None
+    hit = None
+    if ANSWER_CACHE is not None:
+        hit = ANSWER_CACHE.lookup_exact(message, user_context, history, count_miss=not should_fetch)
+    if hit is None and should_fetch:
+        try:
+            query_vec = embed_query(message)
+            if ANSWER_CACHE is not None:
+                hit = ANSWER_CACHE.lookup(query_vec, user_context, history, message=message)
+        except Exception as e:
+            query_vec = None
+            turn.set(embed_error=str(e))
+    turn.set(cache=hit.kind if hit is not None else "miss" if ANSWER_CACHE is not None else "off")
+    if hit is not None:
+        turn.set(path="cache", cache_similarity=round(hit.similarity, 4), cache_age_s=round(hit.age, 1))
+        return hit.value
+
+    # 3.2) Fetch & cluster if needed (one embedding + one query, reused for text and clusters)
+    combined = ""
+    if should_fetch:
+        try:
+            raw = query_properties(message, vector=query_vec, user_context=user_context)
+            prop_text = query_properties_as_string(message, props=raw)
+        except Exception as e:
+            prop_text, raw = "", []
+            turn.set(retrieval_error=str(e))
+        # Prefer the stable corpus clusters stored in metadata; re-cluster only as a fallback.
+        with span("clustering", properties=len(raw)) as cluster_span:
+            cluster_text = cluster_context(raw, CLUSTER_PROFILES) if raw and CLUSTER_PROFILES else None
+            if cluster_text:
+                combined = f"{prop_text}\n\n{cluster_text}"
+            elif raw:
+                # Metadata numbers are typed at ingest; unknowns take the column mean.
+                vecs = impute_mean([feature_vector(r["metadata"]) for r in raw])
+                norm, _, _ = minmax_normalize(vecs)
+                clusters = kmeans(norm, CLUSTER_COUNT, seed=42).labels
+                cluster_ctx = "\n".join(f"- Property ID {raw[i]['id']}: cluster {clusters[i]}"
+                                        for i in range(len(raw)))
+                combined = f"{prop_text}\n\nCluster Assignments:\n{cluster_ctx}"
+            cluster_path = "precomputed" if cluster_text else "recluster" if raw else "none"
+            cluster_span.set(path=cluster_path)
+        turn.set(cluster_path=cluster_path)
+
+    # 3.3) Base system instructions
+    base_system_instruction = f"""
+You are EstateWise Assistant, an expert real estate concierge for Chapel Hill, NC. Provide personalized property recommendations.
+
+Property data & clusters (only if used above):
+---------------------------------------------------------
+{combined or "None; relying on conversation context only."}
+---------------------------------------------------------
+
+When recommending:
+1. List address, price, bedrooms, bathrooms, area, year, type.
+2. Include description & Zillow link: https://www.zillow.com/homedetails/{{zpid}}_zpid/
+3. Numbered list, clear & concise.
+4. Use user_context: {user_context or "None"}.
+5. Do not ask for more info before recommending.
+6. Always give at least one recommendation; never say you cannot.
+7. Be concise & conversational.
+""".strip()
+
+    # 3.4) Define experts
+    experts = [
+        {"name":"Data Analyst",        "instr":"Extract stats & trends; be concise."},
+        {"name":"Lifestyle Concierge", "instr":"Emphasize lifestyle: schools, parks, commute."},
+        {"name":"Financial Advisor",   "instr":"Highlight price trends, mortgage, ROI, taxes."},
+        {"name":"Neighborhood Expert", "instr":"Provide safety, walkability, development insights."},
+        {"name":"Cluster Analyst",     "instr":f"Summarize the {CLUSTER_COUNT} clusters and key traits."}
+    ]
+
+    # 3.4.1) Gate experts: local top-k scoring with expert_weights as priors.
+    # The Cluster Analyst has nothing to say without fetched properties.
+    available = [e["name"] for e in experts if combined or e["name"] != "Cluster Analyst"]
+    route = route_experts(message, expert_weights, available=available)
+    experts = [e for e in experts if e["name"] in route.selected]
+    turn.set(experts=list(route.selected), experts_skipped=list(route.skipped))
+
+    # normalize weights
+    wts = {e["name"]: expert_weights.get(e["name"],1.0) for e in experts}
+    total = sum(wts.values()) or len(experts)
+    wts = {n: w/total for n,w in wts.items()}
+
+    # 3.5) Call each expert
+    expert_out = []
+    for e in experts:
+        prompt = (
+            base_system_instruction + "\n\n" +
+            e["instr"] + "\n\n" +
+            hist_str + f"\nUser: {message}\nAssistant:"
+        )
+        expert_out.append({"name":e["name"],"text":generate(prompt, "expert", expert=e["name"])})
+
+    # 3.6) Merge experts
+    merged_views = "\n\n".join(
+        f"**{r['name']}** (w={wts[r['name']]:.2f}):\n{r['text']}"
+        for r in expert_out
+    )
+    merger_instruction = f"""
+You are the EstateWise Master Agent. Synthesize these expert opinions into one cohesive recommendation, following all system instructions above and prioritizing by weight:
+
+{merged_views}
+""".strip()
+
+    def do_merge():
+        prompt = (
+            merger_instruction + "\n\n" +
+            base_system_instruction + "\n\n" +
+            hist_str + f"\nUser: {message}\nAssistant:"
+        )
+        return generate(prompt, "merge")
+
+    # 3.7) Timeout-safe merge
+    remaining = 59.0 - (time.time() - start)
+    merged = True
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as ex:
+        # copy_context() keeps the merge span inside this turn's trace
+        fut = ex.submit(contextvars.copy_context().run, do_merge)
+        try:
+            final = fut.result(timeout=max(0.1, remaining))
+        except concurrent.futures.TimeoutError:
+            final = max(expert_out, key=lambda r:wts[r["name"]])["text"]
+            merged = False
+    turn.set(path="merged" if merged else "merge_timeout_fallback")
+
+    views = {r["name"]:r["text"] for r in expert_out}
+    # Only cache fully merged answers, never the timeout fallback.
+    if merged and ANSWER_CACHE is not None:
+        ANSWER_CACHE.put(message, (final, views), user_context, history, embedding=query_vec)
+    return final, views
+
+
+# 4) CLI loop
+def run_cli():
+    print("🏡 Welcome to EstateWise CLI! Type 'exit' to quit.\n")
+    history = ConversationMemory(summarizer=gemini_summarizer)
+    while True:
+        msg = input("You: ").strip()
+        if msg.lower() in ("exit","quit"):
+            print("EstateWise: Goodbye! 👋")
+            if ANSWER_CACHE is not None:
+                print("Answer cache:", ANSWER_CACHE.stats())
+            break
+        try:
+            reply, _ = chat_with_estatewise(history, msg)
+        except Exception as e:
+            print(f"Error: {e}")
+            break
+        print(f"EstateWise: {reply}\n")
+        remember_turn(history, msg, reply)
+        time.sleep(0.2)
@@ -52,7 +52,7 @@ Welcome to the EstateWise Colab notebook, where we combine advanced data science
 """
 
 # 1. Install Dependencies
-!pip install --upgrade pandas numpy scikit-learn matplotlib seaborn google-generativeai python-dotenv
+!pip install --upgrade pandas numpy scikit-learn matplotlib seaborn google-generativeai python-dotenv ijson
 
 """# 2. Imports & Mount Google Drive"""
 
@@ -62,10 +62,8 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-from sklearn.preprocessing import MinMaxScaler
 from sklearn.decomposition import PCA
 from sklearn.manifold import TSNE
-from sklearn.cluster import KMeans
 
 # Google Gemini client
 import google.generativeai as genai
@@ -77,6 +75,7 @@ drive.mount('/content/drive', force_remount=True)
 """### 2.1 Configure Paths & API Key
 
 - Point `path488` to your Zillow JSON folder in Drive  
+- Copy the repo's `data/python/` helper modules into a `python/` subfolder of `path488`
 - Set `GOOGLE_API_KEY` in Colab’s environment (Settings → Secrets)
 - Set `PINECONE_API_KEY` in Colab’s environment (Settings → Secrets)
 - Set `PINECONE_ENVIRONMENT` in Colab’s environment (Settings → Secrets)
@@ -90,14 +89,25 @@ zillowfiles = glob.glob(path488 + 'Zillow*.json')
 zillow25 = [f for f in zillowfiles if '2025' in f]
 print("Found 2025 JSON files:", zillow25)
 
-"""## 3. Load & Concatenate 2025 Data"""
+# Make the data/python helper modules (fetch_intent, ...) importable
+import sys
+sys.path.append(os.path.join(path488, 'python'))
 
-dfs = []
-for fp in zillow25:
-    with open(fp, 'r', encoding='utf8') as f:
-        arr = json.load(f)
-    dfs.append(pd.DataFrame(arr))
-df_raw = pd.concat(dfs, ignore_index=True)
+"""## 3. Load & Concatenate 2025 Data
+
+Each file is streamed by its own worker process, keeping only the fields section 4 uses (the nested address is flattened to `streetAddress` / `city` / `state` / `zipcode`). Peak memory stays close to the size of the final frame. `python zillow_loader.py compare <files>` reports time and peak RSS against the old `json.load` path.
+"""
+
+from zillow_loader import load_zillow
+from stage_cache import StageCache
+
+# Every expensive stage below goes through `cache.run(stage, fn, *args)`: results
+# are stored in stage_cache/ keyed by the stage's code and a hash of its inputs
+# (files by size and mtime), so a re-run only recomputes stages whose code or
+# inputs changed, and everything downstream of them.
+cache = StageCache()
+
+df_raw = cache.run("load", load_zillow, zillow25)
 print(f"Raw 2025 records: {len(df_raw):,}")
 
 """## 4. Data Cleaning & Wrangling
@@ -181,74 +191,83 @@ def safe_str(val, default="Unknown"):
     return s if s else default
 
 # 4.3 Clean records (improved)
-current_year = pd.Timestamp.now().year
-records = []
+from frame_schema import compact_frame, memory_report
+from derived_features import add_derived_columns
 
-for r in df_raw[keep].to_dict('records'):
-    # normalize address field if it's a JSON string
-    addr_field = r.get("address")
-    if isinstance(addr_field, str):
-        try:
-            addr = json.loads(addr_field)
-        except:
-            addr = {}
-    else:
-        addr = addr_field or {}
-
-    # safe extraction
-    zpid = safe_int(r.get("zpid"), default=0)
-    street = safe_str(addr.get("streetAddress"), default="")
-    city   = safe_str(addr.get("city") or r.get("city"), default="")
-    state  = safe_str(addr.get("state") or r.get("state"), default="")
-    zipcode= safe_str(addr.get("zipcode"), default="")
-
-    # skip if essential address components missing
-    if zpid == 0 or not street or not city or not state or not zipcode:
-        continue
-
-    # numeric fields
-    bedrooms  = safe_int(r.get("bedrooms"), default=0, min_val=0, max_val=20)
-    bathrooms = safe_float(r.get("bathrooms"), default=0.0, min_val=0, max_val=20, step=0.5)
-    price     = safe_num(r.get("price"), default=0, min_val=10000, max_val=1e8)
-
-    # handle yearBuilt bounds
-    year_val = safe_int(r.get("yearBuilt"), default=0)
-    if year_val < 1800 or year_val > current_year + 1:
-        yearBuilt = 0
-    else:
-        yearBuilt = year_val
-
-    livingArea = safe_num(r.get("livingArea"), default=0, min_val=100, max_val=20000)
-
-    # geolocation
-    latitude  = safe_num(r.get("latitude"), default=0.0, min_val=-90, max_val=90)
-    longitude = safe_num(r.get("longitude"), default=0.0, min_val=-180, max_val=180)
-
-    # categorical/text fields
-    homeType           = safe_str(r.get("homeType"))
-    listingDataSource  = safe_str(r.get("listingDataSource"))
-    description        = safe_str(r.get("description"), default="No description provided.")
-
-    records.append({
-        "zpid": zpid,
-        "street": street,
-        "city": city,
-        "state": state,
-        "zipcode": zipcode,
-        "bedrooms": bedrooms,
-        "bathrooms": bathrooms,
-        "price": price,
-        "yearBuilt": yearBuilt,
-        "livingArea": livingArea,
-        "latitude": latitude,
-        "longitude": longitude,
-        "homeType": homeType,
-        "listingDataSource": listingDataSource,
-        "description": description,
-    })
-
-# create DataFrame
-df = pd.DataFrame(records)
+def clean_records(df_raw):
+    """
+    Cleaned, compact-dtype frame from the loader's raw columns.
+    """
+    current_year = pd.Timestamp.now().year
+    records = []
+
+    for r in df_raw.to_dict('records'):
+        # the loader already flattened the address fields (address city/state first)
+        addr = r
+
+        # safe extraction
+        zpid = safe_int(r.get("zpid"), default=0)
+        street = safe_str(addr.get("streetAddress"), default="")
+        city   = safe_str(addr.get("city") or r.get("city"), default="")
+        state  = safe_str(addr.get("state") or r.get("state"), default="")
+        zipcode= safe_str(addr.get("zipcode"), default="")
+
+        # skip if essential address components missing
+        if zpid == 0 or not street or not city or not state or not zipcode:
+            continue
+
+        # numeric fields
+        bedrooms  = safe_int(r.get("bedrooms"), default=0, min_val=0, max_val=20)
+        bathrooms = safe_float(r.get("bathrooms"), default=0.0, min_val=0, max_val=20, step=0.5)
+        price     = safe_num(r.get("price"), default=0, min_val=10000, max_val=1e8)
+
+        # handle yearBuilt bounds
+        year_val = safe_int(r.get("yearBuilt"), default=0)
+        if year_val < 1800 or year_val > current_year + 1:
+            yearBuilt = 0
+        else:
+            yearBuilt = year_val
+
+        livingArea = safe_num(r.get("livingArea"), default=0, min_val=100, max_val=20000)
+
+        # geolocation
+        latitude  = safe_num(r.get("latitude"), default=0.0, min_val=-90, max_val=90)
+        longitude = safe_num(r.get("longitude"), default=0.0, min_val=-180, max_val=180)
+
+        # categorical/text fields
+        homeType           = safe_str(r.get("homeType"))
+        listingDataSource  = safe_str(r.get("listingDataSource"))
+        description        = safe_str(r.get("description"), default="No description provided.")
+
+        records.append({
+            "zpid": zpid,
+            "street": street,
+            "city": city,
+            "state": state,
+            "zipcode": zipcode,
+            "bedrooms": bedrooms,
+            "bathrooms": bathrooms,
+            "price": price,
+            "yearBuilt": yearBuilt,
+            "livingArea": livingArea,
+            "latitude": latitude,
+            "longitude": longitude,
+            "homeType": homeType,
+            "listingDataSource": listingDataSource,
+            "description": description,
+        })
+
+    # derived features computed once here (pricePerSqft, age, sizeBucket,
+    # cityPricePercentile; NaN when unknown) instead of in every map section
+    df_wide = add_derived_columns(pd.DataFrame(records), current_year)
+    # compact dtypes: categorical city/state/zip/type/source, small ints and
+    # float32 where values are bounded, shared or Arrow-backed text
+    del records
+    df = compact_frame(df_wide)
+    print(memory_report(df_wide, df).to_string(index=False))
+    return df
+
+df = cache.run("clean", clean_records, df_raw)
 print(f"Cleaned records: {len(df):,}")
 df.head()
 
@@ -398,33 +417,32 @@ print("Top 10 Most Expensive Properties:\n", top10.to_string(index=False))
 """## 6. PCA, t-SNE & k‑Means Clustering"""
 
 # 6.1 Impute & Normalize features
-from sklearn.impute import SimpleImputer
-from sklearn.preprocessing import MinMaxScaler
+from clustering import impute_mean, minmax_normalize, kmeans
 
 features = ["price", "bedrooms", "bathrooms", "livingArea", "yearBuilt"]
 
-# 1) Impute missing values with column means
-imputer = SimpleImputer(strategy="mean")
-X_imputed = imputer.fit_transform(df[features])
+def build_features(df, features):
+    # 1) Impute missing values with column means
+    X_imputed = impute_mean(df[features].to_numpy())
+    # 2) Scale to [0,1]
+    return minmax_normalize(X_imputed)
 
-# 2) Scale to [0,1]
-scaler = MinMaxScaler()
-X = scaler.fit_transform(X_imputed)
+X, feature_mins, feature_maxs = cache.run("features", build_features, df, features)
 
-# 6.2 PCA
-from sklearn.decomposition import PCA
-pca = PCA(n_components=2, random_state=42)
-df["pca1"], df["pca2"] = pca.fit_transform(X).T
+# 6.2–6.3 PCA (randomized solver) and t-SNE. Up to 5,000 rows t-SNE runs on
+# every row; beyond that it is fitted on a stratified sample of 5,000 landmark
+# rows and the rest are placed by their nearest landmarks. Both projections
+# are cached as the "projections" stage, so re-runs are instant.
+from projection import project
 
-# 6.3 t-SNE
-from sklearn.manifold import TSNE
-tsne = TSNE(n_components=2, random_state=42, perplexity=50)
-df["tsne1"], df["tsne2"] = tsne.fit_transform(X).T
+proj = cache.run("projections", project, X, n_landmarks=5000, perplexity=50, seed=42, cache_dir=None)
+df["pca1"], df["pca2"] = proj.pca.T
+df["tsne1"], df["tsne2"] = proj.tsne.T
+print("PCA explained variance ratio:", proj.explained_variance_ratio.round(3))
 
-# 6.4 k-Means
-from sklearn.cluster import KMeans
-kmeans = KMeans(n_clusters=4, random_state=42, n_init=10)
-df["cluster"] = kmeans.fit_predict(X)
+# 6.4 k-Means (NumPy, k-means++ seeding; mini-batch kicks in for very large frames)
+km = cache.run("clusters", kmeans, X, 4, seed=42, n_init=10, batch_size="auto")
+df["cluster"] = km.labels
 
 # Visualize clusters
 import matplotlib.pyplot as plt
@@ -479,19 +497,12 @@ pip install folium
 
 import pandas as pd
 import folium
-from folium.plugins import MarkerCluster, HeatMap, MiniMap, Fullscreen, MeasureControl
+from folium.plugins import HeatMap, MiniMap, Fullscreen, MeasureControl
 
 # -------------------------------------------------------------------
 # 8. Interactive Geospatial Visualization of Listings
 # -------------------------------------------------------------------
 
-# Define chunked‐loading options so markers are added in small, non-blocking batches
-cluster_opts = {
-    'chunkedLoading': True,
-    'chunkInterval': 100,   # ms of work per chunk
-    'chunkDelay': 5         # ms pause between chunks
-}
-
 # 8.1 Center map on Chapel Hill, NC
 chapel_hill_coords = [35.9132, -79.0558]
 m = folium.Map(
@@ -510,54 +521,46 @@ MiniMap(toggle_display=True, position='bottomright').add_to(m)
 
 # 8.4 Prepare a color palette for clusters
 colors = ['red', 'blue', 'green', 'purple', 'orange', 'darkred', 'lightred', 'beige']
-cluster_colors = {c: colors[c % len(colors)] for c in sorted(df['cluster'].unique())}
-
-# 8.5 Create one hidden FeatureGroup + MarkerCluster for all properties
-cluster_fg = folium.FeatureGroup(name='Property Clusters', show=False)
-m.add_child(cluster_fg)
-marker_cluster = MarkerCluster(
-    name='Property Clusters',
-    options={
-        **cluster_opts,
-        'spiderfyOnMaxZoom': False,
-        'disableClusteringAtZoom': 17,
-        'maxClusterRadius': 35
-    }
-).add_to(cluster_fg)
-
-# 8.6 Add all listings into the single MarkerCluster
-for _, row in df.iterrows():
-    lat, lon = row['latitude'], row['longitude']
-    if pd.isna(lat) or pd.isna(lon):
-        continue
-
-    c = row['cluster']
-    color = cluster_colors[c]
-
-    popup_html = (
-        f"<strong>{row['street']}, {row['city']}</strong><br>"
-        f"Price: ${row['price']:,}<br>"
-        f"Beds: {row['bedrooms']}, Baths: {row['bathrooms']}<br>"
-        f"Area: {row['livingArea']} sqft, Year: {row['yearBuilt']}<br>"
-        f"Cluster: {c}"
-    )
-    tooltip = f"${row['price']:,} — {row['bedrooms']}bd/{row['bathrooms']}ba"
-
-    folium.CircleMarker(
-        location=(lat, lon),
-        radius=4,
-        color=color,
-        fill=True,
-        fill_color=color,
-        fill_opacity=0.5,
-        popup=folium.Popup(popup_html, max_width=250),
-        tooltip=tooltip
-    ).add_to(marker_cluster)
+
+# 8.5 Pre-cluster the listings into per-zoom GeoJSON tiles: one feature per
+# cell (a listing, or a cluster with its count, average price and a
+# representative listing), so no tile holds more than 64 markers
+from map_tiles import inline_tiles, listing_tiles_layer, tiles_from_frame, write_tiles
+
+# Set SAVE_MAP to write the map to estatewise_map.html with its tiles in
+# listing_tiles/; open it through `python -m http.server` from this folder
+SAVE_MAP = False
+
+# 8.6 Only the tiles in view get markers. The inline map (shown in this
+# output cell, which cannot fetch tile files) embeds its tiles: full listing
+# details at the top zoom, slim clusters below it, and a lower top zoom if
+# the corpus would still be too heavy for the page
+if SAVE_MAP:
+    listing_tiles = cache.run("tiles", tiles_from_frame, df, min_zoom=10, max_zoom=17)
+    tile_bytes = write_tiles(listing_tiles, 'listing_tiles')
+    tiles_layer = listing_tiles_layer(url='listing_tiles/{z}/{x}/{y}.json', name='Property Clusters',
+                                      colors=colors, show=False, min_zoom=10, max_zoom=17)
+else:
+    listing_tiles, tiles_max_zoom, tile_bytes = cache.run("tiles_inline", inline_tiles, df, min_zoom=10, max_zoom=15)
+    tiles_layer = listing_tiles_layer(tiles=listing_tiles, name='Property Clusters', colors=colors,
+                                      show=False, min_zoom=10, max_zoom=tiles_max_zoom)
+tiles_layer.add_to(m)
+print(f"{len(listing_tiles):,} listing tiles, {tile_bytes / 1e6:.1f} MB")
 
 # 8.7 Price Heatmap layer (visible by default)
+# All heatmaps and the composite-score grid below read one pre-aggregated grid
+# pyramid: ~125 m cells up to ~4 km, built with a single pass of np.bincount.
+from grid_engine import GridPyramid
+
+pyramid = cache.run(
+    "grid", GridPyramid, df['latitude'], df['longitude'],
+    {'price': df['price'], 'livingArea': df['livingArea'], 'bedrooms': df['bedrooms'],
+     'price_per_sqft': df['pricePerSqft']}
+)
+
 heat_fg = folium.FeatureGroup(name='Price Heatmap', show=True)
 m.add_child(heat_fg)
-heat_data = df[['latitude', 'longitude', 'price']].dropna().values.tolist()
+heat_data = pyramid.levels[0].heat_points('price')
 HeatMap(
     data=heat_data,
     name='Price Heatmap',
@@ -570,6 +573,9 @@ HeatMap(
 # 8.8 Layer control (clusters unchecked, heatmap checked)
 folium.LayerControl(collapsed=False, position='topright').add_to(m)
 
+if SAVE_MAP:
+    m.save('estatewise_map.html')
+
 # Display the map
 m
 
@@ -592,7 +598,7 @@ The heatmap layer overlays a semi‐transparent “intensity” map on top of th
   - A larger radius or blur makes hot spots spread out, while smaller values concentrate them tightly around each point.
 
 - **Weighting by Price**  
-  - Because we passed `[lat, lon, price]` as each data point, pricier listings contribute more to the heatmap intensity than cheaper ones.  
+  - Each point is a ~125 m grid cell weighted by the total price of its listings (scaled to 0–1), so pricier and denser cells contribute more to the heatmap intensity.  
   - Areas with both high listing counts *and* high prices will therefore appear hottest (deep red).
 
 Use this layer to quickly identify neighborhoods where expensive homes are concentrated versus those dominated by lower‐priced or fewer listings. You can also toggle the clusters on/off in the layer control at the top right.
@@ -638,7 +644,7 @@ MeasureControl(position='topright', primary_length_unit='feet').add_to(living_ar
 MiniMap(toggle_display=True, position='bottomright').add_to(living_area_map)
 
 # 8.13 Living Area Heatmap layer (density weighted by livingArea)
-living_area_data = df[['latitude', 'longitude', 'livingArea']].dropna().values.tolist()
+living_area_data = pyramid.levels[0].heat_points('livingArea')
 HeatMap(
     data=living_area_data,
     name='Living Area Heatmap',
@@ -673,7 +679,7 @@ The living‐area heatmap overlays a semi-transparent “intensity” layer on t
   - Smaller radii concentrate heat around individual points; larger radii spread it out.
 
 - **Weighting by Living Area**  
-  - Because we passed `[lat, lon, livingArea]` into the heatmap, listings with more square footage contribute more to the intensity than compact ones.  
+  - Each point is a ~125 m grid cell weighted by the total square footage of its listings, so cells with more or larger homes contribute more to the intensity than compact ones.  
   - Neighborhoods featuring both high listing counts **and** large homes will therefore appear hottest (deep red).
 
 Use this layer to spot where the biggest homes are clustered versus areas dominated by smaller dwellings. You can toggle other layers (cluster markers, price heatmap, etc.) on and off via the layer control.
@@ -716,9 +722,8 @@ MeasureControl(position='topright', primary_length_unit='feet').add_to(price_psf
 # 8.18 Add a minimap inset
 MiniMap(toggle_display=True, position='bottomright').add_to(price_psf_map)
 
-# 8.19 Compute price per square foot and prepare heatmap data
-df['price_per_sqft'] = df['price'] / df['livingArea']
-price_psf_data = df[['latitude', 'longitude', 'price_per_sqft']].dropna().values.tolist()
+# 8.19 Price-per-sqft heatmap data (pricePerSqft is derived at clean time, the pyramid comes from 8.7)
+price_psf_data = pyramid.levels[0].heat_points('price_per_sqft')
 
 # 8.20 Price-per-sqft Heatmap layer (visible by default)
 # Note: gradient keys must be strings so folium doesn’t try to camelCase them
@@ -781,54 +786,30 @@ MeasureControl(position='topright', primary_length_unit='feet').add_to(grid_scor
 # 8.35 Add a minimap inset
 MiniMap(toggle_display=True, position='bottomright').add_to(grid_score_map)
 
-# 8.36 Compute price_per_sqft if not already present
-if 'price_per_sqft' not in df:
-    df['price_per_sqft'] = df['price'] / df['livingArea']
-
-# 8.37 Define a regular lat/lon grid (~0.005° ≈ 500 m cells)
-lat_min, lat_max = df['latitude'].min(), df['latitude'].max()
-lon_min, lon_max = df['longitude'].min(), df['longitude'].max()
-grid_size = 0.005
-lat_bins = np.arange(lat_min, lat_max + grid_size, grid_size)
-lon_bins = np.arange(lon_min, lon_max + grid_size, grid_size)
-
-df['lat_bin'] = pd.cut(
-    df['latitude'],
-    bins=lat_bins,
-    include_lowest=True,
-    labels=lat_bins[:-1]
-)
-df['lon_bin'] = pd.cut(
-    df['longitude'],
-    bins=lon_bins,
-    include_lowest=True,
-    labels=lon_bins[:-1]
-)
-
-# 8.38 Aggregate metrics per grid cell
-grid = (
-    df
-    .dropna(subset=['lat_bin', 'lon_bin'])
-    .groupby(['lat_bin', 'lon_bin'], observed=False)
-    .agg(
-        count=('price', 'count'),
-        avg_psf=('price_per_sqft', 'mean'),
-        avg_area=('livingArea', 'mean'),
-        avg_beds=('bedrooms', 'mean')
+# 8.36 Reuse the grid pyramid from 8.7 (rebuilt if this cell runs on its own)
+if 'pyramid' not in globals():
+    from grid_engine import GridPyramid
+    pyramid = GridPyramid(
+        df['latitude'], df['longitude'],
+        {'price': df['price'], 'livingArea': df['livingArea'], 'bedrooms': df['bedrooms'],
+         'price_per_sqft': df['pricePerSqft']}
     )
-    .reset_index()
-)
 
-grid = grid[grid['count'] >= 3]
+# 8.37 Pick the ~0.005° (≈ 500 m) level; it is coarsened if it would need
+# more than a couple of thousand markers
+grid_level = pyramid.markers_level(0.005)
+grid_size = grid_level.size
 
-# 8.39 Compute percentile ranks (0–1) for each metric
-for col in ['avg_psf', 'avg_area', 'avg_beds']:
-    grid[col + '_pct'] = grid[col].rank(pct=True, method='average')
+# 8.38 Per-cell metrics come straight from the level's sums and counts
+grid = grid_level.frame(['price_per_sqft', 'livingArea', 'bedrooms']).rename(columns={
+    'price_per_sqft': 'avg_psf', 'livingArea': 'avg_area', 'bedrooms': 'avg_beds'
+})
 
-# 8.40 Compute composite score (mean percentile × 100)
-grid['score'] = grid[['avg_psf_pct', 'avg_area_pct', 'avg_beds_pct']].mean(axis=1) * 100
+# 8.39–8.40 Composite score: mean percentile rank of the three averages × 100,
+# over cells with at least 3 listings
+grid['score'] = grid_level.composite_score(['price_per_sqft', 'livingArea', 'bedrooms'], min_count=3)
 
-# 8.41 Drop NaN scores
+# 8.41 Drop cells without a score
 grid = grid.dropna(subset=['score'])
 
 # 8.42 Prepare a stepped colormap
@@ -841,10 +822,9 @@ colormap = StepColormap(
 colormap.add_to(grid_score_map)
 
 # 8.43 Plot a label at each cell’s centroid showing its score
-for _, row in grid.iterrows():
-    lat_ctr = float(row['lat_bin']) + grid_size / 2
-    lon_ctr = float(row['lon_bin']) + grid_size / 2
-    sc = row['score']
+lat_ctrs = (grid['lat_bin'] + grid_size / 2).to_numpy()
+lon_ctrs = (grid['lon_bin'] + grid_size / 2).to_numpy()
+for lat_ctr, lon_ctr, sc in zip(lat_ctrs, lon_ctrs, grid['score'].to_numpy()):
     color = colormap(sc)
     folium.map.Marker(
         location=(lat_ctr, lon_ctr),
@@ -923,11 +903,13 @@ This notebook cell lets you chat **directly** with Google Gemini from Colab—no
 **How it works:**
 1. **Load credentials** from your Colab secrets.
 2. **Initialize** the Gemini client and Pinecone index.
-3. **Agentic decision**: the assistant will decide if it needs to fetch property embeddings & metadata or just use conversation context.
-4. **Expert ensemble**: five specialized “agents” (Data Analyst, Lifestyle Concierge, Financial Advisor, Neighborhood Expert, Cluster Analyst) each produce their view in parallel.
+3. **Agentic decision**: a local classifier (`fetch_intent.py`: regex rules + a small n-gram model) decides if the assistant needs to fetch property embeddings & metadata or just use conversation context; Gemini is only consulted when the classifier is unsure.
+4. **Expert ensemble**: five specialized “agents” (Data Analyst, Lifestyle Concierge, Financial Advisor, Neighborhood Expert, Cluster Analyst) are scored locally by a gating model (`expert_router.py`); only the top-k relevant experts are called, and skipped experts are logged.
 5. A **Master Agent** synthesizes all expert opinions into one cohesive, concise recommendation—always providing at least one property suggestion.
 6. **CLI loop**: type your queries at the prompt, get back rich property recommendations, and type `exit` or `quit` to end the session.
 
+The pipeline itself lives in `python/estatewise_chat.py`; this cell only creates the clients and hands them over with `estatewise_chat.configure(client, index)`. `python/bench_chat.py` runs the same pipeline against fake Gemini/Pinecone clients to measure per-stage latency offline.
+
 _For a full web-app experience with polished UI and persistence, check out our deployed version at_  
 https://estatewise.vercel.app/
 """
@@ -935,14 +917,12 @@ https://estatewise.vercel.app/
 pip install pinecone google-genai python-dotenv
 
 import os
-import time
-import json
-import re
-import concurrent.futures
 from dotenv import load_dotenv
 from google import genai
 from pinecone import Pinecone
 from google.colab import userdata
+import estatewise_chat
+from estatewise_chat import chat_with_estatewise, query_properties, query_properties_as_string, run_cli, ANSWER_CACHE
 
 # 1) Load API keys from Colab secrets
 load_dotenv()
@@ -960,256 +940,9 @@ client = genai.Client(api_key=api_key)
 pc = Pinecone(api_key=pinecone_api_key, environment=pinecone_env)
 index = pc.Index(pinecone_index)
 
-# 3) Pinecone helpers
-def sanitize_metadata(md: dict) -> dict:
-    out = {}
-    for k, v in (md or {}).items():
-        if isinstance(v, (str, int, float, bool)):
-            out[k] = v
-        elif isinstance(v, list):
-            out[k] = ", ".join(v) if all(isinstance(x, str) for x in v) else json.dumps(v)
-        elif isinstance(v, dict):
-            out[k] = json.dumps(v)
-        else:
-            out[k] = str(v)
-    return out
-
-def query_properties(query: str, top_k: int = 30):
-    emb = client.embeddings.create(model="models/text-embedding-004", content=query)
-    vec = emb.data[0].embedding
-    resp = index.query(vector=vec, top_k=top_k, include_metadata=True)
-    matches = getattr(resp, "matches", resp.get("matches", []))
-    return [
-        {
-            "id": getattr(m, "id", m.get("id")),
-            "score": getattr(m, "score", m.get("score", 0.0)),
-            "metadata": sanitize_metadata(getattr(m, "metadata", m.get("metadata", {})))
-        }
-        for m in matches
-    ]
-
-def query_properties_as_string(query: str, top_k: int = 30) -> str:
-    props = query_properties(query, top_k)
-    if not props:
-        return "No matching properties found."
-    out = "Matching Properties:\n\n"
-    for r in props:
-        m = r["metadata"]
-        addr = {}
-        if "address" in m:
-            try: addr = json.loads(m["address"])
-            except: addr = {}
-        street = addr.get("streetAddress", "Unknown")
-        city   = addr.get("city", "Unknown")
-        state  = addr.get("state", "Unknown")
-        zipc   = addr.get("zipcode", "")
-        price  = f"${m['price']}" if m.get("price") else "N/A"
-        beds   = m.get("bedrooms", "N/A")
-        baths  = m.get("bathrooms", "N/A")
-        area   = f"{m['livingArea']} sqft" if m.get("livingArea") else "N/A"
-        year   = m.get("yearBuilt", "N/A")
-        htype  = m.get("homeType", "N/A")
-        desc   = m.get("description", "No description")
-        zpid   = str(m.get("zpid", ""))
-        link   = f"https://www.zillow.com/homedetails/{zpid}_zpid/" if zpid else "N/A"
-        out += (
-            f"Property at {street}, {city}, {state} {zipc}\n"
-            f"  - Price: {price}\n"
-            f"  - Beds: {beds}, Baths: {baths}\n"
-            f"  - Living Area: {area}\n"
-            f"  - Year Built: {year}\n"
-            f"  - Type: {htype}\n"
-            f"  - Description: {desc}\n"
-            f"  - More details: {link}\n\n"
-        )
-    return out
-
-# 4) K-Means clustering
-def kmeans(data: list[list[float]], k: int, max_iter: int = 20) -> list[int]:
-    if not data or k <= 0:
-        return []
-    n, dims = len(data), len(data[0])
-    centroids = [row.copy() for row in data[:min(k, n)]]
-    while len(centroids) < k:
-        centroids.append(data[-1].copy())
-    assign = [0] * n
-    for _ in range(max_iter):
-        moved = False
-        for i, pt in enumerate(data):
-            dists = [sum((pt[d] - c[d])**2 for d in range(dims)) for c in centroids]
-            c = dists.index(min(dists))
-            if assign[i] != c:
-                assign[i] = c
-                moved = True
-        if not moved:
-            break
-        sums = [[0]*dims for _ in range(k)]
-        counts = [0]*k
-        for i, pt in enumerate(data):
-            c = assign[i]
-            counts[c] += 1
-            for d in range(dims):
-                sums[c][d] += pt[d]
-        for c in range(k):
-            if counts[c]:
-                centroids[c] = [sums[c][d]/counts[c] for d in range(dims)]
-    return assign
-
-# 5) Chat function with agentic decision
-CLUSTER_COUNT = 4
-MAX_HISTORY = 20
-
-def chat_with_estatewise(history: list[str], message: str, user_context: str = "", expert_weights: dict[str,float] = None):
-    expert_weights = expert_weights or {}
-    start = time.time()
-    low = message.strip().lower()
-
-    # 5.0) Greeting / thanks shortcuts
-    if low in ("hi", "hello", "hey"):
-        return "Hello! How can I assist you today?", {}
-    if low in ("thanks", "thank you"):
-        return "You're welcome! Let me know if you need anything else.", {}
-
-    # trim history
-    hist = history[-MAX_HISTORY*2:]
-    hist_str = "\n".join(f"User: {m}" if i%2==0 else f"Assistant: {m}"
-                         for i, m in enumerate(hist))
-
-    # 5.1) Agentic decision: should we fetch property data?
-    decision_prompt = (
-        "You are EstateWise Assistant. First decide whether you need to fetch property data to answer the user. "
-        "If the message is small talk (greetings, thanks) or does not ask about properties, answer 'No'. "
-        "Otherwise answer 'Yes'.\n\n"
-        f"User message:\n\"{message}\"\n\n"
-        "Respond with exactly 'Yes' or 'No'."
-    )
-    decision = client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=decision_prompt
-    ).text.strip().lower()
-    should_fetch = decision.startswith("yes")
-
-    # 5.2) Fetch & cluster if needed
-    combined = ""
-    if should_fetch:
-        try:
-            prop_text = query_properties_as_string(message)
-            raw = query_properties(message)
-        except:
-            prop_text, raw = "", []
-        if raw:
-            vecs = []
-            for r in raw:
-                m = r["metadata"]
-                def to_num(x):
-                    s = re.sub(r"[^0-9.\-]", "", str(x) or "0")
-                    return float(s) if s else 0.0
-                vecs.append([
-                    to_num(m.get("price")), to_num(m.get("bedrooms")),
-                    to_num(m.get("bathrooms")), to_num(m.get("livingArea")),
-                    to_num(m.get("yearBuilt"))
-                ])
-            dims = len(vecs[0])
-            mins = [min(v[i] for v in vecs) for i in range(dims)]
-            maxs = [max(v[i] for v in vecs) for i in range(dims)]
-            norm = [
-                [(v[i]-mins[i])/(maxs[i]-mins[i]) if maxs[i]!=mins[i] else 0.0 for i in range(dims)]
-                for v in vecs
-            ]
-            clusters = kmeans(norm, CLUSTER_COUNT)
-            cluster_ctx = "\n".join(f"- Property ID {raw[i]['id']}: cluster {clusters[i]}"
-                                    for i in range(len(raw)))
-            combined = f"{prop_text}\n\nCluster Assignments:\n{cluster_ctx}"
-
-    # 5.3) Base system instructions
-    base_system_instruction = f"""
-You are EstateWise Assistant, an expert real estate concierge for Chapel Hill, NC. Provide personalized property recommendations.
-
-Property data & clusters (only if used above):
----------------------------------------------------------
-{combined or "None; relying on conversation context only."}
----------------------------------------------------------
-
-When recommending:
-1. List address, price, bedrooms, bathrooms, area, year, type.
-2. Include description & Zillow link: https://www.zillow.com/homedetails/{{zpid}}_zpid/
-3. Numbered list, clear & concise.
-4. Use user_context: {user_context or "None"}.
-5. Do not ask for more info before recommending.
-6. Always give at least one recommendation; never say you cannot.
-7. Be concise & conversational.
-""".strip()
-
-    # 5.4) Define experts
-    experts = [
-        {"name":"Data Analyst",        "instr":"Extract stats & trends; be concise."},
-        {"name":"Lifestyle Concierge", "instr":"Emphasize lifestyle: schools, parks, commute."},
-        {"name":"Financial Advisor",   "instr":"Highlight price trends, mortgage, ROI, taxes."},
-        {"name":"Neighborhood Expert", "instr":"Provide safety, walkability, development insights."},
-        {"name":"Cluster Analyst",     "instr":f"Summarize the {CLUSTER_COUNT} clusters and key traits."}
-    ]
-
-    # normalize weights
-    wts = {e["name"]: expert_weights.get(e["name"],1.0) for e in experts}
-    total = sum(wts.values()) or len(experts)
-    wts = {n: w/total for n,w in wts.items()}
-
-    # 5.5) Call each expert
-    expert_out = []
-    for e in experts:
-        prompt = (
-            base_system_instruction + "\n\n" +
-            e["instr"] + "\n\n" +
-            hist_str + f"\nUser: {message}\nAssistant:"
-        )
-        resp = client.models.generate_content(model="gemini-2.0-flash", contents=prompt)
-        expert_out.append({"name":e["name"],"text":resp.text})
-
-    # 5.6) Merge experts
-    merged_views = "\n\n".join(
-        f"**{r['name']}** (w={wts[r['name']]:.2f}):\n{r['text']}"
-        for r in expert_out
-    )
-    merger_instruction = f"""
-You are the EstateWise Master Agent. Synthesize these expert opinions into one cohesive recommendation, following all system instructions above and prioritizing by weight:
-
-{merged_views}
-""".strip()
-
-    def do_merge():
-        prompt = (
-            merger_instruction + "\n\n" +
-            base_system_instruction + "\n\n" +
-            hist_str + f"\nUser: {message}\nAssistant:"
-        )
-        return client.models.generate_content(model="gemini-2.0-flash", contents=prompt).text
-
-    # 5.7) Timeout-safe merge
-    remaining = 59.0 - (time.time() - start)
-    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as ex:
-        fut = ex.submit(do_merge)
-        try:
-            final = fut.result(timeout=max(0.1, remaining))
-        except concurrent.futures.TimeoutError:
-            final = max(expert_out, key=lambda r:wts[r["name"]])["text"]
+# 3) Wire the chat pipeline (estatewise_chat.py) to these clients
+estatewise_chat.configure(client, index)
 
-    views = {r["name"]:r["text"] for r in expert_out}
-    return final, views
-
-# 6) CLI loop
+# 4) CLI loop
 if __name__=="__main__":
-    print("🏡 Welcome to EstateWise CLI! Type 'exit' to quit.\n")
-    history = []
-    while True:
-        msg = input("You: ").strip()
-        if msg.lower() in ("exit","quit"):
-            print("EstateWise: Goodbye! 👋")
-            break
-        try:
-            reply, _ = chat_with_estatewise(history, msg)
-        except Exception as e:
-            print(f"Error: {e}")
-            break
-        print(f"EstateWise: {reply}\n")
-        history.extend([msg, reply])
-        time.sleep(0.2)
\ No newline at end of file
+    run_cli()
@@ -0,0 +1,195 @@
+"""
+Gating stage for the chatbot's mixture of experts.
+
+Scores each expert for a message with one small logistic model per expert
+(one-vs-rest over the same hashed n-grams as fetch_intent.py), multiplies by
+the caller's expert_weights as priors, and keeps the top-k. Skipped experts
+are logged so routing decisions can be audited.
+
+Usage:
+    python expert_router.py train   # fit on expert_routing_samples.jsonl, write expert_router_model.json
+    python expert_router.py eval    # 5-fold precision/recall and experts-per-turn report
+"""
+import json
+import logging
+import random
+import re
+import sys
+from collections import namedtuple
+from pathlib import Path
+
+from fetch_intent import predict_proba, train_model
+
+BASE_DIR = Path(__file__).resolve().parent
+SAMPLES_PATH = BASE_DIR / "expert_routing_samples.jsonl"
+MODEL_PATH = BASE_DIR / "expert_router_model.json"
+
+EXPERT_NAMES = [
+    "Data Analyst",
+    "Lifestyle Concierge",
+    "Financial Advisor",
+    "Neighborhood Expert",
+    "Cluster Analyst",
+]
+
+TOP_K = 3
+MIN_SCORE = 0.35
+
+# Keyword hits push an expert's score up before priors are applied.
+KEYWORD_BOOSTS = {
+    "Data Analyst": re.compile(r"\b(average|median|stats?|statistics|trend|compare|comparison|cheapest|"
+                               r"most expensive|price per|distribution|how many)\b"),
+    "Lifestyle Concierge": re.compile(r"\b(schools?|parks?|commute|restaurants?|family|kids|dog|gym|greenway|"
+                                      r"lifestyle|quiet|walk(ing)? distance|shopping)\b"),
+    "Financial Advisor": re.compile(r"\b(mortgage|afford|payment|down payment|interest|rate|roi|invest(ment)?|"
+                                    r"tax(es)?|budget|loan|rent(al)?|cash flow|appreciation)\b"),
+    "Neighborhood Expert": re.compile(r"\b(neighbou?rhoods?|safe(ty)?|crime|walkab(le|ility)|development|"
+                                      r"area|community|hoa|zoning|downtown)\b"),
+    "Cluster Analyst": re.compile(r"\b(clusters?|segments?|groups?|similar|categories|types of homes|"
+                                  r"market segments?)\b"),
+}
+KEYWORD_BOOST = 0.35
+
+Route = namedtuple("Route", ["selected", "skipped", "scores"])
+
+_model_cache = None
+
+
+def load_samples(path=SAMPLES_PATH):
+    samples = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                rec = json.loads(line)
+                samples.append((rec["text"], set(rec["experts"])))
+    return samples
+
+
+def train_router(samples):
+    """
+    Fit one binary model per expert on (text, {expert names}) pairs.
+    """
+    return {
+        name: train_model([(text, int(name in experts)) for text, experts in samples])
+        for name in EXPERT_NAMES
+    }
+
+
+def save_router(models, path=MODEL_PATH):
+    out = {
+        name: {**m, "weights": {str(h): w for h, w in m["weights"].items()}}
+        for name, m in models.items()
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(out, f)
+
+
+def load_router(path=MODEL_PATH):
+    """
+    Load the per-expert models, training in-memory from the labeled sample
+    when no model file exists. Cached per process.
+    """
+    global _model_cache
+    if _model_cache is not None:
+        return _model_cache
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        for m in raw.values():
+            m["weights"] = {int(h): w for h, w in m["weights"].items()}
+        _model_cache = raw
+    except FileNotFoundError:
+        _model_cache = train_router(load_samples())
+    return _model_cache
+
+
+def score_experts(message, expert_weights=None, models=None, names=EXPERT_NAMES):
+    """
+    Return {expert: score}. Scores are model probability plus keyword boost,
+    scaled by the expert's weight relative to the mean weight.
+    """
+    expert_weights = expert_weights or {}
+    models = models or load_router()
+    low = message.lower()
+    priors = {n: max(0.0, float(expert_weights.get(n, 1.0))) for n in names}
+    mean_prior = (sum(priors.values()) / len(priors)) or 1.0
+    scores = {}
+    for name in names:
+        p = predict_proba(models[name], message) if name in models else 0.5
+        pattern = KEYWORD_BOOSTS.get(name)
+        if pattern is not None and pattern.search(low):
+            p = min(1.0, p + KEYWORD_BOOST)
+        scores[name] = p * priors[name] / mean_prior
+    return scores
+
+
+def route_experts(message, expert_weights=None, k=TOP_K, min_score=MIN_SCORE, available=None, models=None):
+    """
+    Pick the experts to call for a message.
+
+    available restricts the candidates (e.g. drop "Cluster Analyst" when no
+    property data was fetched). At least one expert is always selected.
+    """
+    names = [n for n in EXPERT_NAMES if available is None or n in available]
+    scores = score_experts(message, expert_weights, models, names)
+    ranked = sorted(names, key=lambda n: scores[n], reverse=True)
+    selected = [n for n in ranked[:k] if scores[n] >= min_score] or ranked[:1]
+    skipped = [n for n in EXPERT_NAMES if n not in selected]
+    logging.info(
+        "Expert routing: selected=%s skipped=%s scores=%s",
+        selected, skipped, {n: round(s, 3) for n, s in scores.items()},
+    )
+    return Route(selected, skipped, scores)
+
+
+def evaluate(samples, folds=5, k=TOP_K, min_score=MIN_SCORE, seed=42):
+    """
+    k-fold micro precision/recall of the selected expert sets against labels.
+    """
+    rng = random.Random(seed)
+    shuffled = samples[:]
+    rng.shuffle(shuffled)
+    tp = fp = fn = called = 0
+    exact = 0
+    for f in range(folds):
+        test = shuffled[f::folds]
+        train = [s for i, s in enumerate(shuffled) if i % folds != f]
+        models = train_router(train)
+        for text, experts in test:
+            selected = set(route_experts(text, k=k, min_score=min_score, models=models).selected)
+            tp += len(selected & experts)
+            fp += len(selected - experts)
+            fn += len(experts - selected)
+            called += len(selected)
+            exact += int(selected == experts)
+    n = len(samples) or 1
+    return {
+        "samples": len(samples),
+        "precision": tp / ((tp + fp) or 1),
+        "recall": tp / ((tp + fn) or 1),
+        "exact_match": exact / n,
+        "experts_per_turn": called / n,
+        "llm_calls_saved_per_turn": len(EXPERT_NAMES) - called / n,
+    }
+
+
+def main(argv):
+    cmd = argv[1] if len(argv) > 1 else "eval"
+    samples = load_samples()
+    if cmd == "train":
+        save_router(train_router(samples))
+        logging.info("Trained %d expert models on %d samples, wrote %s.", len(EXPERT_NAMES), len(samples), MODEL_PATH)
+    elif cmd == "eval":
+        logging.getLogger().setLevel(logging.WARNING)
+        report = evaluate(samples)
+        for key, value in report.items():
+            print(f"{key:>24}: {value:.4f}" if isinstance(value, float) else f"{key:>24}: {value}")
+    else:
+        print(f"Unknown command: {cmd} (expected 'train' or 'eval')")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main(sys.argv)
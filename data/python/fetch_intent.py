@@ -0,0 +1,272 @@
+"""
+Local fetch-intent classifier for the EstateWise chatbot.
+
+Decides whether a chat message needs property data from the index, replacing
+the "Yes"/"No" Gemini round trip that used to open every turn. Decisions are
+made in three tiers:
+
+1. Keyword/regex rules for the obvious cases (greetings, listing searches).
+2. A small logistic-regression model over hashed word and character n-grams.
+3. An optional LLM fallback, only called when the model is not confident.
+
+Usage:
+    python fetch_intent.py train   # fit on fetch_intent_samples.jsonl, write fetch_intent_model.json
+    python fetch_intent.py eval    # 5-fold accuracy + per-decision latency report
+"""
+import json
+import logging
+import math
+import random
+import re
+import sys
+import time
+import zlib
+from collections import namedtuple
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+SAMPLES_PATH = BASE_DIR / "fetch_intent_samples.jsonl"
+MODEL_PATH = BASE_DIR / "fetch_intent_model.json"
+
+HASH_BUCKETS = 2 ** 14
+CONFIDENCE_THRESHOLD = 0.8
+
+FetchDecision = namedtuple("FetchDecision", ["fetch", "confidence", "source"])
+
+# Messages that never need property data.
+SKIP_PATTERNS = [
+    re.compile(r"^(hi|hello|hey|yo|howdy|good (morning|afternoon|evening))\b[\s!.,]*(there|again)?[\s!.]*$"),
+    re.compile(r"^(thanks|thank you|thx|ty|cheers|appreciate it)\b.{0,20}$"),
+    re.compile(r"^(bye|goodbye|see you|see ya|later)\b.{0,15}$"),
+    re.compile(r"^(ok|okay|cool|great|nice|got it|sounds good|perfect)[\s!.]*$"),
+    re.compile(r"^(who|what) are you\b|^what can you do\b|^how are you\b"),
+]
+
+# Messages that clearly ask about listings.
+FETCH_PATTERNS = [
+    re.compile(r"zillow\.com|\bzpid\b|\d{6,}_zpid"),
+    re.compile(r"\b\d+(\.\d+)?\s*(-\s*)?(bed(room)?s?|br|bd|bath(room)?s?|ba)\b"),
+    re.compile(r"\b(homes?|houses?|condos?|townhomes?|townhouses?|listings?|propert(y|ies)|apartments?)\b"
+               r".{0,40}\b(for sale|under|below|near|around|with|between)\b"),
+    re.compile(r"\b(under|below|less than|up to|max(imum)?)\s*\$?\s*\d[\d,.]*\s*(k|m|thousand|million)?\b"),
+    re.compile(r"\b(show|find|list|recommend|suggest|search)\b.{0,30}\b(homes?|houses?|condos?|townhomes?|"
+               r"listings?|propert(y|ies)|places?)\b"),
+    re.compile(r"^\s*\d+\s+[a-z0-9 .'-]+\s(st|street|rd|road|dr|drive|ave|avenue|ln|lane|ct|court|blvd|way|cir|pl)\b"),
+]
+
+_TOKEN_RE = re.compile(r"[a-z]+|\d+k?|\$")
+
+_model_cache = None
+
+
+def _tokens(text):
+    return [re.sub(r"\d", "0", tok) for tok in _TOKEN_RE.findall(text.lower())]
+
+
+def extract_features(text, buckets=HASH_BUCKETS):
+    """
+    Hash word unigrams/bigrams and in-word character trigrams into a sparse
+    {bucket: count} dict. crc32 keeps buckets stable across processes.
+    """
+    toks = _tokens(text)
+    grams = [f"w:{t}" for t in toks]
+    grams += [f"b:{a}_{b}" for a, b in zip(toks, toks[1:])]
+    for t in toks:
+        padded = f"^{t}$"
+        grams += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    feats = {}
+    for g in grams:
+        h = zlib.crc32(g.encode("utf-8")) % buckets
+        feats[h] = feats.get(h, 0.0) + 1.0
+    # L2-normalize so long messages do not dominate the logit.
+    norm = math.sqrt(sum(v * v for v in feats.values())) or 1.0
+    return {h: v / norm for h, v in feats.items()}
+
+
+def _sigmoid(z):
+    if z < -30:
+        return 0.0
+    if z > 30:
+        return 1.0
+    return 1.0 / (1.0 + math.exp(-z))
+
+
+def predict_proba(model, text):
+    """
+    Probability that the message needs property data.
+    """
+    weights = model["weights"]
+    z = model["bias"]
+    for h, v in extract_features(text, model["buckets"]).items():
+        z += weights.get(h, 0.0) * v
+    return _sigmoid(z)
+
+
+def train_model(samples, epochs=40, lr=0.5, l2=1e-4, seed=42, buckets=HASH_BUCKETS):
+    """
+    Fit a logistic-regression model with plain SGD on (text, label) pairs.
+    """
+    rng = random.Random(seed)
+    data = [(extract_features(text, buckets), label) for text, label in samples]
+    weights = {}
+    bias = 0.0
+    for _ in range(epochs):
+        rng.shuffle(data)
+        for feats, label in data:
+            z = bias + sum(weights.get(h, 0.0) * v for h, v in feats.items())
+            grad = _sigmoid(z) - label
+            bias -= lr * grad
+            for h, v in feats.items():
+                w = weights.get(h, 0.0)
+                weights[h] = w - lr * (grad * v + l2 * w)
+    weights = {h: w for h, w in weights.items() if abs(w) > 1e-6}
+    return {"buckets": buckets, "bias": bias, "weights": weights}
+
+
+def load_samples(path=SAMPLES_PATH):
+    samples = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                rec = json.loads(line)
+                samples.append((rec["text"], int(rec["label"])))
+    return samples
+
+
+def save_model(model, path=MODEL_PATH):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({**model, "weights": {str(h): w for h, w in model["weights"].items()}}, f)
+
+
+def load_model(path=MODEL_PATH):
+    """
+    Load the trained model, training in-memory from the labeled sample when no
+    model file has been written yet. The result is cached per process.
+    """
+    global _model_cache
+    if _model_cache is not None:
+        return _model_cache
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        raw["weights"] = {int(h): w for h, w in raw["weights"].items()}
+        _model_cache = raw
+    except FileNotFoundError:
+        _model_cache = train_model(load_samples())
+    return _model_cache
+
+
+def match_rules(text):
+    """
+    Return True/False when a rule settles the decision, otherwise None.
+    """
+    low = text.strip().lower()
+    if not low:
+        return False
+    if any(p.search(low) for p in SKIP_PATTERNS):
+        return False
+    if any(p.search(low) for p in FETCH_PATTERNS):
+        return True
+    return None
+
+
+def decide_fetch(message, llm_fallback=None, threshold=CONFIDENCE_THRESHOLD, model=None):
+    """
+    Decide whether to fetch property data for a message.
+
+    llm_fallback is an optional zero-argument callable returning a bool; it is
+    only invoked when the local model's confidence is below threshold. Without
+    it, low-confidence messages default to fetching, which keeps answers
+    grounded at the cost of one retrieval.
+    """
+    rule = match_rules(message)
+    if rule is not None:
+        return FetchDecision(rule, 1.0, "rule")
+
+    p = predict_proba(model or load_model(), message)
+    confidence = max(p, 1.0 - p)
+    if confidence >= threshold:
+        return FetchDecision(p >= 0.5, confidence, "model")
+
+    if llm_fallback is not None:
+        try:
+            return FetchDecision(bool(llm_fallback()), confidence, "llm")
+        except Exception as e:
+            logging.warning("LLM fetch decision failed, defaulting to fetch: %s", e)
+    return FetchDecision(True, confidence, "default")
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def evaluate(samples, folds=5, threshold=CONFIDENCE_THRESHOLD, seed=42):
+    """
+    k-fold evaluation of the rules + model stage. Low-confidence messages are
+    counted as LLM fallbacks and excluded from local accuracy.
+    """
+    rng = random.Random(seed)
+    shuffled = samples[:]
+    rng.shuffle(shuffled)
+    stats = {"total": 0, "local": 0, "local_correct": 0, "rule": 0, "rule_correct": 0,
+             "model_only_correct": 0, "fallback": 0}
+    latencies = []
+    for k in range(folds):
+        test = shuffled[k::folds]
+        train = [s for i, s in enumerate(shuffled) if i % folds != k]
+        model = train_model(train)
+        for text, label in test:
+            t0 = time.perf_counter()
+            decision = decide_fetch(text, threshold=threshold, model=model)
+            latencies.append((time.perf_counter() - t0) * 1e6)
+            stats["total"] += 1
+            if (predict_proba(model, text) >= 0.5) == bool(label):
+                stats["model_only_correct"] += 1
+            if decision.source == "default":
+                stats["fallback"] += 1
+                continue
+            stats["local"] += 1
+            stats["local_correct"] += int(decision.fetch == bool(label))
+            if decision.source == "rule":
+                stats["rule"] += 1
+                stats["rule_correct"] += int(decision.fetch == bool(label))
+
+    total = stats["total"] or 1
+    return {
+        "samples": stats["total"],
+        "local_rate": stats["local"] / total,
+        "local_accuracy": stats["local_correct"] / (stats["local"] or 1),
+        "rule_rate": stats["rule"] / total,
+        "rule_accuracy": stats["rule_correct"] / (stats["rule"] or 1),
+        "model_only_accuracy": stats["model_only_correct"] / total,
+        "llm_fallback_rate": stats["fallback"] / total,
+        "latency_us_p50": _percentile(latencies, 50),
+        "latency_us_p95": _percentile(latencies, 95),
+        "latency_us_max": max(latencies) if latencies else 0.0,
+    }
+
+
+def main(argv):
+    cmd = argv[1] if len(argv) > 1 else "eval"
+    samples = load_samples()
+    if cmd == "train":
+        model = train_model(samples)
+        save_model(model)
+        logging.info("Trained on %d samples, wrote %s (%d weights).", len(samples), MODEL_PATH, len(model["weights"]))
+    elif cmd == "eval":
+        report = evaluate(samples)
+        for key, value in report.items():
+            print(f"{key:>22}: {value:.4f}" if isinstance(value, float) else f"{key:>22}: {value}")
+    else:
+        print(f"Unknown command: {cmd} (expected 'train' or 'eval')")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main(sys.argv)
@@ -0,0 +1,218 @@
+"""
+Memory-compact dtypes for the notebook's cleaned property frame.
+
+compact_frame() applies SCHEMA to the columns it knows (and a cardinality /
+range-based rule to any others):
+
+- low-cardinality text (city, state, zipcode, homeType, listingDataSource)
+  becomes categorical: one small integer code per row plus one copy of each
+  distinct string;
+- bounded numbers are downcast (bedrooms int8, yearBuilt int16, coordinates
+  and areas float32); price and zpid stay 64-bit so sums and products do not
+  overflow or lose dollars;
+- long free text (description, street) becomes Arrow-backed strings when
+  pyarrow is installed and arrow_strings=True, otherwise repeated values are
+  interned so duplicate descriptions share one object.
+
+memory_report() compares per-column bytes before and after. Object columns
+are measured by distinct objects (pandas' deep memory_usage counts a shared
+string once per row, which hides the effect of interning).
+
+    python frame_schema.py --rows 500000     # synthetic frame, before/after report
+"""
+import sys
+import logging
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# Known columns of the cleaned frame (notebook section 4) -> target dtype.
+SCHEMA = {
+    "zpid": "int64",
+    "bedrooms": "int8",
+    "bathrooms": "float32",
+    "price": "float64",
+    "yearBuilt": "int16",
+    "livingArea": "float32",
+    "latitude": "float32",
+    "longitude": "float32",
+    "pricePerSqft": "float32",
+    "age": "float32",
+    "sizeBucket": "int8",
+    "cityPricePercentile": "float32",
+    "city": "category",
+    "state": "category",
+    "zipcode": "category",
+    "homeType": "category",
+    "listingDataSource": "category",
+    "street": "text",
+    "description": "text",
+}
+# Unknown text columns with at most this share of distinct values become categorical.
+CATEGORY_MAX_RATIO = 0.5
+
+
+def _is_text(s):
+    return pd.api.types.is_object_dtype(s.dtype) or pd.api.types.is_string_dtype(s.dtype)
+
+
+def _arrow_string_dtype():
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return None
+    return pd.ArrowDtype(pa.string())
+
+
+def intern_values(s):
+    """
+    Object Series whose equal values are the same object.
+    """
+    seen = {}
+    values = [v if v is None or v != v else seen.setdefault(v, v) for v in s.tolist()]
+    return pd.Series(np.array(values, dtype=object), index=s.index, name=s.name, dtype=object)
+
+
+def _downcast(s):
+    """
+    Smallest signed int that holds an all-integral column, else float32 when
+    that keeps ~7 significant digits of every value.
+    """
+    values = s.to_numpy(dtype=np.float64, na_value=np.nan)
+    finite = values[np.isfinite(values)]
+    if len(finite) == len(values) and np.array_equal(finite, np.round(finite)):
+        return pd.to_numeric(s, downcast="integer")
+    if len(finite) and np.allclose(finite.astype(np.float32), finite, rtol=1e-6, atol=0):
+        return s.astype("float32")
+    return s
+
+
+def compact_frame(df, schema=None, arrow_strings=True, intern=True):
+    """
+    Copy of df with compact dtypes. Integer targets are only used when the
+    column has no NaNs and every value fits; otherwise the column is left as is.
+    """
+    schema = {**SCHEMA, **(schema or {})}
+    arrow = _arrow_string_dtype() if arrow_strings else None
+    if arrow_strings and arrow is None:
+        logging.info("pyarrow not installed; interning text columns instead of Arrow strings.")
+    out = {}
+    for name in df.columns:
+        s = df[name]
+        target = schema.get(name)
+        if target is None:
+            if _is_text(s):
+                ratio = s.nunique(dropna=False) / max(len(s), 1)
+                target = "category" if ratio <= CATEGORY_MAX_RATIO else "text"
+            elif pd.api.types.is_numeric_dtype(s.dtype) and not pd.api.types.is_bool_dtype(s.dtype):
+                out[name] = _downcast(s)
+                continue
+        if target == "category":
+            out[name] = s.astype("category")
+        elif target == "text":
+            if arrow is not None:
+                out[name] = s.astype(arrow)
+            elif intern and _is_text(s):
+                out[name] = intern_values(s)
+            else:
+                out[name] = s
+        elif target and target.startswith("int"):
+            info = np.iinfo(target)
+            ok = s.notna().all() and (s.min() >= info.min) and (s.max() <= info.max) if len(s) else True
+            if ok and pd.api.types.is_numeric_dtype(s.dtype):
+                values = s.to_numpy()
+                if not np.issubdtype(values.dtype, np.integer) and not np.array_equal(values, np.round(values)):
+                    ok = False
+            out[name] = s.astype(target) if ok else s
+            if not ok:
+                logging.warning("Column %s does not fit %s; left as %s.", name, target, s.dtype)
+        elif target:
+            out[name] = s.astype(target)
+        else:
+            out[name] = s
+    return pd.DataFrame(out, index=df.index)
+
+
+# -- memory report ---------------------------------------------------------------
+
+
+def column_bytes(s):
+    """
+    Bytes held by a column. Object columns count each distinct object once
+    plus one pointer per row.
+    """
+    if pd.api.types.is_object_dtype(s.dtype):
+        seen, total = set(), 0
+        for v in s.to_numpy():
+            if id(v) not in seen:
+                seen.add(id(v))
+                total += sys.getsizeof(v)
+        return total + 8 * len(s)
+    return int(s.memory_usage(index=False, deep=True))
+
+
+def memory_report(before, after):
+    """
+    Per-column dtype and MB before/after, with a TOTAL row.
+    """
+    rows = []
+    for name in before.columns:
+        b = column_bytes(before[name])
+        a = column_bytes(after[name]) if name in after.columns else 0
+        rows.append({"column": name, "dtype_before": str(before[name].dtype),
+                     "dtype_after": str(after[name].dtype) if name in after.columns else "-",
+                     "mb_before": b / 1e6, "mb_after": a / 1e6})
+    report = pd.DataFrame(rows)
+    total = {"column": "TOTAL", "dtype_before": "", "dtype_after": "",
+             "mb_before": report["mb_before"].sum(), "mb_after": report["mb_after"].sum()}
+    report = pd.concat([report, pd.DataFrame([total])], ignore_index=True)
+    report["saved_pct"] = 100 * (1 - report["mb_after"] / report["mb_before"].where(report["mb_before"] > 0))
+    return report.round({"mb_before": 2, "mb_after": 2, "saved_pct": 1})
+
+
+def _fresh(values):
+    # A distinct string object per row, as JSON parsing produces.
+    return np.array([v.encode().decode() for v in values], dtype=object)
+
+
+def synthetic_frame(n, seed=0):
+    """
+    A cleaned-frame lookalike: repeated cities/types, a pool of descriptions.
+    """
+    rng = np.random.default_rng(seed)
+    cities = np.array(["Chapel Hill", "Durham", "Raleigh", "Cary", "Charlotte", "Greensboro", "Apex"], dtype=object)
+    descriptions = np.array([f"Lovely home number {i}. " * 20 for i in range(max(1, n // 3))], dtype=object)
+    beds = rng.integers(1, 7, n)
+    return pd.DataFrame({
+        "zpid": np.arange(n, dtype=np.int64) + 10_000_000,
+        "street": np.array([f"{i % 9999 + 1} Main St" for i in range(n)], dtype=object),
+        "city": _fresh(rng.choice(cities, n)),
+        "state": _fresh(["NC"] * n),
+        "zipcode": _fresh(rng.choice(np.array([str(z) for z in range(27500, 27700)], dtype=object), n)),
+        "bedrooms": beds.astype(np.float64),
+        "bathrooms": rng.choice([1.0, 1.5, 2.0, 2.5, 3.0], n),
+        "price": rng.integers(90, 2000, n) * 1000.0,
+        "yearBuilt": rng.integers(1900, 2026, n).astype(np.float64),
+        "livingArea": rng.integers(500, 5000, n).astype(np.float64),
+        "latitude": 35.9 + rng.random(n) / 10,
+        "longitude": -79.0 - rng.random(n) / 10,
+        "homeType": _fresh(rng.choice(np.array(["SINGLE_FAMILY", "CONDO", "TOWNHOUSE"], dtype=object), n)),
+        "listingDataSource": _fresh(["Phoenix"] * n),
+        "description": _fresh(rng.choice(descriptions, n)),
+    })
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Compact dtypes for the cleaned property frame.")
+    parser.add_argument("--rows", type=int, default=200_000, help="synthetic frame size")
+    parser.add_argument("--no-arrow", action="store_true", help="intern text instead of Arrow strings")
+    args = parser.parse_args()
+    try:
+        frame = synthetic_frame(args.rows)
+        compact = compact_frame(frame, arrow_strings=not args.no_arrow)
+        print(memory_report(frame, compact).to_string(index=False))
+    except Exception as err:
+        logging.error("Frame schema report failed: %s", err)
+        sys.exit(1)
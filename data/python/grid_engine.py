@@ -0,0 +1,258 @@
+"""
+Vectorized multi-resolution grid aggregation for the notebook's map layers.
+
+GridPyramid bins every listing once: integer cell indices at the finest
+cell size, np.unique over the occupied cells, then one np.bincount per
+metric for sums and non-NaN counts. Each coarser level (cell size doubled)
+is aggregated from the level below by halving the cell indices, so it costs
+time proportional to the occupied cells, not the listings. Means, percentile
+ranks, composite scores and heatmap points all come from these arrays; no
+pandas groupby or per-row loop is involved.
+
+    pyramid = GridPyramid(df["latitude"], df["longitude"],
+                          {"price": df["price"], "livingArea": df["livingArea"]})
+    level = pyramid.level_for_size(0.005)       # ~500 m cells
+    level.mean("price"), level.centers(), level.heat_points("price")
+
+    python grid_engine.py --rows 500000          # timing vs the pd.cut + groupby path
+"""
+import time
+import argparse
+
+import numpy as np
+
+BASE_SIZE = 0.00125   # degrees, ~125 m
+LEVELS = 6            # 0.00125 ... 0.04 degrees
+# Above this many occupied cells a level is too dense to draw one marker per cell.
+MAX_MARKER_CELLS = 2000
+
+
+def percentile_rank(values):
+    """
+    Average-tie percentile rank in (0, 1] of each value, NaN kept as NaN
+    (pandas' rank(pct=True, method="average")).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(len(values), np.nan)
+    valid = np.flatnonzero(~np.isnan(values))
+    if not len(valid):
+        return out
+    v = values[valid]
+    order = np.argsort(v, kind="mergesort")
+    _, inverse, counts = np.unique(v[order], return_inverse=True, return_counts=True)
+    ends = np.cumsum(counts)
+    avg_rank = (ends - counts + 1 + ends) / 2.0
+    ranks = np.empty(len(v))
+    ranks[order] = avg_rank[inverse]
+    out[valid] = ranks / len(v)
+    return out
+
+
+class GridLevel:
+    """
+    Occupied cells of one resolution: cell indices (iy, ix) from the grid
+    origin, listing counts, and per-metric sums / non-NaN counts.
+    """
+
+    def __init__(self, size, origin, iy, ix, count, sums, counts):
+        self.size = size
+        self.origin = origin
+        self.iy = iy
+        self.ix = ix
+        self.count = count
+        self.sums = sums
+        self.counts = counts
+
+    def __len__(self):
+        return len(self.count)
+
+    def mean(self, metric):
+        n = self.counts[metric]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(n > 0, self.sums[metric] / np.maximum(n, 1), np.nan)
+
+    def corners(self):
+        """
+        (lat, lon) of each cell's south-west corner.
+        """
+        return self.origin[0] + self.iy * self.size, self.origin[1] + self.ix * self.size
+
+    def centers(self):
+        lat, lon = self.corners()
+        return lat + self.size / 2, lon + self.size / 2
+
+    def composite_score(self, metrics, min_count=3):
+        """
+        Mean percentile rank of the metrics' cell means x 100, over cells with
+        at least min_count listings (NaN elsewhere).
+        """
+        keep = self.count >= min_count
+        total = np.zeros(len(self))
+        used = np.zeros(len(self))
+        for metric in metrics:
+            rank = percentile_rank(np.where(keep, self.mean(metric), np.nan))
+            valid = ~np.isnan(rank)
+            total[valid] += rank[valid]
+            used += valid
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(keep & (used > 0), total / used * 100, np.nan)
+
+    def heat_points(self, metric=None):
+        """
+        [[lat, lon, weight], ...] per cell for folium's HeatMap. The weight is
+        the cell's metric sum (or listing count) scaled to [0, 1], since
+        leaflet.heat clips weights above its max of 1.
+        """
+        lat, lon = self.centers()
+        weight = self.count.astype(np.float64) if metric is None else self.sums[metric]
+        top = weight.max() if len(weight) else 0
+        weight = weight / top if top > 0 else weight
+        keep = weight > 0
+        return np.column_stack([lat[keep], lon[keep], weight[keep]]).tolist()
+
+    def frame(self, metrics=None):
+        """
+        DataFrame with lat_bin / lon_bin corners, count and metric means.
+        """
+        import pandas as pd
+
+        lat, lon = self.corners()
+        data = {"lat_bin": lat, "lon_bin": lon, "count": self.count}
+        for metric in metrics or self.sums:
+            data[metric] = self.mean(metric)
+        return pd.DataFrame(data)
+
+
+class GridPyramid:
+    """
+    Listing metrics aggregated at `levels` resolutions, base_size * 2**k degrees.
+    """
+
+    def __init__(self, lat, lon, metrics, base_size=BASE_SIZE, levels=LEVELS):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        ok = np.isfinite(lat) & np.isfinite(lon) & ~((lat == 0) & (lon == 0))
+        lat, lon = lat[ok], lon[ok]
+        metrics = {k: np.asarray(v, dtype=np.float64)[ok] for k, v in metrics.items()}
+        # Origin on a multiple of the coarsest cell, so every level nests exactly.
+        coarse = base_size * 2 ** (levels - 1)
+        self.origin = (np.floor(lat.min() / coarse) * coarse if len(lat) else 0.0,
+                       np.floor(lon.min() / coarse) * coarse if len(lon) else 0.0)
+        self.base_size = base_size
+        self.metric_names = list(metrics)
+
+        iy = ((lat - self.origin[0]) / base_size).astype(np.int64)
+        ix = ((lon - self.origin[1]) / base_size).astype(np.int64)
+        self.levels = [self._aggregate(base_size, iy, ix, np.ones(len(iy)), metrics, from_points=True)]
+        for k in range(1, levels):
+            prev = self.levels[-1]
+            self.levels.append(self._aggregate(base_size * 2 ** k, prev.iy // 2, prev.ix // 2, prev.count,
+                                               (prev.sums, prev.counts)))
+
+    def _aggregate(self, size, iy, ix, weights, metrics, from_points=False):
+        width = int(ix.max()) + 1 if len(ix) else 1
+        key = iy * width + ix
+        cells, inverse = np.unique(key, return_inverse=True)
+        n = len(cells)
+        count = np.bincount(inverse, weights=weights, minlength=n).astype(np.int64)
+        sums, counts = {}, {}
+        if from_points:
+            for name, values in metrics.items():
+                valid = ~np.isnan(values)
+                sums[name] = np.bincount(inverse[valid], weights=values[valid], minlength=n)
+                counts[name] = np.bincount(inverse[valid], minlength=n)
+        else:
+            prev_sums, prev_counts = metrics
+            for name in prev_sums:
+                sums[name] = np.bincount(inverse, weights=prev_sums[name], minlength=n)
+                counts[name] = np.bincount(inverse, weights=prev_counts[name], minlength=n).astype(np.int64)
+        return GridLevel(size, self.origin, cells // width, cells % width, count, sums, counts)
+
+    def level_for_size(self, size):
+        """
+        The level whose cell size is closest to `size` degrees.
+        """
+        return min(self.levels, key=lambda lvl: abs(np.log(lvl.size / size)))
+
+    def level_for_zoom(self, zoom, cell_px=24):
+        """
+        The finest level whose cells are at least cell_px pixels wide at a
+        web-map zoom level (256 px tiles).
+        """
+        deg_per_px = 360.0 / (256 * 2 ** zoom)
+        for lvl in self.levels:
+            if lvl.size / deg_per_px >= cell_px:
+                return lvl
+        return self.levels[-1]
+
+    def markers_level(self, size, max_cells=MAX_MARKER_CELLS):
+        """
+        The level closest to `size`, coarsened until it has at most max_cells cells.
+        """
+        start = self.levels.index(self.level_for_size(size))
+        for lvl in self.levels[start:]:
+            if len(lvl) <= max_cells:
+                return lvl
+        return self.levels[-1]
+
+
+def _legacy_grid(df, grid_size):
+    """
+    The notebook's previous 8.37-8.38: pd.cut bins + groupby.
+    """
+    import pandas as pd
+
+    lat_bins = np.arange(df["latitude"].min(), df["latitude"].max() + grid_size, grid_size)
+    lon_bins = np.arange(df["longitude"].min(), df["longitude"].max() + grid_size, grid_size)
+    df = df.assign(
+        lat_bin=pd.cut(df["latitude"], bins=lat_bins, include_lowest=True, labels=lat_bins[:-1]),
+        lon_bin=pd.cut(df["longitude"], bins=lon_bins, include_lowest=True, labels=lon_bins[:-1]),
+    )
+    return (df.dropna(subset=["lat_bin", "lon_bin"])
+            .groupby(["lat_bin", "lon_bin"], observed=False)
+            .agg(count=("price", "count"), avg_psf=("price_per_sqft", "mean"),
+                 avg_area=("livingArea", "mean"), avg_beds=("bedrooms", "mean"))
+            .reset_index())
+
+
+def main():
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Grid pyramid timing vs pd.cut + groupby.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 500_000])
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    for n in args.rows:
+        df = pd.DataFrame({
+            "latitude": 35.9 + rng.normal(0, 0.15, n), "longitude": -79.0 + rng.normal(0, 0.2, n),
+            "price": rng.lognormal(np.log(400_000), 0.5, n), "livingArea": rng.uniform(600, 4000, n),
+            "bedrooms": rng.integers(1, 7, n).astype(float),
+        })
+        df["price_per_sqft"] = df["price"] / df["livingArea"]
+        # Old path: 3 per-listing heat layers, then the pd.cut grid, filter and ranks.
+        t0 = time.perf_counter()
+        old_points = 0
+        for metric in ("price", "livingArea", "price_per_sqft"):
+            old_points += len(df[["latitude", "longitude", metric]].dropna().values.tolist())
+        grid = _legacy_grid(df, 0.005)
+        grid = grid[grid["count"] >= 3].copy()
+        for col in ("avg_psf", "avg_area", "avg_beds"):
+            grid[col + "_pct"] = grid[col].rank(pct=True)
+        old_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        pyramid = GridPyramid(df["latitude"], df["longitude"],
+                              {m: df[m] for m in ("price", "livingArea", "bedrooms", "price_per_sqft")})
+        new_points = 0
+        for metric in ("price", "livingArea", "price_per_sqft"):
+            new_points += len(pyramid.levels[0].heat_points(metric))
+        lvl = pyramid.level_for_size(0.005)
+        lvl.composite_score(["price_per_sqft", "livingArea", "bedrooms"])
+        new_s = time.perf_counter() - t0
+        print(f"{n:>9,} listings | old: {old_s:6.3f}s, {old_points:>9,} heat points, {len(grid):,} scored cells "
+              f"| pyramid ({len(pyramid.levels)} levels): {new_s:6.3f}s, {new_points:>9,} heat points, "
+              f"{int((lvl.count >= 3).sum()):,} scored cells")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Throughput metrics for the ingest jobs (upsert_properties.py).
+
+Counts records seen / upserted / skipped (by reason) / failed (by stage),
+keeps latency histograms for embedding calls and upserts plus upserted
+bytes, and every summary_interval seconds logs one progress line and,
+optionally, rewrites a Prometheus textfile (node_exporter textfile
+collector format). Per-record logging goes through should_log(), which lets
+through one record in log_every so the hot path stays quiet at millions of
+rows.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTES_BUCKETS = (16e3, 64e3, 256e3, 512e3, 1e6, 2e6, 4e6, 8e6)
+
+
+def vector_bytes(vector):
+    """
+    Size of one upsert vector as compact JSON, close to its share of the request body.
+    """
+    return len(json.dumps(vector, separators=(",", ":")))
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram (Prometheus-style cumulative "le" buckets on export).
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding the q-quantile (inf past the last bucket).
+        """
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def cumulative(self):
+        out, seen = [], 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            out.append((bound, seen))
+        return out
+
+
+class IngestMetrics:
+    """
+    Thread-safe counters and histograms for one ingest run.
+    """
+
+    def __init__(self, job="upsert_properties", summary_interval=30.0, textfile=None, log_every=10000):
+        self.job = job
+        self.summary_interval = summary_interval
+        self.textfile = textfile
+        self.log_every = max(1, int(log_every))
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.seen = 0
+        self.upserted = 0
+        self.batches = 0
+        self.upsert_bytes = 0
+        self.skipped = {}
+        self.errors = {}
+        self.events = {}
+        self.embedding_seconds = Histogram(LATENCY_BUCKETS)
+        self.upsert_seconds = Histogram(LATENCY_BUCKETS)
+        self.batch_bytes = Histogram(BYTES_BUCKETS)
+        self._last_report = self.started
+        self._last_seen = 0
+
+    # -- recording ----------------------------------------------------------
+
+    def record_seen(self):
+        with self.lock:
+            self.seen += 1
+            return self.seen
+
+    def should_log(self, n=None):
+        """
+        True for one record in log_every (the first, then every log_every-th).
+        """
+        n = self.seen if n is None else n
+        return n % self.log_every == 1 or self.log_every == 1
+
+    def skip(self, reason):
+        with self.lock:
+            self.skipped[reason] = self.skipped.get(reason, 0) + 1
+
+    def error(self, stage):
+        with self.lock:
+            self.errors[stage] = self.errors.get(stage, 0) + 1
+
+    def event(self, name, n=1):
+        """
+        Count an upsert-path event (retry, split, dead_letter).
+        """
+        with self.lock:
+            self.events[name] = self.events.get(name, 0) + n
+
+    def observe_embedding(self, seconds):
+        with self.lock:
+            self.embedding_seconds.observe(seconds)
+
+    def observe_upsert(self, seconds, vectors, nbytes):
+        with self.lock:
+            self.upsert_seconds.observe(seconds)
+            self.batch_bytes.observe(nbytes)
+            self.upserted += vectors
+            self.upsert_bytes += nbytes
+            self.batches += 1
+
+    # -- reporting ----------------------------------------------------------
+
+    def maybe_report(self):
+        """
+        Log a summary line (and refresh the textfile) once per summary_interval.
+        Cheap enough to call after every record.
+        """
+        now = time.time()
+        if now - self._last_report < self.summary_interval:
+            return
+        self.report(now)
+
+    def report(self, now=None, final=False):
+        now = now or time.time()
+        with self.lock:
+            elapsed = max(now - self.started, 1e-9)
+            window = max(now - self._last_report, 1e-9)
+            recent_rate = (self.seen - self._last_seen) / window
+            self._last_report, self._last_seen = now, self.seen
+            line = (
+                f"{'final' if final else 'progress'}: seen={self.seen:,} upserted={self.upserted:,} "
+                f"rate={self.seen / elapsed:,.1f}/s (last {window:.0f}s: {recent_rate:,.1f}/s) "
+                f"skipped={sum(self.skipped.values()):,} {self._fmt(self.skipped)} "
+                f"errors={sum(self.errors.values()):,} {self._fmt(self.errors)} "
+                f"{'upsert ' + self._fmt(self.events) + ' ' if self.events else ''}"
+                f"embed p50/p95<={self.embedding_seconds.quantile(0.5) * 1000:.0f}/"
+                f"{self.embedding_seconds.quantile(0.95) * 1000:.0f}ms "
+                f"upsert p50/p95<={self.upsert_seconds.quantile(0.5) * 1000:.0f}/"
+                f"{self.upsert_seconds.quantile(0.95) * 1000:.0f}ms "
+                f"bytes={self.upsert_bytes / 1e6:,.1f}MB in {self.batches:,} batches"
+            )
+            text = self.prometheus_text() if self.textfile else None
+        logging.info("[%s] %s", self.job, line)
+        if text is not None:
+            self._write_textfile(text)
+        return line
+
+    @staticmethod
+    def _fmt(counts):
+        return "{" + ", ".join(f"{k}={v:,}" for k, v in sorted(counts.items())) + "}" if counts else ""
+
+    def prometheus_text(self):
+        """
+        Metrics in Prometheus text exposition format. Call with the lock held
+        or after the run has finished.
+        """
+        job = self.job
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_str = ",".join(f'{k}="{v}"' for k, v in [("job", job)] + labels)
+                lines.append(f"{name}{{{label_str}}} {value}")
+
+        def histogram(name, help_text, hist):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for bound, n in hist.cumulative():
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f'{name}_bucket{{job="{job}",le="{le}"}} {n}')
+            lines.append(f'{name}_sum{{job="{job}"}} {hist.sum}')
+            lines.append(f'{name}_count{{job="{job}"}} {hist.count}')
+
+        metric("estatewise_ingest_records_seen_total", "counter", "Records read from the input files.",
+               [([], self.seen)])
+        metric("estatewise_ingest_records_upserted_total", "counter", "Vectors upserted to Pinecone.",
+               [([], self.upserted)])
+        metric("estatewise_ingest_records_skipped_total", "counter", "Records skipped, by reason.",
+               [([("reason", r)], n) for r, n in sorted(self.skipped.items())] or [([("reason", "none")], 0)])
+        metric("estatewise_ingest_errors_total", "counter", "Errors, by stage.",
+               [([("stage", s)], n) for s, n in sorted(self.errors.items())] or [([("stage", "none")], 0)])
+        metric("estatewise_ingest_upsert_events_total", "counter", "Upsert retries, batch splits and dead-lettered vectors.",
+               [([("event", e)], n) for e, n in sorted(self.events.items())] or [([("event", "none")], 0)])
+        metric("estatewise_ingest_upsert_bytes_total", "counter", "Approximate request bytes upserted.",
+               [([], self.upsert_bytes)])
+        metric("estatewise_ingest_start_time_seconds", "gauge", "Unix time the run started.",
+               [([], self.started)])
+        histogram("estatewise_ingest_embedding_seconds", "Embedding call latency.", self.embedding_seconds)
+        histogram("estatewise_ingest_upsert_seconds", "Pinecone upsert latency per batch.", self.upsert_seconds)
+        histogram("estatewise_ingest_upsert_batch_bytes", "Approximate request bytes per upsert batch.",
+                  self.batch_bytes)
+        return "\n".join(lines) + "\n"
+
+    def _write_textfile(self, text):
+        # Write-then-rename so the collector never reads a half-written file.
+        tmp = f"{self.textfile}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, self.textfile)
+        except OSError as e:
+            logging.warning("Could not write metrics textfile %s: %s", self.textfile, e)
@@ -0,0 +1,450 @@
+"""
+Pre-clustered GeoJSON tiles for listing maps.
+
+Notebook section 8.6 used to add every listing as its own folium marker, so
+the map's HTML grew with the dataset. build_tiles() decimates the listings
+once per zoom level instead: listings are projected to Web Mercator pixels,
+bucketed into CELL_PX x CELL_PX pixel cells, and each occupied cell becomes
+one feature, either the listing itself (cell of one) or a cluster with its
+count, mean price and a representative listing (the one nearest the cell's
+centroid). Features are grouped into the standard 256 px z/x/y tiles, so a
+tile holds at most (256 / CELL_PX) ** 2 features whatever the listing count.
+
+Coordinates are quantized like vector tiles: integer [x, y] offsets inside
+the tile on a 0..EXTENT grid (dequantize() maps them back to lon/lat), which
+keeps each point to a few bytes of JSON.
+
+ListingTiles is a folium layer (a Leaflet GridLayer) that creates markers
+only for the tiles in view and drops them when tiles leave the view. Tiles
+are either fetched from a directory written by write_tiles() or embedded in
+the page; inline_tiles() builds a set slim enough to embed in a notebook.
+
+    python map_tiles.py build --out listing_tiles       # from the property store
+    python map_tiles.py bench --rows 10000 100000 1000000
+"""
+import os
+import sys
+import json
+import math
+import time
+import logging
+import argparse
+import tempfile
+
+import numpy as np
+
+TILE_PX = 256
+CELL_PX = 32          # clustering cell; 64 features per tile at most
+EXTENT = 4096         # quantization grid per tile side
+MIN_ZOOM = 8
+MAX_ZOOM = 16
+# Listing fields kept on single points and representatives.
+PROPERTY_FIELDS = ("zpid", "price", "bedrooms", "bathrooms", "livingArea", "yearBuilt", "street", "city", "cluster")
+# The subset kept below detail_zoom, where every listing would otherwise be
+# repeated with all its fields once per zoom level.
+SLIM_FIELDS = ("price", "bedrooms", "bathrooms", "cluster")
+# Leaflet only renders Mercator latitudes inside this range.
+MAX_LAT = 85.05112878
+# Above this many bytes of tiles, embedding them makes the page too heavy;
+# write them to a directory and load them by URL instead.
+INLINE_MAX_BYTES = 20_000_000
+
+
+def mercator(lat, lon):
+    """
+    Normalized Web Mercator (u, v) in [0, 1); multiply by TILE_PX * 2**z for pixels.
+    """
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -MAX_LAT, MAX_LAT)
+    lon = np.asarray(lon, dtype=np.float64)
+    u = (lon + 180.0) / 360.0
+    s = np.sin(np.radians(lat))
+    v = 0.5 - np.log((1 + s) / (1 - s)) / (4 * np.pi)
+    return np.clip(u, 0, 1 - 1e-12), np.clip(v, 0, 1 - 1e-12)
+
+
+def dequantize(tile, qx, qy):
+    """
+    lon, lat of a quantized point in tile (z, x, y).
+    """
+    z, x, y = tile
+    scale = 2 ** z
+    u = (x + qx / EXTENT) / scale
+    v = (y + qy / EXTENT) / scale
+    lon = u * 360.0 - 180.0
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * v))))
+    return lon, lat
+
+
+def _json_value(value):
+    if value is None:
+        return None
+    if isinstance(value, (np.integer,)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        if value != value:
+            return None
+        return int(value) if float(value).is_integer() else round(float(value), 2)
+    return value
+
+
+_FEATURE = '{"type":"Feature","geometry":{"type":"Point","coordinates":[%d,%d]},"properties":%s}'
+_COLLECTION = '{"type":"FeatureCollection","features":[%s]}'
+
+
+def _props(columns, i, fields=None):
+    out = {}
+    for name, values in columns.items():
+        if fields is not None and name not in fields:
+            continue
+        value = _json_value(values[i])
+        if value is not None:
+            out[name] = value
+    return out
+
+
+def build_tiles(lat, lon, properties=None, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM, cell_px=CELL_PX,
+                detail_zoom=None, slim_fields=SLIM_FIELDS, coarse_cell_px=None):
+    """
+    {(z, x, y): GeoJSON FeatureCollection text} for every occupied tile from
+    min_zoom to max_zoom. `properties` maps field names to per-listing arrays.
+    Zooms below detail_zoom keep only slim_fields on their features and
+    cluster with coarse_cell_px cells (default cell_px), which keeps embedded
+    tile sets small; by default every zoom keeps all fields.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    ok = np.isfinite(lat) & np.isfinite(lon) & ~((lat == 0) & (lon == 0))
+    rows = np.flatnonzero(ok)
+    columns = {k: np.asarray(v, dtype=object if np.asarray(v).dtype.kind in "OUS" else None)[rows]
+               for k, v in (properties or {}).items()}
+    price = columns.get("price")
+    price = np.asarray(price, dtype=np.float64) if price is not None else None
+    u, v = mercator(lat[rows], lon[rows])
+    tiles = {}
+    prop_json = {}
+
+    def _cached_props(row, slim):
+        # Each listing's properties are encoded once per field set, however many zooms show it.
+        key = (row, slim)
+        if key not in prop_json:
+            prop_json[key] = json.dumps(_props(columns, row, slim_fields if slim else None), separators=(",", ":"))
+        return prop_json[key]
+
+    for z in range(min_zoom, max_zoom + 1):
+        slim = detail_zoom is not None and z < detail_zoom
+        zoom_cell_px = (coarse_cell_px or cell_px) if slim else cell_px
+        per_tile = TILE_PX // zoom_cell_px
+        cells_per_side = (TILE_PX * 2 ** z) // zoom_cell_px
+        cx = (u * cells_per_side).astype(np.int64)
+        cy = (v * cells_per_side).astype(np.int64)
+        keys, inverse, counts = np.unique(cx * cells_per_side + cy, return_inverse=True, return_counts=True)
+        n = len(keys)
+        cu = np.bincount(inverse, weights=u, minlength=n) / counts
+        cv = np.bincount(inverse, weights=v, minlength=n) / counts
+        # Representative: the member nearest its cell's centroid.
+        dist = (u - cu[inverse]) ** 2 + (v - cv[inverse]) ** 2
+        order = np.lexsort((dist, inverse))
+        first = np.r_[0, np.flatnonzero(np.diff(inverse[order])) + 1]
+        rep = order[first]
+        if price is not None:
+            valid = ~np.isnan(price)
+            priced = np.bincount(inverse[valid], minlength=n)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean_price = np.bincount(inverse[valid], weights=price[valid], minlength=n) / priced
+        # Singletons sit at the listing itself, clusters at their centroid.
+        pu = np.where(counts == 1, u[rep], cu)
+        pv = np.where(counts == 1, v[rep], cv)
+        tx = keys // cells_per_side // per_tile
+        ty = keys % cells_per_side // per_tile
+        qx = np.round((pu * 2 ** z - tx) * EXTENT).astype(np.int64)
+        qy = np.round((pv * 2 ** z - ty) * EXTENT).astype(np.int64)
+        tile_keys = tx * (2 ** z) + ty
+        order = np.argsort(tile_keys, kind="stable")
+        bounds = np.r_[0, np.flatnonzero(np.diff(tile_keys[order])) + 1, n]
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            features = []
+            for i in order[start:end]:
+                props = _cached_props(rep[i], slim)
+                if counts[i] > 1:
+                    extra = f',"avgPrice":{int(round(mean_price[i]))}' if price is not None and priced[i] else ""
+                    props = f'{{"count":{counts[i]}{extra},"rep":{props}}}'
+                features.append(_FEATURE % (qx[i], qy[i], props))
+            i = order[start]
+            tiles[(z, int(tx[i]), int(ty[i]))] = _COLLECTION % ",".join(features)
+    return tiles
+
+
+def tiles_from_frame(df, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM, fields=PROPERTY_FIELDS, detail_zoom=None,
+                     coarse_cell_px=None):
+    """
+    build_tiles() over a listings DataFrame, keeping the fields it has.
+    """
+    props = {f: df[f].to_numpy() for f in fields if f in df.columns}
+    return build_tiles(df["latitude"].to_numpy(), df["longitude"].to_numpy(), props, min_zoom, max_zoom,
+                       detail_zoom=detail_zoom, coarse_cell_px=coarse_cell_px)
+
+
+def inline_tiles(df, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM, max_bytes=INLINE_MAX_BYTES):
+    """
+    Tiles small enough to embed in a page shown inline (a notebook output
+    cell cannot fetch tile files): full listings only at the top zoom,
+    slim 64 px clusters below it. While the set is over max_bytes the top
+    zoom is lowered; Leaflet scales the last native zoom further in.
+    Returns (tiles, max_zoom, bytes).
+    """
+    for top in range(max_zoom, min_zoom - 1, -1):
+        tiles = tiles_from_frame(df, min_zoom, top, detail_zoom=top, coarse_cell_px=2 * CELL_PX)
+        size = sum(len(t) for t in tiles.values())
+        if size <= max_bytes or top == min_zoom:
+            return tiles, top, size
+
+
+def write_tiles(tiles, out_dir):
+    """
+    out_dir/{z}/{x}/{y}.json plus out_dir/meta.json; returns total bytes written.
+    """
+    total = 0
+    for (z, x, y), tile in tiles.items():
+        path = os.path.join(out_dir, str(z), str(x), f"{y}.json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf8") as f:
+            f.write(tile)
+        total += len(tile)
+    zooms = sorted({z for z, _, _ in tiles})
+    meta = {"minZoom": zooms[0] if zooms else MIN_ZOOM, "maxZoom": zooms[-1] if zooms else MAX_ZOOM,
+            "extent": EXTENT, "tiles": len(tiles)}
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf8") as f:
+        json.dump(meta, f)
+    return total
+
+
+_LOADER_JS = """
+var {{ this.get_name() }} = (function() {
+    var inline = {{ this.inline_json }};
+    var url = {{ this.url_json }};
+    var extent = {{ this.extent }};
+    var colors = {{ this.colors_json }};
+    var map = {{ this._parent.get_name() }};
+    var groups = {};
+    function fmt(v) { return v == null ? '-' : Number(v).toLocaleString(); }
+    function popup(p) {
+        if (p.zpid == null) {
+            return 'Price: $' + fmt(p.price) + '<br>Beds: ' + fmt(p.bedrooms) + ', Baths: ' + fmt(p.bathrooms) +
+                '<br><em>Zoom in for details</em>';
+        }
+        return '<strong>' + (p.street || '') + (p.city ? ', ' + p.city : '') + '</strong><br>' +
+            'Price: $' + fmt(p.price) + '<br>Beds: ' + fmt(p.bedrooms) + ', Baths: ' + fmt(p.bathrooms) +
+            '<br>Area: ' + fmt(p.livingArea) + ' sqft, Year: ' + (p.yearBuilt || '-') +
+            (p.cluster != null ? '<br>Cluster: ' + p.cluster : '');
+    }
+    function color(p) { return p.cluster != null ? colors[p.cluster % colors.length] : colors[0]; }
+    function draw(coords, fc) {
+        var group = L.layerGroup();
+        fc.features.forEach(function(f) {
+            var q = f.geometry.coordinates;
+            var ll = map.unproject(L.point((coords.x + q[0] / extent) * 256, (coords.y + q[1] / extent) * 256), coords.z);
+            var p = f.properties;
+            if (p.count) {
+                var size = p.count < 10 ? 26 : p.count < 100 ? 32 : 40;
+                var marker = L.marker(ll, {icon: L.divIcon({
+                    className: '', iconSize: [size, size],
+                    html: '<div style="background:' + color(p.rep) + ';opacity:0.8;border-radius:50%;width:' + size +
+                        'px;height:' + size + 'px;line-height:' + size + 'px;text-align:center;color:white;' +
+                        'font-size:11px;font-weight:bold;">' + p.count + '</div>'
+                })});
+                marker.bindTooltip(p.count + ' listings' + (p.avgPrice ? ', avg $' + fmt(p.avgPrice) : ''));
+                marker.bindPopup('<em>Representative listing</em><br>' + popup(p.rep), {maxWidth: 250});
+                group.addLayer(marker);
+            } else {
+                group.addLayer(L.circleMarker(ll, {radius: 4, color: color(p), fillColor: color(p), fill: true,
+                                                   fillOpacity: 0.5})
+                    .bindPopup(popup(p), {maxWidth: 250})
+                    .bindTooltip('$' + fmt(p.price) + ' — ' + fmt(p.bedrooms) + 'bd/' + fmt(p.bathrooms) + 'ba'));
+            }
+        });
+        return group;
+    }
+    var Layer = L.GridLayer.extend({
+        createTile: function(coords, done) {
+            var tile = document.createElement('div');
+            var key = coords.z + '/' + coords.x + '/' + coords.y;
+            var layer = this;
+            var show = function(fc) {
+                if (fc && layer._map && !groups[key]) { groups[key] = draw(coords, fc).addTo(layer._map); }
+                done(null, tile);
+            };
+            if (inline) { setTimeout(function() { show(inline[key]); }, 0); }
+            else {
+                fetch(url.replace('{z}', coords.z).replace('{x}', coords.x).replace('{y}', coords.y))
+                    .then(function(r) { return r.ok ? r.json() : null; })
+                    .then(show, function() { done(null, tile); });
+            }
+            return tile;
+        }
+    });
+    var layer = new Layer({minZoom: {{ this.min_zoom }}, maxNativeZoom: {{ this.max_zoom }}, maxZoom: 19,
+                           minNativeZoom: {{ this.min_zoom }}, updateWhenZooming: false, tileSize: 256});
+    layer.on('tileunload', function(e) {
+        var key = e.coords.z + '/' + e.coords.x + '/' + e.coords.y;
+        if (groups[key]) { map.removeLayer(groups[key]); delete groups[key]; }
+    });
+    layer.on('remove', function() {
+        Object.keys(groups).forEach(function(k) { map.removeLayer(groups[k]); delete groups[k]; });
+    });
+    return layer.addTo(map);
+})();
+"""
+
+
+def listing_tiles_layer(tiles=None, url=None, name="Listings", colors=None, show=True,
+                        min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM):
+    """
+    folium layer drawing the markers of visible tiles only. Pass `tiles`
+    (embedded in the page) or `url`, a "{z}/{x}/{y}" template for tiles
+    written by write_tiles() and served next to the map's HTML.
+    """
+    from branca.element import Template
+    from folium.map import Layer
+
+    if (tiles is None) == (url is None):
+        raise ValueError("Pass exactly one of tiles or url.")
+
+    class ListingTiles(Layer):
+        _template = Template("{% macro script(this, kwargs) %}" + _LOADER_JS
+                             + "{% endmacro %}")
+
+        def __init__(self):
+            super().__init__(name=name, show=show)
+            self._name = "ListingTiles"
+            # "</" inside a listing field would end the page's <script> element.
+            self.inline_json = "null" if tiles is None else ("{" + ",".join(
+                f'"{z}/{x}/{y}":{t}' for (z, x, y), t in tiles.items()) + "}").replace("</", "<\\/")
+            self.url_json = json.dumps(url)
+            self.extent = EXTENT
+            self.colors_json = json.dumps(colors or ["red", "blue", "green", "purple", "orange", "darkred"])
+            self.min_zoom = min_zoom
+            self.max_zoom = max_zoom
+
+    return ListingTiles()
+
+
+def build_from_store(out_dir, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM):
+    """
+    Tiles for every listing in the property store, written to out_dir.
+    """
+    from property_store import open_store
+
+    store = open_store()
+    if store is None:
+        raise RuntimeError("No property store found; run upsert_properties.py or property_store.py build first.")
+    lat, lon, props = [], [], {f: [] for f in PROPERTY_FIELDS}
+    for doc in store.iter_documents():
+        lat.append(doc.get("latitude") or np.nan)
+        lon.append(doc.get("longitude") or np.nan)
+        addr = doc.get("address")
+        if isinstance(addr, str):
+            addr = json.loads(addr or "{}")
+        addr = addr if isinstance(addr, dict) else {}
+        for f in props:
+            if f == "street":
+                props[f].append(addr.get("streetAddress"))
+            elif f == "city":
+                props[f].append(doc.get("city") or addr.get("city"))
+            elif f == "cluster":
+                props[f].append(doc.get("clusterId"))
+            else:
+                props[f].append(doc.get(f))
+    as_float = lambda values: np.array([np.nan if x is None else x for x in values], dtype=np.float64)
+    t0 = time.perf_counter()
+    props = {f: np.array(v, dtype=object) if f in ("street", "city") else as_float(v) for f, v in props.items()}
+    tiles = build_tiles(as_float(lat), as_float(lon), props, min_zoom, max_zoom)
+    size = write_tiles(tiles, out_dir)
+    logging.info("Wrote %d tiles (%.1f MB) for %d listings to %s in %.1fs",
+                 len(tiles), size / 1e6, len(lat), out_dir, time.perf_counter() - t0)
+
+
+# -- benchmark ------------------------------------------------------------------
+
+
+def _synthetic(n, seed=0):
+    from bench_spatial import synthetic_listings
+
+    ids, lats, lons, attrs = synthetic_listings(n, seed)
+    rng = np.random.default_rng(seed)
+    props = {"zpid": ids, "price": attrs["price"].round(-3), "bedrooms": attrs["bedrooms"],
+             "bathrooms": attrs["bathrooms"], "livingArea": attrs["livingArea"].round(),
+             "yearBuilt": attrs["yearBuilt"],
+             "street": np.array([f"{i % 9999 + 1} Main St" for i in range(n)], dtype=object),
+             "city": np.array(["Chapel Hill", "Durham", "Raleigh", "Charlotte"], dtype=object)[rng.integers(0, 4, n)],
+             "cluster": rng.integers(0, 4, n)}
+    return lats, lons, props
+
+
+def _marker_cluster_bytes(lats, lons, props):
+    """
+    HTML bytes of the old 8.6 map (one CircleMarker + popup per listing), or
+    None when folium is not installed.
+    """
+    try:
+        import folium
+        from folium.plugins import MarkerCluster
+    except ImportError:
+        return None
+    m = folium.Map(location=[35.9, -79.0], zoom_start=13)
+    cluster = MarkerCluster().add_to(m)
+    for i in range(len(lats)):
+        folium.CircleMarker(
+            location=(lats[i], lons[i]), radius=4, fill=True,
+            popup=folium.Popup(f"<strong>{props['street'][i]}, {props['city'][i]}</strong><br>"
+                               f"Price: ${props['price'][i]:,}", max_width=250),
+            tooltip=f"${props['price'][i]:,}",
+        ).add_to(cluster)
+    return len(m.get_root().render())
+
+
+def bench(sizes, min_zoom, max_zoom, legacy_max):
+    print(f"{'listings':>10} | {'build s':>8} | {'tiles':>7} | {'tile MB':>8} | {'max feat/tile':>13} | "
+          f"{'view KB p95':>11} | {'old HTML MB':>11}")
+    for n in sizes:
+        lats, lons, props = _synthetic(n)
+        t0 = time.perf_counter()
+        tiles = build_tiles(lats, lons, props, min_zoom, max_zoom)
+        build_s = time.perf_counter() - t0
+        with tempfile.TemporaryDirectory() as tmp:
+            total = write_tiles(tiles, tmp)
+        sizes_by_tile = {k: len(t) for k, t in tiles.items()}
+        # Bytes a 1280x800 view loads (6x5 tiles) around each occupied tile.
+        views = []
+        for (z, x, y) in list(sizes_by_tile)[::max(1, len(sizes_by_tile) // 500)]:
+            views.append(sum(sizes_by_tile.get((z, x + dx, y + dy), 0) for dx in range(-2, 4) for dy in range(-2, 3)))
+        old = _marker_cluster_bytes(lats, lons, props) if n <= legacy_max else None
+        print(f"{n:>10,} | {build_s:>8.2f} | {len(tiles):>7,} | {total / 1e6:>8.2f} | "
+              f"{max(len(json.loads(t)['features']) for t in tiles.values()):>13} | {np.percentile(views, 95) / 1e3:>11.1f} | "
+              f"{'-' if old is None else f'{old / 1e6:.1f}':>11}")
+    print(f"In URL mode the page itself only carries the {len(_LOADER_JS) / 1e3:.1f} KB loader at any size; "
+          "a view loads at most 6x5 tiles of 64 features.")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Pre-clustered GeoJSON listing tiles.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_build = sub.add_parser("build", help="write tiles for the property store")
+    p_build.add_argument("--out", default="listing_tiles")
+    p_build.add_argument("--min-zoom", type=int, default=MIN_ZOOM)
+    p_build.add_argument("--max-zoom", type=int, default=MAX_ZOOM)
+    p_bench = sub.add_parser("bench", help="build time and bytes on synthetic listings")
+    p_bench.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    p_bench.add_argument("--min-zoom", type=int, default=MIN_ZOOM)
+    p_bench.add_argument("--max-zoom", type=int, default=MAX_ZOOM)
+    p_bench.add_argument("--legacy-max", type=int, default=50_000,
+                         help="largest size to render the old per-listing folium map for (needs folium)")
+    args = parser.parse_args()
+    try:
+        if args.command == "build":
+            build_from_store(args.out, args.min_zoom, args.max_zoom)
+        else:
+            bench(args.rows, args.min_zoom, args.max_zoom, args.legacy_max)
+    except Exception as err:
+        logging.error("Map tiles failed: %s", err)
+        sys.exit(1)
@@ -0,0 +1,155 @@
+"""
+Namespace sharding of the Pinecone property index by state / metro.
+
+Ingest puts each vector in a namespace derived from the cleaned state and
+city ("nc-triangle", "nc-charlotte", "nc-other", "va-other", ...). At query
+time route_namespaces() reads the message and user_context for city, metro,
+state or ZIP mentions and picks the namespaces to search; when nothing
+places the question, every namespace is searched in parallel and the
+per-namespace top-k lists are merged by score (query_namespaces()).
+
+Sharding is opt-in: set PINECONE_NAMESPACE_SHARDING=1 (or pass
+--shard-namespaces to upsert_properties.py) before ingesting. An index whose
+vectors all sit in the default namespace is queried exactly as before.
+"""
+import os
+import re
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+SHARDING_ENABLED = os.getenv("PINECONE_NAMESPACE_SHARDING", "").lower() in ("1", "true", "yes")
+DEFAULT_NAMESPACE = ""
+# Reserved for bookkeeping vectors (the answer cache's index version); never searched.
+META_NAMESPACE = "__meta__"
+FANOUT_WORKERS = 8
+
+# Metro -> member cities. Cities not listed fall into "<state>-other".
+METROS = {
+    "nc-triangle": ["Chapel Hill", "Carrboro", "Durham", "Raleigh", "Cary", "Apex", "Morrisville", "Wake Forest",
+                    "Hillsborough", "Pittsboro", "Mebane", "Holly Springs", "Fuquay-Varina", "Garner",
+                    "Knightdale", "Wendell", "Zebulon", "Rolesville", "Creedmoor", "Butner"],
+    "nc-charlotte": ["Charlotte", "Concord", "Gastonia", "Huntersville", "Matthews", "Mint Hill", "Cornelius",
+                     "Davidson", "Mooresville", "Kannapolis", "Indian Trail", "Monroe"],
+    "nc-triad": ["Greensboro", "Winston-Salem", "High Point", "Burlington", "Kernersville", "Thomasville",
+                 "Asheboro", "Lexington"],
+}
+# Extra phrases that name a metro without naming a city.
+METRO_ALIASES = {
+    "nc-triangle": ["research triangle", "the triangle", "rtp", "unc", "duke", "nc state", "orange county",
+                    "wake county", "durham county", "chatham county"],
+    "nc-charlotte": ["mecklenburg", "charlotte area", "queen city"],
+    "nc-triad": ["piedmont triad", "the triad", "guilford county"],
+}
+STATES = {
+    "AL": "Alabama", "AK": "Alaska", "AZ": "Arizona", "AR": "Arkansas", "CA": "California", "CO": "Colorado",
+    "CT": "Connecticut", "DE": "Delaware", "FL": "Florida", "GA": "Georgia", "HI": "Hawaii", "ID": "Idaho",
+    "IL": "Illinois", "IN": "Indiana", "IA": "Iowa", "KS": "Kansas", "KY": "Kentucky", "LA": "Louisiana",
+    "ME": "Maine", "MD": "Maryland", "MA": "Massachusetts", "MI": "Michigan", "MN": "Minnesota",
+    "MS": "Mississippi", "MO": "Missouri", "MT": "Montana", "NE": "Nebraska", "NV": "Nevada",
+    "NH": "New Hampshire", "NJ": "New Jersey", "NM": "New Mexico", "NY": "New York", "NC": "North Carolina",
+    "ND": "North Dakota", "OH": "Ohio", "OK": "Oklahoma", "OR": "Oregon", "PA": "Pennsylvania",
+    "RI": "Rhode Island", "SC": "South Carolina", "SD": "South Dakota", "TN": "Tennessee", "TX": "Texas",
+    "UT": "Utah", "VT": "Vermont", "VA": "Virginia", "WA": "Washington", "WV": "West Virginia",
+    "WI": "Wisconsin", "WY": "Wyoming", "DC": "District of Columbia",
+}
+# First three ZIP digits -> state, for the states we list today.
+ZIP3_STATES = [((270, 289), "NC"), ((290, 299), "SC"), ((220, 246), "VA"), ((370, 385), "TN"), ((300, 319), "GA")]
+
+NamespaceRoute = namedtuple("NamespaceRoute", ["namespaces", "reason"])
+
+_CITY_TO_METRO = {city.lower(): metro for metro, cities in METROS.items() for city in cities}
+_CITY_RES = [(re.compile(r"\b" + re.escape(c) + r"\b"), m) for c, m in _CITY_TO_METRO.items()]
+_ALIAS_RES = [(re.compile(r"\b" + re.escape(a) + r"\b"), m) for m, aliases in METRO_ALIASES.items() for a in aliases]
+_STATE_NAME_RES = [(re.compile(r"\b" + re.escape(name.lower()) + r"\b"), abbr) for abbr, name in STATES.items()]
+# Two-letter codes only count in caps ("NC", "Durham, NC") so "in"/"me"/"or" don't match.
+_STATE_ABBR_RE = re.compile(r"\b(" + "|".join(STATES) + r")\b")
+_ZIP_RE = re.compile(r"\b(\d{5})(?:-\d{4})?\b")
+
+
+def _slug(text):
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+
+
+def namespace_for(state, city):
+    """
+    Namespace for a cleaned record's state and city.
+    """
+    state = (state or "").strip()
+    if not state or state == "Unknown":
+        return "unknown"
+    metro = _CITY_TO_METRO.get((city or "").strip().lower())
+    if metro and metro.startswith(_slug(state) + "-"):
+        return metro
+    return f"{_slug(state)}-other"
+
+
+def _zip_state(zipcode):
+    prefix = int(zipcode[:3])
+    for (lo, hi), state in ZIP3_STATES:
+        if lo <= prefix <= hi:
+            return state
+    return None
+
+
+def route_namespaces(message, user_context="", known=None):
+    """
+    Namespaces to search for a message. Cities/metro aliases pick a metro,
+    states and ZIPs pick all of that state's namespaces; otherwise every known
+    namespace (fan-out). `known` is the list of namespaces present in the index.
+    """
+    known = list(known or [])
+    text = f"{message}\n{user_context or ''}"
+    low = text.lower()
+
+    metros = {m for pattern, m in _CITY_RES if pattern.search(low)}
+    metros |= {m for pattern, m in _ALIAS_RES if pattern.search(low)}
+    states = {abbr for pattern, abbr in _STATE_NAME_RES if pattern.search(low)}
+    states |= set(_STATE_ABBR_RE.findall(text))
+    states |= {s for z in _ZIP_RE.findall(text) if (s := _zip_state(z))}
+
+    selected, reasons = set(), []
+    metro_hits = {m for m in metros if m in known}
+    if metro_hits:
+        selected |= metro_hits
+        reasons.append("metro")
+    for state in sorted(states):
+        prefix = _slug(state) + "-"
+        # A state whose metro was already picked adds nothing ("Durham, NC").
+        if any(m.startswith(prefix) for m in metro_hits):
+            continue
+        state_hits = {ns for ns in known if ns.startswith(prefix)}
+        if state_hits:
+            selected |= state_hits
+            if "state" not in reasons:
+                reasons.append("state")
+    if selected:
+        return NamespaceRoute(sorted(selected), "+".join(reasons))
+    return NamespaceRoute(known, "fanout")
+
+
+def query_namespaces(index, vector, namespaces, top_k=30, **kwargs):
+    """
+    Query each namespace in parallel and merge the matches by score into one
+    top_k list. Returns {"matches": [...]} like a single-namespace query.
+    """
+    def one(ns):
+        resp = index.query(vector=vector, top_k=top_k, namespace=ns, **kwargs)
+        return getattr(resp, "matches", None) or (resp.get("matches", []) if isinstance(resp, dict) else [])
+
+    if len(namespaces) == 1:
+        return {"matches": one(namespaces[0])}
+    with ThreadPoolExecutor(max_workers=min(FANOUT_WORKERS, len(namespaces))) as pool:
+        results = list(pool.map(one, namespaces))
+    merged = [m for matches in results for m in matches]
+    merged.sort(key=lambda m: m.get("score", 0.0) if isinstance(m, dict) else m.score, reverse=True)
+    return {"matches": merged[:top_k]}
+
+
+def index_namespaces(index):
+    """
+    Namespaces present in the index (default namespace as ""), from
+    describe_index_stats. META_NAMESPACE is left out.
+    """
+    stats = index.describe_index_stats()
+    spaces = stats.get("namespaces", {}) if isinstance(stats, dict) else getattr(stats, "namespaces", {})
+    return sorted(ns for ns in (spaces or {}) if ns != META_NAMESPACE)
@@ -0,0 +1,240 @@
+"""
+Scalable 2-D projections (PCA and t-SNE) for notebook section 6.
+
+- pca(): exact covariance eigendecomposition for narrow feature matrices
+  (section 6 has 5 columns), randomized_pca() (Halko-style randomized SVD,
+  a few passes over X) for wide ones.
+- landmark_tsne(): sklearn's Barnes-Hut t-SNE fitted on a stratified sample
+  of landmark rows (strata are quantile cells of the first two principal
+  components, so sparse tails keep at least one landmark each); every other
+  row is placed at the inverse-distance weighted mean of its nearest
+  landmarks' embeddings. Up to n_landmarks rows it is plain t-SNE on all rows.
+- project(): both projections, cached on disk under a hash of X and the
+  parameters, so re-running the notebook on unchanged features is a file read.
+
+    python projection.py --sizes 10000 100000 1000000   # runtime vs size
+"""
+import os
+import sys
+import time
+import hashlib
+import logging
+import argparse
+import tempfile
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+CACHE_DIR = Path(os.getenv("PROJECTION_CACHE_DIR", Path(__file__).resolve().parent / "projection_cache"))
+N_LANDMARKS = 5000
+N_NEIGHBORS = 10
+PERPLEXITY = 50
+# Wider feature matrices switch PCA from the exact covariance solver to randomized SVD.
+EXACT_MAX_DIMS = 100
+# Quantile bins per principal component used as sampling strata.
+STRATA_BINS = 8
+
+Projections = namedtuple("Projections", ["pca", "tsne", "explained_variance_ratio", "landmarks"])
+
+
+def randomized_pca(X, n_components=2, n_oversamples=10, n_iter=4, seed=42):
+    """
+    (scores, components, mean, explained_variance_ratio) of the top
+    n_components principal components of X.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    mean = X.mean(axis=0)
+    Xc = X - mean
+    rng = np.random.default_rng(seed)
+    k = min(n_components + n_oversamples, min(Xc.shape))
+    Q = Xc @ rng.standard_normal((Xc.shape[1], k))
+    for _ in range(n_iter):
+        # QR between passes keeps the power iterations numerically stable.
+        Q, _ = np.linalg.qr(Q)
+        Q, _ = np.linalg.qr(Xc.T @ Q)
+        Q = Xc @ Q
+    Q, _ = np.linalg.qr(Q)
+    _, s, vt = np.linalg.svd(Q.T @ Xc, full_matrices=False)
+    components = vt[:n_components]
+    # Same sign convention as sklearn (largest loading positive), so plots do not flip.
+    signs = np.sign(components[np.arange(len(components)), np.abs(components).argmax(axis=1)])
+    components *= signs[:, None]
+    total_var = np.square(Xc).sum() or 1.0
+    return Xc @ components.T, components, mean, np.square(s[:n_components]) / total_var
+
+
+def pca(X, n_components=2, solver="auto", seed=42):
+    """
+    (scores, components, mean, explained_variance_ratio). "auto" uses the
+    exact D x D covariance eigendecomposition for narrow X (one pass, exact)
+    and randomized_pca() once X has more than EXACT_MAX_DIMS columns.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    if solver == "randomized" or (solver == "auto" and X.shape[1] > EXACT_MAX_DIMS):
+        return randomized_pca(X, n_components, seed=seed)
+    mean = X.mean(axis=0)
+    Xc = X - mean
+    vals, vecs = np.linalg.eigh(Xc.T @ Xc)
+    components = vecs[:, ::-1][:, :n_components].T
+    signs = np.sign(components[np.arange(len(components)), np.abs(components).argmax(axis=1)])
+    components *= signs[:, None]
+    return Xc @ components.T, components, mean, vals[::-1][:n_components] / (vals.sum() or 1.0)
+
+
+def stratified_sample(strata, n, seed=42):
+    """
+    Row indices of an n-row sample drawn proportionally from each stratum,
+    with at least one row from every stratum.
+    """
+    strata = np.asarray(strata)
+    if n >= len(strata):
+        return np.arange(len(strata))
+    rng = np.random.default_rng(seed)
+    labels, inverse, counts = np.unique(strata, return_inverse=True, return_counts=True)
+    quota = np.maximum(1, np.floor(counts * n / len(strata)).astype(np.int64))
+    order = np.argsort(inverse, kind="stable")
+    starts = np.r_[0, np.cumsum(counts)[:-1]]
+    picks = [rng.choice(order[s:s + c], size=min(q, c), replace=False) for s, c, q in zip(starts, counts, quota)]
+    return np.sort(np.concatenate(picks))
+
+
+def pca_strata(scores, bins=STRATA_BINS):
+    """
+    Quantile cell of each row on the first two principal components.
+    """
+    cells = np.zeros(len(scores), dtype=np.int64)
+    for j in range(min(2, scores.shape[1])):
+        edges = np.quantile(scores[:, j], np.linspace(0, 1, bins + 1)[1:-1])
+        cells = cells * bins + np.searchsorted(edges, scores[:, j])
+    return cells
+
+
+def landmark_tsne(X, n_landmarks=N_LANDMARKS, perplexity=PERPLEXITY, n_neighbors=N_NEIGHBORS, seed=42,
+                  strata=None):
+    """
+    (embedding, landmark row indices). strata defaults to pca_strata().
+    """
+    from sklearn.manifold import TSNE
+    from sklearn.neighbors import KDTree
+
+    X = np.asarray(X, dtype=np.float64)
+    n = len(X)
+    if strata is None and n > n_landmarks:
+        strata = pca_strata(pca(X, 2, seed=seed)[0])
+    landmarks = stratified_sample(strata, n_landmarks, seed) if n > n_landmarks else np.arange(n)
+    tsne = TSNE(n_components=2, random_state=seed, perplexity=max(1.0, min(perplexity, (len(landmarks) - 1) / 3)))
+    anchor = tsne.fit_transform(X[landmarks])
+    if len(landmarks) == n:
+        return anchor, landmarks
+
+    embedding = np.empty((n, 2))
+    embedding[landmarks] = anchor
+    rest = np.setdiff1d(np.arange(n), landmarks, assume_unique=True)
+    dist, nbr = KDTree(X[landmarks]).query(X[rest], k=min(n_neighbors, len(landmarks)))
+    # A row identical to a landmark lands on it; otherwise closer landmarks weigh more.
+    weights = 1.0 / np.maximum(dist, 1e-12)
+    weights /= weights.sum(axis=1, keepdims=True)
+    embedding[rest] = np.einsum("rk,rkd->rd", weights, anchor[nbr])
+    return embedding, landmarks
+
+
+def _cache_key(X, **params):
+    h = hashlib.sha1(np.ascontiguousarray(X, dtype=np.float64).tobytes())
+    h.update(repr(sorted(params.items())).encode())
+    return h.hexdigest()[:20]
+
+
+def project(X, n_landmarks=N_LANDMARKS, perplexity=PERPLEXITY, seed=42, cache_dir=CACHE_DIR, tsne=True,
+            pca_solver="auto"):
+    """
+    Projections(pca, tsne, explained_variance_ratio, landmarks) of X, read
+    from cache_dir when the same X and parameters were projected before
+    (cache_dir=None disables the cache).
+    """
+    X = np.asarray(X, dtype=np.float64)
+    path = None
+    if cache_dir is not None:
+        key = _cache_key(X, n_landmarks=n_landmarks, perplexity=perplexity, seed=seed, tsne=tsne,
+                         pca_solver=pca_solver)
+        path = Path(cache_dir) / f"projection-{key}.npz"
+        if path.exists():
+            data = np.load(path)
+            logging.info("Projections loaded from %s", path)
+            return Projections(data["pca"], data["tsne"] if tsne else None, data["explained"], data["landmarks"])
+
+    scores, _, _, explained = pca(X, 2, pca_solver, seed)
+    embedding, landmarks = None, np.empty(0, dtype=np.int64)
+    if tsne:
+        strata = pca_strata(scores) if len(X) > n_landmarks else None
+        embedding, landmarks = landmark_tsne(X, n_landmarks, perplexity, seed=seed, strata=strata)
+    if path is not None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, pca=scores, tsne=embedding if tsne else np.empty((0, 2)), explained=explained,
+                 landmarks=landmarks)
+    return Projections(scores, embedding, explained, landmarks)
+
+
+# -- benchmark ------------------------------------------------------------------
+
+
+def _trustworthiness(X, embedding, n=2000, seed=0):
+    from sklearn.manifold import trustworthiness
+
+    rows = np.random.default_rng(seed).choice(len(X), size=min(n, len(X)), replace=False)
+    return trustworthiness(X[rows], embedding[rows], n_neighbors=10)
+
+
+def bench(sizes, full_max, n_landmarks, seed):
+    from sklearn.decomposition import PCA
+    from sklearn.manifold import TSNE
+    from bench_clustering import synthetic_features
+    from clustering import minmax_normalize
+
+    header = (f"{'n':>9} | {'sk pca s':>8} | {'pca s':>6} | {'rand pca s':>10} | {'tsne full s':>11} | "
+              f"{'landmark s':>10} | {'trust full':>10} | {'trust lmk':>9} | {'cached s':>8}")
+    print(header)
+    print("-" * len(header))
+    for n in sizes:
+        X = minmax_normalize(synthetic_features(n, seed))[0]
+        t0 = time.perf_counter()
+        PCA(n_components=2, svd_solver="full").fit_transform(X)
+        pca_full = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        pca(X, 2, seed=seed)
+        pca_auto = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        randomized_pca(X, 2, seed=seed)
+        pca_rand = time.perf_counter() - t0
+        tsne_full, trust_full = None, None
+        if n <= full_max:
+            t0 = time.perf_counter()
+            full = TSNE(n_components=2, random_state=seed, perplexity=PERPLEXITY).fit_transform(X)
+            tsne_full = time.perf_counter() - t0
+            trust_full = _trustworthiness(X, full)
+        with tempfile.TemporaryDirectory() as tmp:
+            t0 = time.perf_counter()
+            proj = project(X, n_landmarks=n_landmarks, seed=seed, cache_dir=tmp)
+            landmark = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            project(X, n_landmarks=n_landmarks, seed=seed, cache_dir=tmp)
+            cached = time.perf_counter() - t0
+        trust_lmk = _trustworthiness(X, proj.tsne)
+        fmt = lambda v, spec: "skipped" if v is None else format(v, spec)
+        print(f"{n:>9,} | {pca_full:>8.3f} | {pca_auto:>6.3f} | {pca_rand:>10.3f} | {fmt(tsne_full, '.1f'):>11} | "
+              f"{landmark:>10.1f} | {fmt(trust_full, '.3f'):>10} | {trust_lmk:>9.3f} | {cached:>8.3f}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description="PCA / landmark t-SNE runtime vs dataset size.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--full-max", type=int, default=20_000, help="skip exact t-SNE above this many rows")
+    parser.add_argument("--landmarks", type=int, default=N_LANDMARKS)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    try:
+        bench(args.sizes, args.full_max, args.landmarks, args.seed)
+    except Exception as err:
+        logging.error("Projection benchmark failed: %s", err)
+        sys.exit(1)
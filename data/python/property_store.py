@@ -0,0 +1,301 @@
+"""
+Local property document store keyed by zpid (SQLite).
+
+With slim vector metadata (utils.create_metadata(..., slim=True)) the index
+only carries filterable scalars; the long fields the chatbot prompt needs
+(address JSON, description, listing source) live here and are hydrated into
+query matches with one batched SELECT per query. The full cleaned document
+is kept as JSON too, so anything else can be recovered without Mongo.
+
+An address table maps a normalized street + ZIP to the zpid, so the chatbot
+can resolve pasted addresses (and zpids / Zillow URLs) exactly, without
+embedding or vector search (see direct_lookup.py). The upsert job fills the
+store as it ingests; `python property_store.py build` fills it from the
+cleaned Mongo collection for an index that was ingested earlier.
+"""
+import re
+import sys
+import json
+import logging
+import os
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+
+STORE_PATH = Path(os.getenv("PROPERTY_STORE_PATH", Path(__file__).resolve().parent / "property_store.sqlite"))
+
+# Fields with their own column (cheap to select without parsing the full doc).
+COLUMNS = ["address", "description", "listingDataSource"]
+# What the chatbot prompt reads that slim metadata leaves out.
+PROMPT_FIELDS = ("address", "description")
+# SQLite's default limit on bound parameters is 999 on older builds.
+MAX_PARAMS = 900
+
+STREET_ABBREVIATIONS = {
+    "street": "st", "avenue": "ave", "road": "rd", "drive": "dr", "lane": "ln", "court": "ct",
+    "boulevard": "blvd", "place": "pl", "circle": "cir", "terrace": "ter", "parkway": "pkwy",
+    "highway": "hwy", "trail": "trl", "square": "sq", "way": "way", "north": "n", "south": "s",
+    "east": "e", "west": "w", "northeast": "ne", "northwest": "nw", "southeast": "se",
+    "southwest": "sw", "apartment": "apt", "suite": "ste", "unit": "unit",
+}
+_NON_WORD_RE = re.compile(r"[^a-z0-9 ]+")
+
+
+def normalize_street(street):
+    """
+    Canonical street key: lowercase, punctuation dropped, common suffixes and
+    directions abbreviated ("123 North Main Street" -> "123 n main st").
+    """
+    words = _NON_WORD_RE.sub(" ", (street or "").lower().replace("#", " unit ")).split()
+    return " ".join(STREET_ABBREVIATIONS.get(w, w) for w in words)
+
+
+def normalize_zip(zipcode):
+    digits = re.sub(r"\D", "", str(zipcode or ""))
+    return digits[:5] if len(digits) >= 5 else ""
+
+
+def _column_value(doc, name):
+    value = doc.get(name)
+    if name == "address" and not isinstance(value, str):
+        # Same encoding as the legacy vector metadata.
+        return json.dumps(value or {})
+    return value
+
+
+class PropertyStore:
+    """
+    zpid -> cleaned property document. Safe to share across threads: each
+    thread gets its own connection, and WAL mode lets readers run alongside
+    the ingest writer.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.path = str(path)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS properties ("
+            "zpid INTEGER PRIMARY KEY, "
+            + ", ".join(f"{c} TEXT" for c in COLUMNS)
+            + ", doc TEXT NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS addresses ("
+            "street TEXT NOT NULL, zipcode TEXT NOT NULL, zpid INTEGER NOT NULL, PRIMARY KEY (street, zipcode))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS addresses_street ON addresses (street)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def put_many(self, docs):
+        """
+        Insert or replace cleaned documents (one transaction).
+        """
+        rows = [
+            (int(d["zpid"]), *[_column_value(d, c) for c in COLUMNS], json.dumps(d))
+            for d in docs if d.get("zpid")
+        ]
+        if not rows:
+            return 0
+        addresses = []
+        for d in docs:
+            addr = d.get("address") or {}
+            if isinstance(addr, str):
+                try:
+                    addr = json.loads(addr)
+                except ValueError:
+                    addr = {}
+            street = normalize_street(addr.get("streetAddress"))
+            if d.get("zpid") and street and street != "unknown":
+                addresses.append((street, normalize_zip(addr.get("zipcode")), int(d["zpid"])))
+        conn = self._conn()
+        placeholders = ", ".join("?" for _ in range(len(COLUMNS) + 2))
+        with conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO properties (zpid, {', '.join(COLUMNS)}, doc) VALUES ({placeholders})",
+                rows,
+            )
+            conn.executemany("INSERT OR REPLACE INTO addresses (street, zipcode, zpid) VALUES (?, ?, ?)", addresses)
+        return len(rows)
+
+    def get_many(self, zpids, fields=PROMPT_FIELDS):
+        """
+        {zpid: {field: value}} for the zpids present in the store, selecting
+        only the requested fields. Fields without a column come from the full doc.
+        """
+        ids = sorted({int(float(z)) for z in zpids if z not in (None, "")})
+        cols = [f for f in fields if f in COLUMNS]
+        need_doc = any(f not in COLUMNS for f in fields)
+        select = ["zpid"] + cols + (["doc"] if need_doc else [])
+        out = {}
+        conn = self._conn()
+        for i in range(0, len(ids), MAX_PARAMS):
+            chunk = ids[i:i + MAX_PARAMS]
+            rows = conn.execute(
+                f"SELECT {', '.join(select)} FROM properties WHERE zpid IN ({', '.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall()
+            for row in rows:
+                rec = dict(zip(cols, row[1:1 + len(cols)]))
+                if need_doc:
+                    doc = json.loads(row[-1])
+                    rec.update({f: doc.get(f) for f in fields if f not in COLUMNS})
+                out[row[0]] = rec
+        return out
+
+    def get_documents(self, zpids):
+        """
+        {zpid: full cleaned document} for the zpids present in the store.
+        """
+        ids = [int(float(z)) for z in zpids if z not in (None, "")]
+        out = {}
+        conn = self._conn()
+        for i in range(0, len(ids), MAX_PARAMS):
+            chunk = ids[i:i + MAX_PARAMS]
+            rows = conn.execute(
+                f"SELECT zpid, doc FROM properties WHERE zpid IN ({', '.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            out.update({zpid: json.loads(doc) for zpid, doc in rows})
+        return out
+
+    def find_by_address(self, street, zipcode=None):
+        """
+        zpid for a street address: exact street + ZIP, or the street alone when
+        exactly one property has it. None if unknown or ambiguous.
+        """
+        key = normalize_street(street)
+        zip5 = normalize_zip(zipcode)
+        conn = self._conn()
+        if zip5:
+            row = conn.execute("SELECT zpid FROM addresses WHERE street = ? AND zipcode = ?", (key, zip5)).fetchone()
+            return row[0] if row else None
+        rows = conn.execute("SELECT zpid FROM addresses WHERE street = ? LIMIT 2", (key,)).fetchall()
+        return rows[0][0] if len(rows) == 1 else None
+
+    def iter_documents(self, batch_size=5000):
+        """
+        Every stored document, in zpid order, fetched batch_size rows at a time.
+        """
+        cursor = self._conn().execute("SELECT doc FROM properties ORDER BY zpid")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for (doc,) in rows:
+                yield json.loads(doc)
+
+    def count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM properties").fetchone()[0]
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class StoreWriter:
+    """
+    Buffers documents for the ingest path and writes them batch_size at a time.
+    """
+
+    def __init__(self, store, batch_size=500):
+        self.store = store
+        self.batch_size = batch_size
+        self.buffer = []
+        self.written = 0
+
+    def add(self, doc):
+        self.buffer.append(doc)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.written += self.store.put_many(self.buffer)
+            self.buffer = []
+
+
+def open_store(path=STORE_PATH):
+    """
+    The store at path, or None when no ingest has written one yet.
+    """
+    if not os.path.exists(path):
+        return None
+    return PropertyStore(path)
+
+
+def hydrate(matches, store, fields=PROMPT_FIELDS):
+    """
+    Fill missing fields into query matches' metadata in place from the store,
+    with a single batched lookup. Matches that already carry the fields (full
+    metadata) are left alone. Returns the number of matches hydrated.
+    """
+    if store is None:
+        return 0
+    missing = [m for m in matches if any(f not in m["metadata"] for f in fields)]
+    if not missing:
+        return 0
+    try:
+        docs = store.get_many([m["metadata"].get("zpid") or m["id"] for m in missing], fields)
+    except sqlite3.Error as e:
+        logging.warning("Property store lookup failed: %s", e)
+        return 0
+    hydrated = 0
+    for m in missing:
+        key = m["metadata"].get("zpid") or m["id"]
+        rec = docs.get(int(float(key)))
+        if rec:
+            for f, v in rec.items():
+                if v is not None:
+                    m["metadata"].setdefault(f, v)
+            hydrated += 1
+    return hydrated
+
+
+def build_from_mongo(path=STORE_PATH, batch_size=1000):
+    """
+    Fill the store from the cleaned Mongo properties collection.
+    """
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+    from utils import clean_document
+    from derived_features import load_city_prices
+
+    load_dotenv()
+    mongo = MongoClient(os.getenv("MONGO_URI"))
+    store = PropertyStore(path)
+    writer = StoreWriter(store, batch_size)
+    city_prices = load_city_prices()
+    try:
+        for doc in mongo.get_default_database()["properties"].find({}, {"_id": 0}, batch_size=5000):
+            writer.add(clean_document(doc, city_prices))
+        writer.flush()
+    finally:
+        mongo.close()
+    logging.info("Wrote %d documents to %s (%d total).", writer.written, path, store.count())
+    return writer.written
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Local zpid/address property store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_build = sub.add_parser("build", help="fill the store from the cleaned Mongo collection")
+    p_build.add_argument("--path", default=str(STORE_PATH))
+    args = parser.parse_args()
+    try:
+        build_from_mongo(args.path)
+    except Exception as err:
+        logging.error("Error building property store: %s", err)
+        sys.exit(1)
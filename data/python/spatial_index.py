@@ -0,0 +1,419 @@
+"""
+Grid spatial index over property coordinates.
+
+Points are projected to a local equirectangular plane (km), bucketed into
+square cells and stored sorted by cell key, so the points of any run of
+cells along one grid row are a contiguous slice found with two binary
+searches. Radius, bounding-box and k-nearest queries gather the slices of
+the rows they touch, then check exact great-circle distances and scalar
+filters (price, beds, ...) on the candidates with NumPy. Memory is a few
+arrays of n entries; there is no per-cell table.
+
+The chatbot uses it to turn "within 2 miles of Franklin Street" into a
+Pinecone filter (see spatial_filter()), and the CrewAI runner lists the
+listings around a mapFocus. Build it from the property store:
+
+    python spatial_index.py build            # writes spatial_index.npz
+    python spatial_index.py query "within 2 miles of Franklin Street" --where bedrooms=3:
+"""
+import os
+import re
+import sys
+import time
+import logging
+import argparse
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+INDEX_PATH = Path(os.getenv("SPATIAL_INDEX_PATH", Path(__file__).resolve().parent / "spatial_index.npz"))
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG = np.pi * EARTH_RADIUS_KM / 180.0
+KM_PER_MILE = 1.609344
+CELL_KM = 1.0
+# Numeric columns that can be filtered on; "city" is filtered by name.
+FILTER_FIELDS = ("price", "bedrooms", "bathrooms", "livingArea", "yearBuilt")
+# "near X" without a distance.
+NEAR_RADIUS_KM = 2.0 * KM_PER_MILE
+WALKING_RADIUS_KM = 1.0 * KM_PER_MILE
+# Pinecone $in filters get slow (and are capped) past a few thousand values;
+# larger candidate sets fall back to a latitude/longitude box.
+MAX_IN_FILTER = 1000
+
+# Named places users ask about that are not cities.
+LANDMARKS = {
+    "franklin street": (35.9132, -79.0558),
+    "unc hospitals": (35.9023, -79.0507),
+    "unc chapel hill": (35.9049, -79.0469),
+    "unc": (35.9049, -79.0469),
+    "duke university": (36.0014, -78.9382),
+    "duke": (36.0014, -78.9382),
+    "downtown durham": (35.9940, -78.8986),
+    "nc state": (35.7847, -78.6821),
+    "downtown raleigh": (35.7796, -78.6382),
+    "research triangle park": (35.8992, -78.8636),
+    "rtp": (35.8992, -78.8636),
+    "rdu": (35.8801, -78.7880),
+    "uptown charlotte": (35.2271, -80.8431),
+}
+
+SpatialFocus = namedtuple("SpatialFocus", ["lat", "lon", "radius_km", "anchor"])
+
+_LATLON_RE = re.compile(r"(-?\d{1,2}\.\d+)\s*,\s*(-?\d{1,3}\.\d+)")
+_ANCHOR = r"(-?\d{1,2}\.\d+\s*,\s*-?\d{1,3}\.\d+|.+?)"
+_END = r"(?=[?.!,;]|\s+(?:and|with|under|below|for|that|which|in the)\b|$)"
+_WITHIN_RE = re.compile(
+    r"\b(?:within\s+)?(\d+(?:\.\d+)?)\s*(mi|miles?|km|kilometers?|kilometres?)\s+(?:of|from|around)\s+" + _ANCHOR + _END,
+    re.IGNORECASE)
+_NEAR_RE = re.compile(r"\b(walking distance (?:of|to|from)|near|close to|around|by)\s+" + _ANCHOR + _END, re.IGNORECASE)
+
+
+def haversine_km(lat, lon, lats, lons):
+    """
+    Great-circle distance in km from one point to arrays of points.
+    """
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class SpatialIndex:
+    """
+    Cell-sorted points with ids, filterable attributes and city names.
+    Query results are arrays of row positions; ids[pos] gives zpids.
+    """
+
+    def __init__(self, ids, lats, lons, attrs=None, cities=None, cell_km=CELL_KM):
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        self.cell_km = float(cell_km)
+        self.lat0 = float(lats.mean()) if len(lats) else 0.0
+        self.kx = KM_PER_DEG * np.cos(np.radians(self.lat0))
+        x, y = lons * self.kx, lats * KM_PER_DEG
+        self.x0 = float(x.min()) if len(x) else 0.0
+        self.y0 = float(y.min()) if len(y) else 0.0
+        cx = ((x - self.x0) // self.cell_km).astype(np.int64)
+        cy = ((y - self.y0) // self.cell_km).astype(np.int64)
+        self.nx = int(cx.max()) + 1 if len(cx) else 1
+        self.ny = int(cy.max()) + 1 if len(cy) else 1
+        keys = cy * self.nx + cx
+        order = np.argsort(keys, kind="stable")
+
+        self.keys = keys[order]
+        self.ids = np.asarray(ids)[order]
+        self.lats = lats[order]
+        self.lons = lons[order]
+        # Radians and cos(lat) for the distance check, computed once.
+        self._rlat = np.radians(self.lats)
+        self._rlon = np.radians(self.lons)
+        self._coslat = np.cos(self._rlat)
+        self.attrs = {k: np.asarray(v, dtype=np.float64)[order] for k, v in (attrs or {}).items()}
+        if cities is not None:
+            names, codes = np.unique(np.asarray(cities, dtype=object).astype(str), return_inverse=True)
+            self.city_names = names
+            self.city_codes = codes[order].astype(np.int32)
+        else:
+            self.city_names, self.city_codes = np.array([], dtype=str), None
+
+    def __len__(self):
+        return len(self.ids)
+
+    # -- candidate gathering -------------------------------------------------
+
+    def _cells(self, x_lo, x_hi, y_lo, y_hi):
+        """
+        Row positions of every point in the cells overlapping a plane rectangle.
+        """
+        cx0 = max(0, int((x_lo - self.x0) // self.cell_km))
+        cx1 = min(self.nx - 1, int((x_hi - self.x0) // self.cell_km))
+        cy0 = max(0, int((y_lo - self.y0) // self.cell_km))
+        cy1 = min(self.ny - 1, int((y_hi - self.y0) // self.cell_km))
+        if cx0 > cx1 or cy0 > cy1:
+            return np.empty(0, dtype=np.int64)
+        rows = np.arange(cy0, cy1 + 1, dtype=np.int64) * self.nx
+        starts = np.searchsorted(self.keys, rows + cx0, side="left")
+        ends = np.searchsorted(self.keys, rows + cx1, side="right")
+        spans = [np.arange(s, e) for s, e in zip(starts, ends) if e > s]
+        return np.concatenate(spans) if spans else np.empty(0, dtype=np.int64)
+
+    def _filter(self, pos, where):
+        """
+        Keep positions whose attributes pass `where`: {field: value | (min, max)},
+        None bounds are open; "city" takes a name or list of names.
+        """
+        if not where or not len(pos):
+            return pos
+        mask = np.ones(len(pos), dtype=bool)
+        for field, cond in where.items():
+            if field == "city":
+                if self.city_codes is None:
+                    continue
+                wanted = {c.lower() for c in ([cond] if isinstance(cond, str) else cond)}
+                codes = [i for i, name in enumerate(self.city_names) if name.lower() in wanted]
+                mask &= np.isin(self.city_codes[pos], codes)
+                continue
+            col = self.attrs.get(field)
+            if col is None:
+                raise KeyError(f"Unknown filter field: {field}")
+            vals = col[pos]
+            if isinstance(cond, tuple):
+                lo, hi = cond
+                if lo is not None:
+                    mask &= vals >= lo
+                if hi is not None:
+                    mask &= vals <= hi
+            else:
+                mask &= vals == cond
+        return pos[mask]
+
+    def _distances(self, lat, lon, pos):
+        """
+        haversine_km() to the points at pos, using the precomputed terms.
+        """
+        rlat, rlon = np.radians(lat), np.radians(lon)
+        a = (np.sin((self._rlat[pos] - rlat) / 2) ** 2
+             + np.cos(rlat) * self._coslat[pos] * np.sin((self._rlon[pos] - rlon) / 2) ** 2)
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    # -- queries -------------------------------------------------------------
+
+    def radius(self, lat, lon, km, where=None, sort=True):
+        """
+        Positions within km of (lat, lon), nearest first. Returns (pos, dist_km).
+        """
+        x, y = lon * self.kx, lat * KM_PER_DEG
+        # Plane x is scaled for lat0; a km of longitude spans more of it nearer the pole.
+        far_lat = min(89.0, abs(lat) + km / KM_PER_DEG)
+        pad_x = km * self.kx / (KM_PER_DEG * np.cos(np.radians(far_lat))) * 1.01
+        pad_y = km * 1.01
+        pos = self._filter(self._cells(x - pad_x, x + pad_x, y - pad_y, y + pad_y), where)
+        dist = self._distances(lat, lon, pos)
+        keep = dist <= km
+        pos, dist = pos[keep], dist[keep]
+        if sort:
+            order = np.argsort(dist, kind="stable")
+            pos, dist = pos[order], dist[order]
+        return pos, dist
+
+    def bbox(self, south, west, north, east, where=None):
+        """
+        Positions inside a latitude/longitude box.
+        """
+        pos = self._cells(west * self.kx, east * self.kx, south * KM_PER_DEG, north * KM_PER_DEG)
+        lat, lon = self.lats[pos], self.lons[pos]
+        pos = pos[(lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)]
+        return self._filter(pos, where)
+
+    def nearest(self, lat, lon, k=10, where=None, max_km=None):
+        """
+        The k nearest positions passing `where`. The search radius doubles
+        from one cell until k hits are in range, so results are exact.
+        Returns (pos, dist_km).
+        """
+        limit = np.hypot(self.nx, self.ny) * self.cell_km if max_km is None else max_km
+        r = self.cell_km
+        while r < limit:
+            pos, dist = self.radius(lat, lon, r, where)
+            if len(pos) >= k:
+                return pos[:k], dist[:k]
+            r *= 2
+        if max_km is not None:
+            pos, dist = self.radius(lat, lon, max_km, where)
+            return pos[:k], dist[:k]
+        # Query point far from the data (or too few matches): check everything.
+        pos = self._filter(np.arange(len(self.ids)), where)
+        dist = self._distances(lat, lon, pos)
+        order = np.argsort(dist, kind="stable")[:k]
+        return pos[order], dist[order]
+
+    def city_center(self, name):
+        """
+        Median coordinates of a city's properties, or None if unknown.
+        """
+        if self.city_codes is None:
+            return None
+        hits = [i for i, c in enumerate(self.city_names) if c.lower() == name.lower()]
+        if not hits:
+            return None
+        mask = np.isin(self.city_codes, hits)
+        return float(np.median(self.lats[mask])), float(np.median(self.lons[mask]))
+
+    # -- persistence ---------------------------------------------------------
+
+    def save(self, path=INDEX_PATH):
+        arrays = {"ids": self.ids, "lats": self.lats, "lons": self.lons, "cell_km": np.array(self.cell_km),
+                  "city_names": self.city_names.astype(str)}
+        if self.city_codes is not None:
+            arrays["city_codes"] = self.city_codes
+        arrays.update({f"attr_{k}": v for k, v in self.attrs.items()})
+        np.savez(path, **arrays)
+
+
+def load_spatial_index(path=INDEX_PATH):
+    """
+    The index saved at path, or None when it has not been built yet.
+    """
+    if not os.path.exists(path):
+        return None
+    data = np.load(path, allow_pickle=False)
+    attrs = {k[5:]: data[k] for k in data.files if k.startswith("attr_")}
+    names = data["city_names"]
+    cities = names[data["city_codes"]] if "city_codes" in data.files else None
+    return SpatialIndex(data["ids"], data["lats"], data["lons"], attrs, cities, float(data["cell_km"]))
+
+
+def build_from_documents(docs, cell_km=CELL_KM):
+    """
+    Index cleaned documents that have coordinates (0/0 means missing).
+    """
+    ids, lats, lons, cities = [], [], [], []
+    attrs = {f: [] for f in FILTER_FIELDS}
+    for d in docs:
+        lat, lon = d.get("latitude") or 0, d.get("longitude") or 0
+        if not d.get("zpid") or not lat or not lon:
+            continue
+        ids.append(int(d["zpid"]))
+        lats.append(lat)
+        lons.append(lon)
+        cities.append(d.get("city") or "Unknown")
+        for f in FILTER_FIELDS:
+            attrs[f].append(d.get(f) or 0)
+    return SpatialIndex(np.array(ids, dtype=np.int64), lats, lons, attrs, cities, cell_km)
+
+
+# -- message parsing ----------------------------------------------------------
+
+
+def locate(place, index=None):
+    """
+    (lat, lon) for "35.91, -79.05", a known landmark or (with index) a city
+    in the index.
+    """
+    m = _LATLON_RE.search(place)
+    if m:
+        return float(m.group(1)), float(m.group(2))
+    low = re.sub(r"^the\s+", "", re.sub(r"\s+", " ", place.lower()).strip(" ."))
+    for name in sorted(LANDMARKS, key=len, reverse=True):
+        if re.search(r"\b" + re.escape(name) + r"\b", low):
+            return LANDMARKS[name]
+    if index is not None:
+        city = re.split(r",", low)[0].strip()
+        return index.city_center(city)
+    return None
+
+
+def parse_spatial(message, index=None):
+    """
+    SpatialFocus for "within 2 miles of X", "3 km from X", "near X" or
+    "walking distance to X" when X can be located; None otherwise. Without
+    an explicit distance only coordinates and landmarks count as anchors:
+    "near Durham" or "around Raleigh" means the whole city, not a small
+    circle around its median listing, and is left to the city filters.
+    """
+    m = _WITHIN_RE.search(message)
+    if m:
+        amount, unit, anchor = float(m.group(1)), m.group(2).lower(), m.group(3)
+        radius = amount * (KM_PER_MILE if unit.startswith("mi") else 1.0)
+        point = locate(anchor, index)
+    else:
+        m = _NEAR_RE.search(message)
+        if not m:
+            return None
+        anchor = m.group(2)
+        radius = WALKING_RADIUS_KM if m.group(1).lower().startswith("walking") else NEAR_RADIUS_KM
+        point = locate(anchor)
+    if point is None:
+        return None
+    return SpatialFocus(point[0], point[1], radius, anchor.strip())
+
+
+def focus_from_text(text, index=None, default_km=NEAR_RADIUS_KM):
+    """
+    SpatialFocus for a map focus string: a distance phrase, or just a place
+    ("Chapel Hill", "35.91,-79.05") searched within default_km.
+    """
+    focus = parse_spatial(text, index)
+    if focus is not None:
+        return focus
+    point = locate(text, index)
+    return SpatialFocus(point[0], point[1], default_km, text.strip()) if point else None
+
+
+def spatial_filter(index, focus, where=None):
+    """
+    Pinecone metadata filter restricting a query to the focus circle, and
+    the zpids inside it. Small sets become a zpid $in filter; larger ones a
+    latitude/longitude box (callers drop matches outside the zpid set).
+    """
+    pos, _ = index.radius(focus.lat, focus.lon, focus.radius_km, where)
+    zpids = index.ids[pos]
+    if len(zpids) and len(zpids) <= MAX_IN_FILTER:
+        return {"zpid": {"$in": [int(z) for z in zpids]}}, zpids
+    dlat = focus.radius_km / KM_PER_DEG
+    dlon = focus.radius_km / (KM_PER_DEG * np.cos(np.radians(focus.lat)))
+    box = {"latitude": {"$gte": focus.lat - dlat, "$lte": focus.lat + dlat},
+           "longitude": {"$gte": focus.lon - dlon, "$lte": focus.lon + dlon}}
+    return box, zpids
+
+
+def _parse_where(items):
+    """
+    ["bedrooms=3:", "price=:500000", "city=Durham"] -> where dict.
+    """
+    where = {}
+    for item in items or []:
+        field, _, value = item.partition("=")
+        if field == "city":
+            where[field] = value
+        elif ":" in value:
+            lo, _, hi = value.partition(":")
+            where[field] = (float(lo) if lo else None, float(hi) if hi else None)
+        else:
+            where[field] = float(value)
+    return where
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Grid spatial index over property coordinates.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_build = sub.add_parser("build", help="index every document in the property store")
+    p_build.add_argument("--store-path", default=None)
+    p_build.add_argument("--output", default=str(INDEX_PATH))
+    p_build.add_argument("--cell-km", type=float, default=CELL_KM)
+    p_query = sub.add_parser("query", help="run a radius query parsed from a message")
+    p_query.add_argument("message")
+    p_query.add_argument("--where", nargs="*", help="field=value or field=min:max")
+    p_query.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+    try:
+        if args.command == "build":
+            from property_store import PropertyStore, STORE_PATH
+            store = PropertyStore(args.store_path or STORE_PATH)
+            t0 = time.perf_counter()
+            idx = build_from_documents(store.iter_documents(), args.cell_km)
+            idx.save(args.output)
+            logging.info("Indexed %d properties in %.1fs (%dx%d cells of %.2f km) -> %s",
+                         len(idx), time.perf_counter() - t0, idx.nx, idx.ny, idx.cell_km, args.output)
+        else:
+            idx = load_spatial_index()
+            if idx is None:
+                print(f"No spatial index at {INDEX_PATH}; run `python spatial_index.py build` first.")
+                sys.exit(1)
+            focus = parse_spatial(args.message, idx)
+            if focus is None:
+                print("No locatable place in the message.")
+                sys.exit(1)
+            t0 = time.perf_counter()
+            pos, dist = idx.radius(focus.lat, focus.lon, focus.radius_km, _parse_where(args.where))
+            elapsed = (time.perf_counter() - t0) * 1e6
+            print(f"{focus.anchor!r} -> ({focus.lat:.4f}, {focus.lon:.4f}), radius {focus.radius_km:.2f} km: "
+                  f"{len(pos)} properties in {elapsed:.0f} µs")
+            for p, d in zip(pos[:args.limit], dist[:args.limit]):
+                print(f"  zpid {idx.ids[p]}  {d:.2f} km  ${idx.attrs['price'][p]:,.0f}  "
+                      f"{idx.attrs['bedrooms'][p]:.0f} bd")
+    except Exception as err:
+        logging.error("Spatial index command failed: %s", err)
+        sys.exit(1)
@@ -0,0 +1,354 @@
+"""
+Content-hashed on-disk memoization for the notebook's pipeline stages.
+
+    cache = StageCache()
+    df_raw = cache.run("load", load_zillow, zillow25)
+    df = cache.run("clean", clean_records, df_raw)
+
+Each result is pickled to CACHE_DIR/<stage>-<key>.pkl, where the key hashes:
+
+- the stage function's code: the whole module file for functions imported
+  from a .py file, bytecode and constants for notebook-defined ones, plus
+  the source of every repo module they reach (functions and modules
+  referenced by name, transitively through each module's imports);
+- every argument: DataFrames / Series / arrays by content, paths of existing
+  files by size and mtime, other values by their pickle;
+- for an argument that is the output of an earlier stage, that stage's key
+  instead of its content, so downstream stages are invalidated automatically
+  when anything upstream changes (and large frames are not re-hashed). An
+  output whose shape or columns changed since is hashed by content instead.
+
+Files are touched on every hit; once the cache passes max_bytes the least
+recently used files are deleted. invalidate(stage) drops a stage and every
+stage recorded downstream of it. STAGE_CACHE=0 disables caching.
+
+    python stage_cache.py report          # cached stages and sizes
+    python stage_cache.py clear [stage]   # drop everything, or one stage + dependents
+"""
+import os
+import sys
+import json
+import time
+import pickle
+import hashlib
+import logging
+import argparse
+import types
+from pathlib import Path
+
+import numpy as np
+
+CACHE_DIR = Path(os.getenv("STAGE_CACHE_DIR", Path(__file__).resolve().parent / "stage_cache"))
+MAX_BYTES = int(float(os.getenv("STAGE_CACHE_MAX_MB", "2048")) * 1e6)
+ENABLED = os.getenv("STAGE_CACHE", "1") != "0"
+GRAPH_FILE = "graph.json"
+
+
+# Source files under here count as pipeline code; installed packages do not.
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+
+def _repo_file(obj):
+    """
+    The repo .py file defining obj (a module, or a function/class by its
+    module), or None for builtins, installed packages and __main__.
+    """
+    module = obj if isinstance(obj, types.ModuleType) else sys.modules.get(getattr(obj, "__module__", None) or "")
+    path = getattr(module, "__file__", None)
+    if not module or module.__name__ == "__main__" or not path or not path.endswith(".py"):
+        return None
+    path = Path(path).resolve()
+    if REPO_ROOT not in path.parents or {"site-packages", ".venv", "node_modules"} & set(path.parts):
+        return None
+    return module, path
+
+
+def _module_fingerprint(module, path, h, seen):
+    # A module's file plus, transitively, every repo module it imports or
+    # takes names from, so editing any helper a stage reaches changes its key.
+    if path in seen:
+        return
+    seen.add(path)
+    with open(path, "rb") as f:
+        h.update(str(path.relative_to(REPO_ROOT)).encode())
+        h.update(f.read())
+    for value in list(vars(module).values()):
+        found = _repo_file(value)
+        if found is not None:
+            _module_fingerprint(found[0], found[1], h, seen)
+
+
+def _code_fingerprint(fn, h, seen=None):
+    seen = set() if seen is None else seen
+    found = _repo_file(fn)
+    if found is not None:
+        _module_fingerprint(found[0], found[1], h, seen)
+        h.update(getattr(fn, "__qualname__", "").encode())
+        return
+    code = getattr(fn, "__code__", None)
+    if code is None:
+        h.update(repr(fn).encode())
+        return
+    # Notebook-defined function: its bytecode and constants, plus the notebook
+    # functions it calls by name (safe_int, ...) and the source of every repo
+    # module or function it references (compact_frame, grid_engine, ...).
+    seen.add(fn)
+    module_name = getattr(fn, "__module__", None) or ""
+    stack = [code]
+    while stack:
+        c = stack.pop()
+        h.update(c.co_code)
+        h.update(repr(c.co_names).encode())
+        for const in c.co_consts:
+            if hasattr(const, "co_code"):
+                stack.append(const)
+            else:
+                h.update(repr(const).encode())
+        for name in c.co_names:
+            helper = getattr(fn, "__globals__", {}).get(name)
+            found = _repo_file(helper) if helper is not None else None
+            if found is not None:
+                _module_fingerprint(found[0], found[1], h, seen)
+            elif (callable(helper) and hasattr(helper, "__code__") and helper not in seen
+                    and getattr(helper, "__module__", None) == module_name):
+                _code_fingerprint(helper, h, seen)
+
+
+def _signature(value):
+    # Cheap structural check that an earlier stage's output was not reshaped
+    # since (columns added in place, ...); edits to existing values are not seen.
+    shape = getattr(value, "shape", None)
+    columns = getattr(value, "columns", None)
+    return type(value).__name__, shape, tuple(map(str, columns)) if columns is not None else None
+
+
+class StageCache:
+    """
+    Stage results on disk, keyed by code + inputs, LRU-capped at max_bytes.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=MAX_BYTES, enabled=ENABLED):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        # stage -> (latest output, its key, its signature); lets downstream
+        # stages hash an unchanged upstream output by key.
+        self._outputs = {}
+        self.log = []
+
+    # -- fingerprints -------------------------------------------------------------
+
+    def _upstream(self, value):
+        if value is None or isinstance(value, (bool, int, float, str, bytes)):
+            return None
+        for name, (out, key, signature) in self._outputs.items():
+            if out is value and _signature(value) == signature:
+                return name, key
+        return None
+
+    def _fingerprint(self, value, h, upstream):
+        import pandas as pd
+
+        found = self._upstream(value)
+        if found is not None:
+            upstream.add(found[0])
+            h.update(f"stage:{found[0]}:{found[1]}".encode())
+        elif isinstance(value, (pd.DataFrame, pd.Series)):
+            h.update(b"pandas")
+            h.update(repr(list(value.columns) if isinstance(value, pd.DataFrame) else value.name).encode())
+            h.update(repr(list(value.dtypes.astype(str)) if isinstance(value, pd.DataFrame)
+                          else str(value.dtype)).encode())
+            try:
+                h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+            except TypeError:
+                # Unhashable cells (dicts, lists) fall back to the pickle.
+                h.update(pickle.dumps(value))
+        elif isinstance(value, np.ndarray):
+            h.update(f"ndarray:{value.dtype}:{value.shape}".encode())
+            h.update(pickle.dumps(value) if value.dtype == object else np.ascontiguousarray(value).tobytes())
+        elif isinstance(value, (str, Path)) and os.path.isfile(value):
+            st = os.stat(value)
+            h.update(f"file:{os.path.abspath(value)}:{st.st_size}:{st.st_mtime_ns}".encode())
+        elif isinstance(value, (list, tuple)):
+            h.update(f"{type(value).__name__}:{len(value)}".encode())
+            for v in value:
+                self._fingerprint(v, h, upstream)
+        elif isinstance(value, dict):
+            h.update(f"dict:{len(value)}".encode())
+            for k in sorted(value, key=repr):
+                h.update(repr(k).encode())
+                self._fingerprint(value[k], h, upstream)
+        elif callable(value):
+            _code_fingerprint(value, h)
+        else:
+            try:
+                h.update(pickle.dumps(value))
+            except (pickle.PicklingError, TypeError, AttributeError):
+                h.update(repr(value).encode())
+
+    def key(self, fn, args=(), kwargs=None):
+        """
+        (hex key, upstream stage names) for calling fn(*args, **kwargs).
+        """
+        h = hashlib.sha1()
+        upstream = set()
+        _code_fingerprint(fn, h)
+        self._fingerprint(list(args), h, upstream)
+        self._fingerprint(dict(kwargs or {}), h, upstream)
+        return h.hexdigest()[:20], upstream
+
+    # -- storage --------------------------------------------------------------------
+
+    def _path(self, stage, key):
+        return self.root / f"{stage}-{key}.pkl"
+
+    def _entries(self):
+        return [p for p in self.root.glob("*.pkl")] if self.root.exists() else []
+
+    def _load_graph(self):
+        try:
+            with open(self.root / GRAPH_FILE, encoding="utf8") as f:
+                return {k: set(v) for k, v in json.load(f).items()}
+        except (OSError, ValueError):
+            return {}
+
+    def _record_edges(self, stage, upstream):
+        graph = self._load_graph()
+        if graph.get(stage) == upstream:
+            return
+        graph[stage] = upstream
+        tmp = self.root / (GRAPH_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf8") as f:
+            json.dump({k: sorted(v) for k, v in graph.items()}, f)
+        os.replace(tmp, self.root / GRAPH_FILE)
+
+    def evict(self, keep=None):
+        """
+        Delete least recently used files until the cache fits max_bytes.
+        """
+        entries = sorted(self._entries(), key=lambda p: p.stat().st_mtime)
+        total = sum(p.stat().st_size for p in entries)
+        for p in entries:
+            if total <= self.max_bytes:
+                break
+            if keep is not None and p == keep:
+                continue
+            total -= p.stat().st_size
+            p.unlink(missing_ok=True)
+            logging.info("Stage cache evicted %s", p.name)
+
+    def run(self, stage, fn, *args, **kwargs):
+        """
+        fn(*args, **kwargs), or its cached result for the same code and inputs.
+        """
+        t0 = time.perf_counter()
+        if not self.enabled:
+            value = fn(*args, **kwargs)
+            self.log.append((stage, "off", time.perf_counter() - t0))
+            return value
+        key, upstream = self.key(fn, args, kwargs)
+        path = self._path(stage, key)
+        if path.exists():
+            try:
+                with open(path, "rb") as f:
+                    value = pickle.load(f)
+                os.utime(path)
+                self._outputs[stage] = (value, key, _signature(value))
+                self.log.append((stage, "hit", time.perf_counter() - t0))
+                logging.info("Stage %s: cache hit (%.2fs)", stage, time.perf_counter() - t0)
+                return value
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as err:
+                logging.warning("Stage %s: unreadable cache entry %s (%s); recomputing.", stage, path.name, err)
+        value = fn(*args, **kwargs)
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+            self._record_edges(stage, upstream)
+            self.evict(keep=path)
+        except (OSError, pickle.PicklingError, TypeError, AttributeError) as err:
+            tmp.unlink(missing_ok=True)
+            logging.warning("Stage %s: result not cached (%s).", stage, err)
+        self._outputs[stage] = (value, key, _signature(value))
+        self.log.append((stage, "miss", time.perf_counter() - t0))
+        logging.info("Stage %s: computed in %.2fs", stage, time.perf_counter() - t0)
+        return value
+
+    def stage(self, name):
+        """
+        Decorator form of run(): @cache.stage("clean").
+        """
+        def wrap(fn):
+            def cached(*args, **kwargs):
+                return self.run(name, fn, *args, **kwargs)
+            cached.__wrapped__ = fn
+            return cached
+        return wrap
+
+    def downstream(self, stage):
+        """
+        stage and every stage that (transitively) consumed its output.
+        """
+        graph = self._load_graph()
+        found, frontier = {stage}, [stage]
+        while frontier:
+            current = frontier.pop()
+            for name, ups in graph.items():
+                if current in ups and name not in found:
+                    found.add(name)
+                    frontier.append(name)
+        return found
+
+    def invalidate(self, stage=None):
+        """
+        Drop one stage and its dependents, or everything when stage is None.
+        """
+        names = None if stage is None else self.downstream(stage)
+        removed = 0
+        for p in self._entries():
+            if names is None or p.name.rsplit("-", 1)[0] in names:
+                p.unlink(missing_ok=True)
+                removed += 1
+        for name in (names or list(self._outputs)):
+            self._outputs.pop(name, None)
+        return removed
+
+    def report(self):
+        """
+        Per-stage cached files and MB, plus this session's hits/misses.
+        """
+        by_stage = {}
+        for p in self._entries():
+            files, size = by_stage.get(p.name.rsplit("-", 1)[0], (0, 0))
+            by_stage[p.name.rsplit("-", 1)[0]] = (files + 1, size + p.stat().st_size)
+        lines = [f"{'stage':<14} {'files':>5} {'MB':>8}"]
+        for name, (files, size) in sorted(by_stage.items()):
+            lines.append(f"{name:<14} {files:>5} {size / 1e6:>8.1f}")
+        total = sum(size for _, size in by_stage.values())
+        lines.append(f"{'TOTAL':<14} {sum(f for f, _ in by_stage.values()):>5} {total / 1e6:>8.1f}"
+                     f"   (cap {self.max_bytes / 1e6:,.0f} MB)")
+        if self.log:
+            lines.append("")
+            lines.extend(f"{name:<14} {status:>5} {secs:>8.2f}s" for name, status, secs in self.log)
+        return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Notebook stage cache maintenance.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("report", help="cached stages and sizes")
+    p_clear = sub.add_parser("clear", help="drop cached results")
+    p_clear.add_argument("stage", nargs="?", help="only this stage and its dependents")
+    args = parser.parse_args()
+    try:
+        cache = StageCache()
+        if args.command == "report":
+            print(cache.report())
+        else:
+            print(f"Removed {cache.invalidate(args.stage)} cached results.")
+    except Exception as err:
+        logging.error("Stage cache command failed: %s", err)
+        sys.exit(1)
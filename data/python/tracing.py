@@ -0,0 +1,292 @@
+"""
+Per-turn tracing for the EstateWise chatbot.
+
+Each chat turn is one trace: a root span plus child spans for every LLM call,
+embedding, vector query and clustering step. Spans carry attributes such as
+token counts, cache hits and which fallback path ran. Finished traces go to
+one or more exporters: JSON lines (a file or stderr), an in-memory buffer
+(bench_chat.py), or OpenTelemetry when the SDK is installed.
+
+Spans are plain objects timed with time_ns and parented through a
+ContextVar, so they follow copy_context() into worker threads. Turns that are
+not sampled (or when no exporter is configured) get a shared no-op span, so
+leaving the instrumentation in place costs a ContextVar read per call site.
+
+Configure from the environment with tracer_from_env():
+
+    ESTATEWISE_TRACE=traces.jsonl   # or "stderr", "otel", "off" (default)
+    ESTATEWISE_TRACE_SAMPLE=0.1     # fraction of turns traced (default 1.0)
+"""
+import contextvars
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+
+from conversation_memory import estimate_tokens
+
+_current = contextvars.ContextVar("estatewise_span", default=None)
+
+
+class _NoopSpan:
+    """
+    Shared stand-in for spans that are not recorded.
+    """
+
+    recording = False
+
+    def set(self, **attrs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def to_dict(self):
+        root = self.spans[0]
+        stages = {}
+        tokens = {"in": 0, "out": 0}
+        for s in self.spans[1:]:
+            stages[s.name] = stages.get(s.name, 0.0) + s.duration_ms
+            tokens["in"] += s.attrs.get("tokens_in", 0)
+            tokens["out"] += s.attrs.get("tokens_out", 0)
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "start": root.start_ns / 1e9,
+            "duration_ms": root.duration_ms,
+            "attrs": root.attrs,
+            "stages_ms": stages,
+            "tokens": tokens,
+            "spans": [s.to_dict(root.start_ns) for s in self.spans],
+        }
+
+
+class Span:
+    recording = True
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attrs", "start_ns", "end_ns", "_token")
+
+    def __init__(self, trace, name, parent_id=None, attrs=None):
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = dict(attrs or {})
+        self.start_ns = None
+        self.end_ns = None
+        self._token = None
+
+    @property
+    def duration_ms(self):
+        if self.start_ns is None or self.end_ns is None:
+            return 0.0
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def __enter__(self):
+        self.start_ns = time.time_ns()
+        with self.trace.lock:
+            self.trace.spans.append(self)
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        if exc is not None:
+            self.attrs["error"] = f"{exc_type.__name__}: {exc}"
+        _current.reset(self._token)
+        if self.parent_id is None:
+            self.trace.tracer.export(self.trace)
+        return False
+
+    def to_dict(self, origin_ns):
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_offset_ms": (self.start_ns - origin_ns) / 1e6,
+            "duration_ms": self.duration_ms,
+            "attrs": self.attrs,
+        }
+
+
+class Tracer:
+    """
+    Starts per-turn traces and hands finished ones to the exporters.
+    """
+
+    def __init__(self, exporters=None, sample_rate=1.0):
+        self.exporters = list(exporters or [])
+        self.sample_rate = sample_rate
+
+    @property
+    def enabled(self):
+        return bool(self.exporters) and self.sample_rate > 0
+
+    def turn(self, name="chat.turn", **attrs):
+        """
+        Root span for one chat turn (no-op when disabled or not sampled).
+        """
+        if not self.enabled or (self.sample_rate < 1.0 and random.random() >= self.sample_rate):
+            return NOOP_SPAN
+        return Span(Trace(self, name), name, None, attrs)
+
+    def export(self, trace):
+        for exporter in self.exporters:
+            try:
+                exporter.export(trace)
+            except Exception as e:
+                logging.warning("Trace export via %s failed: %s", type(exporter).__name__, e)
+
+
+def current_span():
+    return _current.get() or NOOP_SPAN
+
+
+def span(name, **attrs):
+    """
+    Child span of the current span, or the no-op span outside a traced turn.
+    """
+    parent = _current.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(parent.trace, name, parent.span_id, attrs)
+
+
+def record_tokens(sp, prompt, response_text, response=None):
+    """
+    Put token counts on a span: Gemini's usage_metadata when the response has
+    it, otherwise a chars/4 estimate (flagged with tokens_estimated).
+    """
+    if not sp.recording:
+        return
+    usage = getattr(response, "usage_metadata", None)
+    tokens_in = getattr(usage, "prompt_token_count", None)
+    tokens_out = getattr(usage, "candidates_token_count", None)
+    if tokens_in is None or tokens_out is None:
+        sp.set(tokens_in=estimate_tokens(prompt), tokens_out=estimate_tokens(response_text or ""),
+               tokens_estimated=True)
+    else:
+        sp.set(tokens_in=tokens_in, tokens_out=tokens_out)
+
+
+# -- exporters --------------------------------------------------------------
+
+
+class JsonLinesExporter:
+    """
+    One JSON object per finished turn, appended to a file path or stream.
+    """
+
+    def __init__(self, target):
+        self.lock = threading.Lock()
+        if hasattr(target, "write"):
+            self.stream, self.owned = target, False
+        else:
+            self.stream, self.owned = open(target, "a", encoding="utf-8"), True
+
+    def export(self, trace):
+        line = json.dumps(trace.to_dict(), default=str)
+        with self.lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+    def close(self):
+        if self.owned:
+            self.stream.close()
+
+
+class InMemoryExporter:
+    """
+    Keeps the last max_traces finished traces as dicts.
+    """
+
+    def __init__(self, max_traces=10000):
+        self.traces = deque(maxlen=max_traces)
+        self.lock = threading.Lock()
+
+    def export(self, trace):
+        with self.lock:
+            self.traces.append(trace.to_dict())
+
+    def drain(self):
+        with self.lock:
+            out = list(self.traces)
+            self.traces.clear()
+        return out
+
+
+def _otel_value(v):
+    if isinstance(v, (str, bool, int, float)):
+        return v
+    if isinstance(v, (list, tuple)) and all(isinstance(x, str) for x in v):
+        return list(v)
+    return json.dumps(v, default=str)
+
+
+class OTelExporter:
+    """
+    Replays finished traces into the OpenTelemetry SDK so any configured OTel
+    exporter (OTLP, Jaeger, console, ...) receives them. Requires the
+    opentelemetry-api/-sdk packages and a TracerProvider set up by the caller.
+    """
+
+    def __init__(self, name="estatewise.chat"):
+        from opentelemetry import trace as otel_trace
+
+        self._otel = otel_trace
+        self._tracer = otel_trace.get_tracer(name)
+
+    def export(self, trace):
+        started = {}
+        for s in sorted(trace.spans, key=lambda s: s.start_ns):
+            parent = started.get(s.parent_id)
+            ctx = self._otel.set_span_in_context(parent) if parent is not None else None
+            otel_span = self._tracer.start_span(
+                s.name, context=ctx, start_time=s.start_ns,
+                attributes={k: _otel_value(v) for k, v in s.attrs.items() if v is not None},
+            )
+            started[s.span_id] = otel_span
+        for s in trace.spans:
+            started[s.span_id].end(end_time=s.end_ns)
+
+
+def tracer_from_env():
+    """
+    Tracer configured by ESTATEWISE_TRACE / ESTATEWISE_TRACE_SAMPLE.
+    """
+    target = os.getenv("ESTATEWISE_TRACE", "off").strip()
+    sample = float(os.getenv("ESTATEWISE_TRACE_SAMPLE", "1.0"))
+    if not target or target.lower() in ("off", "0", "false", "none"):
+        return Tracer([], sample)
+    if target.lower() == "stderr":
+        return Tracer([JsonLinesExporter(sys.stderr)], sample)
+    if target.lower() == "otel":
+        try:
+            return Tracer([OTelExporter()], sample)
+        except ImportError:
+            logging.warning("ESTATEWISE_TRACE=otel but opentelemetry is not installed; tracing disabled.")
+            return Tracer([], sample)
+    return Tracer([JsonLinesExporter(target)], sample)
@@ -0,0 +1,274 @@
+"""
+Payload-aware, adaptive batching for Pinecone upserts.
+
+Vectors are grouped by serialized size so a request stays under the index's
+limit (2 MB / 1,000 vectors per upsert), and the vector-count target moves
+with observed latency: it grows while upserts come back fast and halves when
+they get slow or fail. Failed requests are retried with jittered exponential
+backoff. A batch rejected outright (a non-retryable client error, i.e. a bad
+record) is split in half and each half retried, down to single vectors; a
+batch still failing with a retryable error (throttling, outage) after its
+retries is dead-lettered whole, since splitting it would only multiply the
+waits. Dead-lettered vectors go to a JSONL file that replay_dead_letters()
+can resend later, so nothing is dropped silently. NamespacedBatcher keeps
+one AdaptiveBatcher per Pinecone namespace for sharded indexes.
+"""
+import json
+import logging
+import os
+import random
+import time
+from functools import partial
+from pathlib import Path
+
+from ingest_metrics import vector_bytes
+
+MAX_REQUEST_BYTES = 2 * 1024 * 1024
+MAX_REQUEST_VECTORS = 1000
+# Leave room for the request envelope and serializer differences.
+REQUEST_BYTES_HEADROOM = 0.9
+DEAD_LETTER_PATH = Path(os.getenv("UPSERT_DEAD_LETTER_PATH", Path(__file__).resolve().parent / "upsert_dead_letter.jsonl"))
+
+
+def is_retryable(exc):
+    """
+    Throttling, server errors and transport failures are worth retrying;
+    other client errors (bad payload, too large) are not.
+    """
+    status = getattr(exc, "status", None) or getattr(exc, "status_code", None)
+    if status is None:
+        return True
+    try:
+        status = int(status)
+    except (TypeError, ValueError):
+        return True
+    return status == 429 or status >= 500
+
+
+class AdaptiveBatcher:
+    """
+    Buffers vectors and sends them with send_fn(list_of_vectors) in batches
+    bounded by max_bytes and an adaptive vector-count target.
+    """
+
+    def __init__(self, send_fn, max_bytes=MAX_REQUEST_BYTES * REQUEST_BYTES_HEADROOM,
+                 initial_vectors=50, min_vectors=1, max_vectors=MAX_REQUEST_VECTORS,
+                 target_latency=1.0, max_retries=4, base_delay=0.5, max_delay=30.0,
+                 dead_letter_path=DEAD_LETTER_PATH, metrics=None, sleep=time.sleep, namespace=None):
+        self.send_fn = partial(send_fn, namespace=namespace) if namespace else send_fn
+        self.namespace = namespace
+        self.max_bytes = int(max_bytes)
+        self.target_vectors = initial_vectors
+        self.min_vectors = min_vectors
+        self.max_vectors = max_vectors
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.dead_letter_path = dead_letter_path
+        self.metrics = metrics
+        self.sleep = sleep
+        self.pending = []
+        self.pending_bytes = 0
+        self.sent = 0
+        self.dead_lettered = 0
+
+    def __len__(self):
+        return len(self.pending)
+
+    def _event(self, name, n=1):
+        if self.metrics:
+            self.metrics.event(name, n)
+
+    # -- buffering ----------------------------------------------------------
+
+    def add(self, vector):
+        size = vector_bytes(vector)
+        if size > self.max_bytes:
+            self._dead_letter([vector], f"vector is {size} bytes, over the {self.max_bytes} byte request budget")
+            return
+        if self.pending and self.pending_bytes + size > self.max_bytes:
+            self.flush()
+        self.pending.append((vector, size))
+        self.pending_bytes += size
+        if len(self.pending) >= self.target_vectors:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        batch, self.pending, self.pending_bytes = self.pending, [], 0
+        self._send([v for v, _ in batch], sum(s for _, s in batch))
+
+    # -- sending ------------------------------------------------------------
+
+    def _backoff(self, attempt):
+        # Full jitter: uniform in [0, min(cap, base * 2^attempt)].
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _send(self, vectors, nbytes):
+        error = None
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                self.send_fn(vectors)
+            except Exception as e:
+                error = e
+                if self.metrics:
+                    self.metrics.error("upsert")
+                self._shrink()
+                if not is_retryable(e) or attempt == self.max_retries:
+                    break
+                self._event("retry")
+                delay = self._backoff(attempt)
+                logging.warning("Upsert of %d vectors failed (%s); retry %d/%d in %.1fs.",
+                                len(vectors), e, attempt + 1, self.max_retries, delay)
+                self.sleep(delay)
+                continue
+            elapsed = time.perf_counter() - start
+            self.sent += len(vectors)
+            if self.metrics:
+                self.metrics.observe_upsert(elapsed, len(vectors), nbytes)
+            self._tune(elapsed)
+            return True
+
+        if len(vectors) > 1 and not is_retryable(error):
+            # Isolate the bad record(s): send each half on its own.
+            self._event("split")
+            mid = len(vectors) // 2
+            halves = (vectors[:mid], vectors[mid:])
+            logging.warning("Splitting failed batch of %d vectors into %d + %d.",
+                            len(vectors), len(halves[0]), len(halves[1]))
+            for half in halves:
+                self._send(half, sum(vector_bytes(v) for v in half))
+            return False
+        self._dead_letter(vectors, error)
+        return False
+
+    def _tune(self, elapsed):
+        if elapsed < self.target_latency * 0.5:
+            self.target_vectors = min(self.max_vectors, max(self.target_vectors + 1, int(self.target_vectors * 1.25)))
+        elif elapsed > self.target_latency:
+            self._shrink()
+
+    def _shrink(self):
+        self.target_vectors = max(self.min_vectors, self.target_vectors // 2)
+
+    def _dead_letter(self, vectors, error):
+        self.dead_lettered += len(vectors)
+        self._event("dead_letter", len(vectors))
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            for v in vectors:
+                record = {"vector": v, "error": str(error), "failed_at": time.time()}
+                if self.namespace:
+                    record["namespace"] = self.namespace
+                f.write(json.dumps(record) + "\n")
+        logging.error("Wrote %d vector(s) to dead-letter file %s: %s", len(vectors), self.dead_letter_path, error)
+
+
+class NamespacedBatcher:
+    """
+    One AdaptiveBatcher per namespace; send_fn is called as
+    send_fn(vectors, namespace=ns) for every namespace but the default ("").
+    """
+
+    def __init__(self, send_fn, **batcher_kwargs):
+        self.send_fn = send_fn
+        self.batcher_kwargs = batcher_kwargs
+        self.batchers = {}
+
+    def add(self, vector, namespace=""):
+        batcher = self.batchers.get(namespace)
+        if batcher is None:
+            batcher = AdaptiveBatcher(self.send_fn, namespace=namespace or None, **self.batcher_kwargs)
+            self.batchers[namespace] = batcher
+        batcher.add(vector)
+
+    def flush(self):
+        for batcher in self.batchers.values():
+            batcher.flush()
+
+    def __len__(self):
+        return sum(len(b) for b in self.batchers.values())
+
+    @property
+    def sent(self):
+        return sum(b.sent for b in self.batchers.values())
+
+    @property
+    def dead_lettered(self):
+        return sum(b.dead_lettered for b in self.batchers.values())
+
+
+def replay_dead_letters(path, send_fn, metrics=None, **batcher_kwargs):
+    """
+    Resend every vector in a dead-letter file. The file is replaced by the
+    records that fail again (removed when all succeed). Returns (replayed, failed).
+    """
+    if not os.path.exists(path):
+        logging.info("No dead-letter file at %s.", path)
+        return 0, 0
+    retry_path = f"{path}.retry"
+    if os.path.exists(retry_path):
+        os.remove(retry_path)
+    batcher = NamespacedBatcher(send_fn, dead_letter_path=retry_path, metrics=metrics, **batcher_kwargs)
+    total = 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            batcher.add(record["vector"], record.get("namespace", ""))
+            total += 1
+    batcher.flush()
+    if batcher.dead_lettered:
+        os.replace(retry_path, path)
+    else:
+        os.remove(path)
+    logging.info("Replayed %d dead-lettered vectors: %d written, %d still failing.",
+                 total, batcher.sent, batcher.dead_lettered)
+    return batcher.sent, batcher.dead_lettered
+
+
+# Vector ids per fetch when rewriting metadata (fetch ids travel in the URL).
+METADATA_FETCH_IDS = 100
+
+
+def _field(obj, name, default=None):
+    return obj.get(name, default) if isinstance(obj, dict) else getattr(obj, name, default)
+
+
+def rewrite_metadata(index, updates, fetch_ids=METADATA_FETCH_IDS, **batcher_kwargs):
+    """
+    Merge metadata fields into stored vectors in bulk. updates yields
+    (id, namespace, fields). Pinecone's update() changes one vector per
+    request, so instead fetch_ids vectors are fetched at a time and upserted
+    back with the merged metadata through a NamespacedBatcher (sized batches,
+    retries, dead letters): two requests per ~100 vectors rather than one per
+    vector. Returns (rewritten, missing) counts.
+    """
+    def send(vectors, namespace=None):
+        if namespace:
+            index.upsert(vectors=vectors, namespace=namespace)
+        else:
+            index.upsert(vectors=vectors)
+
+    by_namespace = {}
+    for vid, namespace, fields in updates:
+        by_namespace.setdefault(namespace or "", {})[str(vid)] = fields
+    batcher = NamespacedBatcher(send, initial_vectors=fetch_ids, **batcher_kwargs)
+    missing = 0
+    for namespace, fields_by_id in by_namespace.items():
+        ids = list(fields_by_id)
+        kwargs = {"namespace": namespace} if namespace else {}
+        for i in range(0, len(ids), fetch_ids):
+            chunk = ids[i:i + fetch_ids]
+            found = _field(index.fetch(ids=chunk, **kwargs), "vectors", {}) or {}
+            missing += len(chunk) - len(found)
+            for vid, v in found.items():
+                metadata = dict(_field(v, "metadata", None) or {})
+                metadata.update(fields_by_id[vid])
+                batcher.add({"id": vid, "values": list(_field(v, "values")), "metadata": metadata}, namespace)
+    batcher.flush()
+    return batcher.sent, missing
@@ -1,7 +1,9 @@
 import os
 import sys
 import json
+import time
 import logging
+import argparse
 import ijson
 from pathlib import Path
 from dotenv import load_dotenv
@@ -9,6 +11,15 @@ import google.generativeai as palm
 
 from utils import clean_document, create_metadata
 from pinecone_client import index
+from cluster_profiles import load_cluster_profiles, cluster_metadata
+from answer_cache import write_index_version
+from ingest_metrics import IngestMetrics
+from upsert_batcher import NamespacedBatcher, DEAD_LETTER_PATH, replay_dead_letters
+from namespaces import SHARDING_ENABLED, DEFAULT_NAMESPACE, namespace_for
+from property_store import PropertyStore, StoreWriter, STORE_PATH
+from spatial_index import INDEX_PATH as SPATIAL_INDEX_PATH, build_from_documents
+from dim_reduction import load_projection
+from derived_features import load_city_prices
 
 load_dotenv()
 
@@ -18,8 +29,20 @@ if not GOOGLE_AI_API_KEY:
     sys.exit(1)
 palm.configure(api_key=GOOGLE_AI_API_KEY)
 
-# Set the size of the batch for upserts.
+# Starting vector count per upsert; AdaptiveBatcher tunes it from observed
+# latency and always keeps requests under the Pinecone size limit.
 BATCH_SIZE = 50
+# Progress summary cadence and per-record log sampling (one record in LOG_EVERY).
+SUMMARY_INTERVAL = 30.0
+LOG_EVERY = 10000
+
+# Corpus cluster table from cluster_corpus.py; new listings join the existing clusters.
+CLUSTER_PROFILES = load_cluster_profiles()
+# Per-city price quantiles from derived_features.py, for cityPricePercentile.
+CITY_PRICES = load_city_prices()
+
+# Optional PCA/prefix projection (EMBEDDING_PROJECTION_PATH); the chatbot applies the same one to queries.
+PROJECTION = load_projection()
 
 
 def generate_embedding(text):
@@ -36,33 +59,56 @@ def generate_embedding(text):
     return response.embedding.values
 
 
-def upsert_batch(batch):
+def upsert_batch(batch, namespace=None):
     """
-    Upsert a batch of vectors to Pinecone using the real client.
+    Upsert a batch of vectors to Pinecone using the real client. Sizing,
+    retries and dead-lettering are handled by AdaptiveBatcher.
     """
-    logging.info(f"Upserting batch of {len(batch)} vectors to Pinecone.")
-    response = index.upsert(vectors=batch)
-    logging.info(f"Upsert response: {response}")
+    if namespace:
+        response = index.upsert(vectors=batch, namespace=namespace)
+    else:
+        response = index.upsert(vectors=batch)
+    logging.debug("Upserted batch of %d vectors to namespace %r: %s", len(batch), namespace or "", response)
 
 
-def process_file_streaming(file_path, vector_batch):
+def skip_reason(clean_doc):
+    """
+    Why a cleaned record cannot be indexed, or None if it can.
     """
-    Process the JSON file as a stream and add cleaned vector data to vector_batch.
+    addr = clean_doc.get("address", {})
+    if clean_doc["zpid"] == 0:
+        return "missing_zpid"
+    if clean_doc["city"] == "Unknown":
+        return "missing_city"
+    if clean_doc["state"] == "Unknown":
+        return "missing_state"
+    if addr.get("streetAddress", "Unknown") == "Unknown":
+        return "missing_street"
+    if addr.get("zipcode", "Unknown") == "Unknown":
+        return "missing_zip"
+    return None
+
+
+def process_file_streaming(file_path, batcher, metrics=None, store_writer=None, shard=False, slim=False):
     """
+    Process the JSON file as a stream and hand cleaned vector data to the batcher.
+    With store_writer, the full cleaned documents also go to the local property
+    store; with slim, vectors get slim metadata. With shard, each vector goes
+    to its state/metro namespace.
+    """
+    metrics = metrics or IngestMetrics()
     with open(file_path, "r", encoding="utf-8") as f:
         parser = ijson.items(f, "item")
         for doc in parser:
+            n = metrics.record_seen()
+            stage = "clean"
             try:
-                clean_doc = clean_document(doc)
-                addr = clean_doc.get("address", {})
-                if (
-                        clean_doc["city"] == "Unknown" or
-                        clean_doc["state"] == "Unknown" or
-                        addr.get("streetAddress", "Unknown") == "Unknown" or
-                        addr.get("zipcode", "Unknown") == "Unknown" or
-                        clean_doc["zpid"] == 0
-                ):
-                    logging.warning("Skipping record with missing fields: zpid=%s", clean_doc["zpid"])
+                clean_doc = clean_document(doc, CITY_PRICES)
+                reason = skip_reason(clean_doc)
+                if reason:
+                    metrics.skip(reason)
+                    if metrics.should_log(n):
+                        logging.warning("Skipping record with missing fields (%s): zpid=%s", reason, clean_doc["zpid"])
                     continue
 
                 text = (
@@ -73,28 +119,54 @@ def process_file_streaming(file_path, vector_batch):
                     f"Built in {clean_doc['yearBuilt']}. {clean_doc['description']}"
                 )
 
-                logging.info("Generating embedding for property at: %s", clean_doc['address']['streetAddress'])
+                if metrics.should_log(n):
+                    logging.info("Generating embedding for property at: %s (record %d)",
+                                 clean_doc['address']['streetAddress'], n)
+                stage = "embed"
+                start = time.perf_counter()
                 embedding = generate_embedding(text)
+                metrics.observe_embedding(time.perf_counter() - start)
+                if PROJECTION is not None:
+                    embedding = PROJECTION.apply_one(embedding)
+                stage = "metadata"
+
+                metadata = create_metadata(clean_doc, slim=slim)
+                if CLUSTER_PROFILES:
+                    metadata.update(cluster_metadata(clean_doc, CLUSTER_PROFILES))
 
                 vector = {
                     "id": str(clean_doc["zpid"]),
                     "values": embedding,
-                    "metadata": create_metadata(clean_doc)
+                    "metadata": metadata
                 }
-                vector_batch.append(vector)
-
-                if len(vector_batch) >= BATCH_SIZE:
-                    upsert_batch(vector_batch[:BATCH_SIZE])
-                    del vector_batch[:BATCH_SIZE]
+                if store_writer is not None:
+                    stage = "store"
+                    store_writer.add(clean_doc)
+                stage = "upsert"
+                namespace = namespace_for(clean_doc["state"], clean_doc["city"]) if shard else DEFAULT_NAMESPACE
+                batcher.add(vector, namespace)
             except Exception as e:
-                logging.error("Error processing record: %s", e)
+                metrics.error(stage)
+                if metrics.should_log(metrics.errors.get(stage, 1)):
+                    logging.error("Error processing record (%s): %s", stage, e)
+            finally:
+                metrics.maybe_report()
 
-    return vector_batch
+    return batcher
 
 
-def upsert_properties():
+def upsert_properties(metrics_file=None, summary_interval=SUMMARY_INTERVAL, log_every=LOG_EVERY,
+                      dead_letter_file=DEAD_LETTER_PATH, slim_metadata=False, store_path=STORE_PATH,
+                      shard_namespaces=SHARDING_ENABLED, property_store=True):
     """
     Process a series of JSON files, generate embeddings, and upsert the data into Pinecone.
+    Progress is logged every summary_interval seconds and, with metrics_file, written
+    as a Prometheus textfile. Vectors that cannot be upserted after retries are
+    appended to dead_letter_file. Full documents are written to the SQLite
+    store at store_path (the chatbot's zpid/address lookups and hydration read
+    it) unless property_store is off; with slim_metadata, vectors carry only
+    filterable scalars and the store is required. With shard_namespaces, vectors
+    are split into state/metro namespaces (see namespaces.py).
     """
     # List the JSON files to process. Adjust paths as needed.
     files = [
@@ -103,28 +175,67 @@ def upsert_properties():
         "Zillow-March2025-dataset_part2.json",
         "Zillow-March2025-dataset_part3.json",
     ]
-    vector_batch = []
+    metrics = IngestMetrics(summary_interval=summary_interval, textfile=metrics_file, log_every=log_every)
+    batcher = NamespacedBatcher(upsert_batch, initial_vectors=BATCH_SIZE, dead_letter_path=dead_letter_file,
+                                metrics=metrics)
+    store_writer = StoreWriter(PropertyStore(store_path)) if property_store or slim_metadata else None
 
     for file_name in files:
         file_path = Path(__file__).resolve().parent / file_name
         logging.info("Processing file: %s", file_path)
         try:
-            vector_batch = process_file_streaming(file_path, vector_batch)
+            process_file_streaming(file_path, batcher, metrics, store_writer, shard_namespaces, slim_metadata)
         except Exception as e:
+            metrics.error("file")
             logging.error("Error processing file %s: %s", file_name, e)
 
     # Upsert any remaining vectors.
-    if vector_batch:
-        upsert_batch(vector_batch)
+    if store_writer is not None:
+        store_writer.flush()
+        logging.info("Wrote %d documents to the property store at %s.", store_writer.written, store_path)
+        spatial = build_from_documents(store_writer.store.iter_documents())
+        spatial.save(SPATIAL_INDEX_PATH)
+        logging.info("Indexed %d property locations in %s.", len(spatial), SPATIAL_INDEX_PATH)
+    if len(batcher):
+        batcher.flush()
         logging.info("Upserted final batch of remaining vectors.")
+    metrics.report(final=True)
+    if batcher.dead_lettered:
+        logging.error("%d vectors could not be upserted; see %s and rerun with --replay-dead-letters.",
+                      batcher.dead_lettered, dead_letter_file)
 
+    # Invalidate chatbot answer caches built against the previous index contents.
+    logging.info("Stamped index version %s.", write_index_version())
     logging.info("Data upsert completed.")
 
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Embed cleaned listings and upsert them to Pinecone.")
+    parser.add_argument("--metrics-file", help="Prometheus textfile to rewrite with ingest metrics")
+    parser.add_argument("--summary-interval", type=float, default=SUMMARY_INTERVAL,
+                        help="seconds between progress summary lines")
+    parser.add_argument("--log-every", type=int, default=LOG_EVERY,
+                        help="log one per-record message in this many records")
+    parser.add_argument("--dead-letter-file", default=DEAD_LETTER_PATH,
+                        help="JSONL file for vectors that could not be upserted")
+    parser.add_argument("--replay-dead-letters", action="store_true",
+                        help="only resend the vectors in --dead-letter-file, then exit")
+    parser.add_argument("--slim-metadata", action="store_true",
+                        help="keep only filterable scalars in Pinecone; full documents go to the local property store")
+    parser.add_argument("--store-path", default=str(STORE_PATH), help="SQLite property store (zpid/address lookups)")
+    parser.add_argument("--no-property-store", dest="property_store", action="store_false",
+                        help="do not write the local property store (ignored with --slim-metadata)")
+    parser.add_argument("--shard-namespaces", action="store_true", default=SHARDING_ENABLED,
+                        help="put vectors in state/metro namespaces (default from PINECONE_NAMESPACE_SHARDING)")
+    args = parser.parse_args()
     try:
-        upsert_properties()
+        if args.replay_dead_letters:
+            replay_dead_letters(args.dead_letter_file, upsert_batch)
+            write_index_version()
+            sys.exit(0)
+        upsert_properties(args.metrics_file, args.summary_interval, args.log_every, args.dead_letter_file,
+                          args.slim_metadata, args.store_path, args.shard_namespaces, args.property_store)
     except Exception as err:
         logging.error("Error in upserting properties data: %s", err)
         sys.exit(1)
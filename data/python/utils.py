@@ -1,7 +1,15 @@
 import json
 import time
+from bisect import bisect_right
 from datetime import datetime
 
+# livingArea upper edges (sqft) of size buckets 1-3; bucket 4 is anything larger, 0 unknown.
+SIZE_BUCKET_EDGES = (1000, 2000, 3000)
+SIZE_BUCKET_LABELS = {0: "unknown", 1: "under 1,000 sqft", 2: "1,000-1,999 sqft", 3: "2,000-2,999 sqft",
+                      4: "3,000+ sqft"}
+# Derived numeric fields; stored in Mongo and vector metadata next to the cleaned fields.
+DERIVED_FIELDS = ["pricePerSqft", "age", "sizeBucket", "cityPricePercentile"]
+
 
 def safe_str(val, fallback="Unknown"):
     if isinstance(val, str) and val.strip():
@@ -19,14 +27,60 @@ def safe_num(val, fallback=0, min_val=None, max_val=None):
     return n
 
 
-def clean_document(doc):
+def city_key(city, state):
+    return f"{city}|{state}"
+
+
+def city_price_percentile(city, state, price, city_prices):
+    """
+    Share (0-100) of the city's priced listings at or below price, read from
+    the quantile table written by derived_features.py; -1 when unknown.
+    """
+    entry = (city_prices or {}).get("cities", {}).get(city_key(city, state))
+    if not entry or not price:
+        return -1
+    q = entry["quantiles"]
+    if price < q[0]:
+        return 0.0
+    if price >= q[-1]:
+        return 100.0
+    i = bisect_right(q, price)
+    lo, hi = q[i - 1], q[i]
+    frac = (price - lo) / (hi - lo) if hi > lo else 0.0
+    return round((i - 1 + frac) * 100.0 / (len(q) - 1), 1)
+
+
+def derive_features(clean_doc, city_prices=None, current_year=None):
+    """
+    Derived numbers for a cleaned document: pricePerSqft (0 when price or
+    area is unknown), age (-1 when yearBuilt is unknown), sizeBucket (0-4)
+    and cityPricePercentile (-1 without a city price table entry).
+    """
+    current_year = current_year or datetime.now().year
+    price, area, year = clean_doc["price"], clean_doc["livingArea"], clean_doc["yearBuilt"]
+    bucket = 0
+    if area:
+        bucket = 1 + sum(area >= edge for edge in SIZE_BUCKET_EDGES)
+    return {
+        "pricePerSqft": round(price / area, 2) if price and area else 0,
+        "age": max(0, current_year - int(year)) if year else -1,
+        "sizeBucket": bucket,
+        "cityPricePercentile": city_price_percentile(clean_doc["city"], clean_doc["state"], price, city_prices),
+    }
+
+
+def clean_document(doc, city_prices=None):
+    """
+    Cleaned property document with its derived features. city_prices is the
+    per-city price table (derived_features.load_city_prices()).
+    """
     current_year = datetime.now().year
     year_built = safe_num(doc.get("yearBuilt"), 0)
     if year_built < 1800 or year_built > current_year + 1:
         year_built = 0
 
     address = doc.get("address", {})
-    return {
+    cleaned = {
         "zpid": safe_num(doc.get("zpid"), 0),
         "city": safe_str(doc.get("city"), "") or safe_str(address.get("city"), "Unknown"),
         "state": safe_str(doc.get("state"), "") or safe_str(address.get("state"), "Unknown"),
@@ -51,13 +105,27 @@ def clean_document(doc):
         "listingDataSource": safe_str(doc.get("listingDataSource"), "Legacy"),
         "description": safe_str(doc.get("description")),
     }
+    cleaned.update(derive_features(cleaned, city_prices, current_year))
+    return cleaned
+
+
+# Filterable scalars kept in slim metadata; address/description live in property_store.
+SLIM_METADATA_FIELDS = [
+    "zpid", "city", "state", "homeStatus", "bedrooms", "bathrooms", "price", "yearBuilt",
+    "latitude", "longitude", "livingArea", "homeType",
+] + DERIVED_FIELDS
 
 
-def create_metadata(clean_doc):
+def create_metadata(clean_doc, slim=False):
     """
     Convert the cleaned property document into metadata for upserting.
-    Address is JSON-encoded.
+    Address is JSON-encoded. With slim=True only filterable scalar fields (plus
+    the zipcode) are kept; the full document goes to property_store instead.
     """
+    if slim:
+        metadata = {k: clean_doc[k] for k in SLIM_METADATA_FIELDS if k in clean_doc}
+        metadata["zipcode"] = clean_doc["address"].get("zipcode", "Unknown")
+        return metadata
     return {
         "zpid": clean_doc["zpid"],
         "city": clean_doc["city"],
@@ -74,4 +142,5 @@ def create_metadata(clean_doc):
         "homeType": clean_doc["homeType"],
         "listingDataSource": clean_doc["listingDataSource"],
         "description": clean_doc["description"],
+        **{k: clean_doc[k] for k in DERIVED_FIELDS if k in clean_doc},
     }
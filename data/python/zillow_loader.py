@@ -0,0 +1,251 @@
+"""
+Selective, parallel loader for the raw Zillow JSON exports.
+
+Notebook section 3 used to json.load() every file and build a DataFrame with
+all raw Zillow columns, only for section 4 to keep 14 of them; peak memory
+was several times the useful data. load_zillow() streams each file with
+ijson (C backend when available), keeps only the wanted fields (the nested
+address is flattened to streetAddress / zipcode, with city and state taken
+from the address first), fills typed column arrays in one worker process
+per file and concatenates them into a single DataFrame.
+
+    python zillow_loader.py compare Zillow-March2025-dataset_part*.json
+    python zillow_loader.py compare --synthetic 200000      # generated files
+
+compare runs the old path and the loader each in a fresh process and
+reports wall time, peak RSS (workers included) and the frame's memory.
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import resource
+import tempfile
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+try:
+    import ijson.backends.yajl2_c as ijson
+except ImportError:
+    import ijson
+
+# Section 4's `keep` list, with the nested address reduced to what the cleaning reads.
+NUMERIC_FIELDS = ("zpid", "bedrooms", "bathrooms", "price", "yearBuilt", "livingArea", "latitude", "longitude")
+TEXT_FIELDS = ("homeType", "listingDataSource", "description")
+ADDRESS_FIELDS = ("streetAddress", "city", "state", "zipcode")
+COLUMNS = NUMERIC_FIELDS + ("streetAddress", "city", "state", "zipcode") + TEXT_FIELDS
+LEGACY_KEEP = [
+    "zpid", "address", "city", "state", "bedrooms", "bathrooms",
+    "price", "yearBuilt", "livingArea", "latitude", "longitude",
+    "homeType", "listingDataSource", "description",
+]
+# Rows per numeric array chunk while a worker fills its columns.
+CHUNK_ROWS = 65536
+
+
+def _to_float(value):
+    if value is None or isinstance(value, bool):
+        return np.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace(",", "").strip())
+    except ValueError:
+        return np.nan
+
+
+def _to_text(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value
+    return json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+
+
+def _address(doc):
+    addr = doc.get("address")
+    if isinstance(addr, str):
+        try:
+            addr = json.loads(addr)
+        except ValueError:
+            addr = None
+    return addr if isinstance(addr, dict) else {}
+
+
+def load_file(path):
+    """
+    Wanted columns of one JSON array file: float64 arrays for numeric fields
+    (NaN when missing or unparseable), lists of str/None for text.
+    """
+    numeric = {f: [] for f in NUMERIC_FIELDS}
+    buffers = {f: np.empty(CHUNK_ROWS) for f in NUMERIC_FIELDS}
+    text = {f: [] for f in COLUMNS if f not in NUMERIC_FIELDS}
+    fill = 0
+    with open(path, "rb") as f:
+        for doc in ijson.items(f, "item", use_float=True):
+            if fill == CHUNK_ROWS:
+                for name in NUMERIC_FIELDS:
+                    numeric[name].append(buffers[name].copy())
+                fill = 0
+            for name in NUMERIC_FIELDS:
+                buffers[name][fill] = _to_float(doc.get(name))
+            fill += 1
+            addr = _address(doc)
+            text["streetAddress"].append(_to_text(addr.get("streetAddress")))
+            text["zipcode"].append(_to_text(addr.get("zipcode")))
+            text["city"].append(_to_text(addr.get("city") or doc.get("city")))
+            text["state"].append(_to_text(addr.get("state") or doc.get("state")))
+            for name in TEXT_FIELDS:
+                text[name].append(_to_text(doc.get(name)))
+    columns = {name: np.concatenate(numeric[name] + [buffers[name][:fill]]) for name in NUMERIC_FIELDS}
+    columns.update(text)
+    return columns
+
+
+def load_zillow(paths, workers=None):
+    """
+    DataFrame of the wanted fields from every file, one worker process per
+    file (workers=1 parses in-process).
+    """
+    import pandas as pd
+
+    paths = list(paths)
+    workers = workers or min(len(paths), os.cpu_count() or 1)
+    if workers <= 1 or len(paths) <= 1:
+        parts = [load_file(p) for p in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(load_file, paths))
+    columns = {}
+    for name in COLUMNS:
+        if name in NUMERIC_FIELDS:
+            columns[name] = np.concatenate([p[name] for p in parts]) if parts else np.empty(0)
+        else:
+            columns[name] = [v for p in parts for v in p[name]]
+    return pd.DataFrame(columns, columns=list(COLUMNS))
+
+
+def load_legacy(paths):
+    """
+    The notebook's original section 3 (+ section 4's column selection).
+    """
+    import pandas as pd
+
+    dfs = []
+    for fp in paths:
+        with open(fp, "r", encoding="utf8") as f:
+            arr = json.load(f)
+        dfs.append(pd.DataFrame(arr))
+    df_raw = pd.concat(dfs, ignore_index=True)
+    return df_raw[[c for c in LEGACY_KEEP if c in df_raw.columns]]
+
+
+# -- comparison -----------------------------------------------------------------
+
+
+def peak_rss_mb():
+    """
+    Peak RSS of this process plus its finished children, in MB (Linux reports KB).
+    """
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    child_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    scale = 1024 if sys.platform == "darwin" else 1
+    return self_kb / scale / 1024, child_kb / scale / 1024
+
+
+def _measure(method, paths, workers):
+    """
+    Runs in a fresh interpreter so peak RSS covers one method only.
+    """
+    t0 = time.perf_counter()
+    df = load_legacy(paths) if method == "legacy" else load_zillow(paths, workers)
+    elapsed = time.perf_counter() - t0
+    own, children = peak_rss_mb()
+    print(json.dumps({
+        "method": method, "rows": len(df), "seconds": elapsed, "peak_rss_mb": own,
+        "worker_peak_rss_mb": children, "frame_mb": df.memory_usage(deep=True).sum() / 1e6,
+    }))
+
+
+def write_synthetic(n, files, directory, seed=0):
+    """
+    Zillow-shaped JSON array files (with the bulky fields the loader skips).
+    """
+    rng = random.Random(seed)
+    cities = [("Chapel Hill", "27514"), ("Durham", "27701"), ("Raleigh", "27601"), ("Cary", "27511")]
+    paths = []
+    per_file = -(-n // files)
+    for i in range(files):
+        path = os.path.join(directory, f"Zillow-synthetic-2025_part{i}.json")
+        with open(path, "w", encoding="utf8") as f:
+            f.write("[")
+            for j in range(min(per_file, n - i * per_file)):
+                city, zipcode = rng.choice(cities)
+                doc = {
+                    "zpid": 10_000_000 + i * per_file + j, "city": city, "state": "NC",
+                    "address": {"streetAddress": f"{rng.randint(1, 9999)} Main St", "city": city, "state": "NC",
+                                "zipcode": zipcode, "neighborhood": None, "community": None},
+                    "bedrooms": rng.randint(1, 6), "bathrooms": rng.choice([1, 1.5, 2, 2.5, 3]),
+                    "price": rng.randint(90, 2000) * 1000, "yearBuilt": rng.randint(1900, 2025),
+                    "livingArea": rng.randint(500, 5000), "latitude": 35.9 + rng.random() / 10,
+                    "longitude": -79.0 - rng.random() / 10, "homeType": rng.choice(["SINGLE_FAMILY", "CONDO"]),
+                    "listingDataSource": "Phoenix", "description": "Charming home " * rng.randint(5, 40),
+                    "photos": [{"url": f"https://photos.example/{j}/{k}.jpg", "width": 1024} for k in range(12)],
+                    "priceHistory": [{"date": "2024-01-01", "price": 1000 * k, "event": "Listed"} for k in range(6)],
+                    "resoFacts": {f"fact{k}": "value" for k in range(30)},
+                }
+                f.write(("," if j else "") + json.dumps(doc))
+            f.write("]")
+        paths.append(path)
+    return paths
+
+
+def compare(paths, workers=None):
+    results = []
+    for method in ("legacy", "loader"):
+        cmd = [sys.executable, os.path.abspath(__file__), "_measure", method, *paths]
+        if workers:
+            cmd += ["--workers", str(workers)]
+        out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+    size_mb = sum(os.path.getsize(p) for p in paths) / 1e6
+    print(f"{len(paths)} files, {size_mb:,.0f} MB of JSON, ijson backend: {getattr(ijson, 'backend', 'python')}")
+    print(f"{'method':<8} {'rows':>10} {'seconds':>8} {'peak RSS MB':>12} {'worker RSS MB':>14} {'frame MB':>9}")
+    for r in results:
+        print(f"{r['method']:<8} {r['rows']:>10,} {r['seconds']:>8.2f} {r['peak_rss_mb']:>12,.0f} "
+              f"{r['worker_peak_rss_mb']:>14,.0f} {r['frame_mb']:>9,.0f}")
+    return results
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Selective parallel Zillow JSON loader.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_cmp = sub.add_parser("compare", help="time and peak RSS: old notebook load vs load_zillow")
+    p_cmp.add_argument("paths", nargs="*")
+    p_cmp.add_argument("--synthetic", type=int, help="generate this many records instead of reading paths")
+    p_cmp.add_argument("--files", type=int, default=4, help="synthetic files to split records across")
+    p_cmp.add_argument("--workers", type=int)
+    p_measure = sub.add_parser("_measure")
+    p_measure.add_argument("method", choices=["legacy", "loader"])
+    p_measure.add_argument("paths", nargs="+")
+    p_measure.add_argument("--workers", type=int)
+    args = parser.parse_args()
+    try:
+        if args.command == "_measure":
+            _measure(args.method, args.paths, args.workers)
+        elif args.synthetic:
+            with tempfile.TemporaryDirectory() as tmp:
+                compare(write_synthetic(args.synthetic, args.files, tmp), args.workers)
+        elif args.paths:
+            compare(args.paths, args.workers)
+        else:
+            parser.error("give JSON paths or --synthetic N")
+    except Exception as err:
+        logging.error("Zillow loader failed: %s", err)
+        sys.exit(1)